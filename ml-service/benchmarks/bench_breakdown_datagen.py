@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark: BreakdownPredictor.generate_training_data
+
+Compares the original nested buses x days Python loop with the vectorised
+(bus, day) grid generator. Loop sizes above --max-loop-rows are not run;
+their time is extrapolated from the largest measured per-row cost and
+marked "est". Run from ml-service/:
+
+    python benchmarks/bench_breakdown_datagen.py
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from breakdown_predictor import BreakdownPredictor
+
+def legacy_generate(num_buses: int, days: int) -> pd.DataFrame:
+    """The pre-vectorisation generator: one dict and six helper calls per (bus, day)"""
+    def clip01(x):
+        return max(0, min(1, x))
+
+    def weather(date):
+        if date.month in [6, 7, 8, 9]:
+            return np.random.uniform(0.6, 1.0)
+        elif date.month in [12, 1, 2]:
+            return np.random.uniform(0.4, 0.8)
+        return np.random.uniform(0.2, 0.6)
+
+    data = []
+    for bus_id in range(1, num_buses + 1):
+        bus_age = np.random.randint(6, 120)
+        total_mileage = np.random.randint(10000, 500000)
+
+        for day in range(days):
+            date = datetime.now() - timedelta(days=days - day)
+            dsm = np.random.randint(0, 90)
+            engine = clip01(0.3 + (bus_age / 120) * 0.4 + min(dsm / 90, 1) * 0.3 + np.random.normal(0, 0.1))
+            oil = clip01(0.8 - (bus_age / 120) * 0.3 - min(dsm / 90, 1) * 0.2 + np.random.normal(0, 0.05))
+            brake = clip01(min(total_mileage / 200000, 1) * 0.6 + min(dsm / 90, 1) * 0.4 + np.random.normal(0, 0.1))
+            tire = clip01(min(total_mileage / 100000, 1) * 0.5 + min(dsm / 60, 1) * 0.5 + np.random.normal(0, 0.1))
+            repairs = max(0, int(np.random.poisson((bus_age / 120) * 2 + (total_mileage / 200000) * 3)))
+            exposure = weather(date)
+            aggression = np.random.normal(0.5, 0.2)
+            difficulty = np.random.uniform(0.3, 0.9)
+
+            prob = min(
+                (bus_age / 120) ** 2 * 0.3 + (total_mileage / 300000) ** 1.5 * 0.25 +
+                (dsm / 90) ** 1.2 * 0.2 + (engine + (1 - oil)) / 2 * 0.15 +
+                (brake + tire) / 2 * 0.1 + (exposure + aggression + difficulty) / 3 * 0.1 +
+                min(repairs / 5, 1) * 0.05,
+                1.0
+            )
+
+            data.append({
+                'bus_id': bus_id, 'date': date, 'bus_age_months': bus_age,
+                'total_mileage': total_mileage, 'days_since_maintenance': dsm,
+                'avg_daily_mileage': total_mileage / max(bus_age * 30, 1),
+                'engine_temp_trend': engine, 'oil_pressure': oil, 'brake_pad_wear': brake,
+                'tire_condition': tire, 'recent_repairs': repairs, 'weather_exposure': exposure,
+                'driver_aggression_score': aggression, 'route_difficulty': difficulty,
+                'breakdown_occurred': np.random.random() < prob, 'breakdown_probability': prob
+            })
+
+    return pd.DataFrame(data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', default=['50x180', '1000x365', '5000x730'],
+                        help='buses x days grids to measure')
+    parser.add_argument('--max-loop-rows', type=int, default=400_000,
+                        help='largest grid the legacy loop is actually run on')
+    args = parser.parse_args()
+
+    predictor = BreakdownPredictor()
+    per_row = None
+
+    print(f"{'grid':>10} {'rows':>10} {'loop (s)':>12} {'vectorised (s)':>15} {'speedup':>9}")
+    for size in args.sizes:
+        buses, days = (int(x) for x in size.split('x'))
+        rows = buses * days
+
+        start = time.perf_counter()
+        predictor.generate_training_data(num_buses=buses, days=days, seed=0)
+        vectorised = time.perf_counter() - start
+
+        if rows <= args.max_loop_rows:
+            start = time.perf_counter()
+            legacy_generate(buses, days)
+            loop = time.perf_counter() - start
+            per_row = loop / rows
+            loop_label = f"{loop:.2f}"
+        else:
+            loop = per_row * rows if per_row else float('nan')
+            loop_label = f"{loop:.1f} est"
+
+        print(f"{size:>10} {rows:>10,} {loop_label:>12} {vectorised:>15.3f} {loop / vectorised:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
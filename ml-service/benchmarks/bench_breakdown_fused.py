@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark: breakdown prediction with the scaler folded into the forest
+
+Trains a breakdown predictor, saves it twice (packed forest behind the
+StandardScaler, and packed forest with the scaler folded into its
+thresholds) and times BreakdownPredictor.predict_breakdown_risk_batch, the
+/predict-breakdown hot path, for a single bus and a batch. Reports latency
+and peak memory allocated per call (tracemalloc), and checks that both variants
+return identical results. Run from ml-service/:
+
+    python benchmarks/bench_breakdown_fused.py --buses 50 --days 180
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from breakdown_predictor import BreakdownPredictor
+
+def best_time(func, calls: int, repeats: int = 3) -> float:
+    """Best mean seconds per call over `repeats` rounds"""
+    func()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def peak_per_call(func, calls: int = 50) -> float:
+    """Mean peak bytes allocated during a call"""
+    func()
+    tracemalloc.start()
+    total = 0
+    for _ in range(calls):
+        start = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        total += tracemalloc.get_traced_memory()[1] - start
+    tracemalloc.stop()
+    return total / calls
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--buses', type=int, default=50)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    # The scaler was fitted on a DataFrame; the service passes plain arrays
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    trainer = BreakdownPredictor()
+    df = trainer.generate_training_data(num_buses=args.buses, days=args.days, seed=0)
+    trainer.train_model(df)
+    buses = df[trainer.feature_names].sample(args.batch, random_state=0).to_dict('records')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        predictors = {}
+        for name, fold in [('scaler + packed', False), ('folded', True)]:
+            model_path = f"models/{name.replace(' ', '')}.pkl"
+            trainer.save_model(model_path, fold_scaler=fold)
+            predictor = BreakdownPredictor()
+            predictor.load_model(model_path)
+            assert predictor.scaler_folded == fold
+            predictors[name] = predictor
+
+        baseline, folded = predictors.values()
+        identical = baseline.predict_breakdown_risk_batch(buses) == folded.predict_breakdown_risk_batch(buses)
+
+        print(f"{trainer.model.n_estimators} trees, {len(trainer.feature_names)} features; "
+              f"results identical: {identical}")
+        print(f"{'request':<14}{'variant':<18}{'latency':>12}{'peak alloc':>12}")
+        for label, batch in [('1 bus', buses[:1]), (f'{len(buses)} buses', buses)]:
+            calls = 500 if len(batch) == 1 else 50
+            latencies = {}
+            for name, predictor in predictors.items():
+                call = lambda: predictor.predict_breakdown_risk_batch(batch)
+                latencies[name] = best_time(call, calls)
+                print(f"{label:<14}{name:<18}{latencies[name] * 1e6:>10.0f}us"
+                      f"{peak_per_call(call) / 1024:>10.1f}KB")
+            print(f"{'':<14}{'speedup':<18}{latencies['scaler + packed'] / latencies['folded']:>11.2f}x")
+
+if __name__ == "__main__":
+    main()
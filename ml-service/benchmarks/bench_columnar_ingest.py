@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark: POST /predict history decoding, JSON rows vs Arrow/Parquet
+
+For each size, encodes the same ticket sales (plus a quarter as many
+passenger counts) three ways and times the service-side path from request
+body bytes to a DemandCube:
+
+    json          body -> PredictionRequest (pydantic) -> pd.DataFrame(rows) -> cube
+    arrow_stream  body -> columnar.read_table -> cube
+    parquet       body -> columnar.read_table -> cube
+
+Row dicts mirror the backend's getHistoricalData() (ticket entity columns,
+ISO timestamp strings). Run from ml-service/:
+
+    python benchmarks/bench_columnar_ingest.py --rows 10000 100000 1000000
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from columnar import read_table, write_table
+from main import DemandCube, PredictionRequest
+
+def generate_history(rows: int, routes: int = 50) -> tuple:
+    """Ticket sales and passenger counts over the last 30 days"""
+    rng = np.random.default_rng(42)
+    start = datetime.now() - timedelta(days=30)
+    timestamps = start + pd.to_timedelta(np.sort(rng.integers(0, 30 * 24 * 60, rows)), unit='m')
+    sales = pd.DataFrame({
+        'ticket_id': np.arange(1, rows + 1),
+        'bus_id': rng.integers(1, 200, rows),
+        'route_id': rng.integers(1, routes + 1, rows),
+        'passenger_count': rng.integers(1, 60, rows),
+        'timestamp': timestamps,
+        'price': np.round(rng.uniform(10, 50, rows), 2)
+    })
+    n_counts = rows // 4
+    counts = pd.DataFrame({
+        'count_id': np.arange(1, n_counts + 1),
+        'bus_id': rng.integers(1, 200, n_counts),
+        'route_id': rng.integers(1, routes + 1, n_counts),
+        'occupancy': rng.integers(0, 80, n_counts),
+        'timestamp': timestamps[:n_counts]
+    })
+    return sales, counts
+
+def json_body(sales: pd.DataFrame, counts: pd.DataFrame) -> bytes:
+    def records(df):
+        df = df.assign(timestamp=df['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        return df.to_dict(orient='records')
+    return json.dumps({
+        'data': {'ticket_sales': records(sales), 'passenger_counts': records(counts)},
+        'prediction_hours': 24
+    }).encode()
+
+def decode_json(body: bytes) -> DemandCube:
+    request = PredictionRequest.model_validate_json(body)
+    return DemandCube.from_frames(pd.DataFrame(request.data['ticket_sales']),
+                                  pd.DataFrame(request.data['passenger_counts']))
+
+def decode_columnar(payloads: tuple) -> DemandCube:
+    return DemandCube.from_frames(read_table(payloads[0]), read_table(payloads[1]))
+
+def timed(func, arg, repeats: int) -> tuple:
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'format':>13} {'body (MB)':>10} {'decode (s)':>11} {'speedup':>8}")
+    for rows in args.rows:
+        sales, counts = generate_history(rows)
+        bodies = {
+            'json': json_body(sales, counts),
+            'arrow_stream': (write_table(sales, 'arrow_stream'), write_table(counts, 'arrow_stream')),
+            'parquet': (write_table(sales, 'parquet'), write_table(counts, 'parquet'))
+        }
+
+        baseline, reference = timed(decode_json, bodies['json'], args.repeats)
+        for name, body in bodies.items():
+            size = len(body) if name == 'json' else sum(len(part) for part in body)
+            if name == 'json':
+                elapsed, cube = baseline, reference
+            else:
+                elapsed, cube = timed(decode_columnar, body, args.repeats)
+                assert np.array_equal(cube.route_ids, reference.route_ids)
+                assert np.allclose(cube.sales_mean, reference.sales_mean, equal_nan=True)
+                assert np.allclose(cube.counts_mean, reference.counts_mean, equal_nan=True)
+            print(f"{rows:>9,} {name:>13} {size / 2**20:>10.1f} {elapsed:>11.3f} {baseline / elapsed:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency under concurrent load per ML_EXECUTOR mode
+
+Starts main.py under uvicorn once per executor mode and drives it with
+parallel clients. Each client loops POST /predict with request-body
+history (never cached) and GET /health. "inline" is the original
+behaviour, with all work on the event loop. Run from ml-service/:
+
+    python benchmarks/bench_concurrency.py --clients 50 --requests 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def history_payload(routes: int, days: int) -> dict:
+    """Hourly ticket sales for `routes` routes over `days` days"""
+    rng = np.random.default_rng(0)
+    sales = [
+        {'route_id': route_id, 'passenger_count': int(rng.integers(1, 60)),
+         'timestamp': f"2024-01-{day + 1:02d}T{hour:02d}:15:00"}
+        for route_id in range(1, routes + 1) for day in range(days) for hour in range(24)
+    ]
+    return {'data': {'ticket_sales': sales}, 'prediction_hours': 168}
+
+def start_service(mode: str, workers: int, port: int, workdir: str) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'ML_EXECUTOR': mode,
+        'ML_EXECUTOR_WORKERS': str(workers),
+        'PYTHONPATH': str(SERVICE_DIR),
+        'DEMAND_STORE_PATH': os.path.join(workdir, f'{mode}.db')
+    }
+    return subprocess.Popen(
+        # Long keep-alive so pooled connections are not closed under the client mid-run
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--log-level', 'warning',
+         '--timeout-keep-alive', '600'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get('/health')).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("service did not start")
+
+async def drive(base_url: str, clients: int, requests: int, payload: dict) -> dict:
+    latencies = {'POST /predict': [], 'GET /health': []}
+
+    async def client_loop(client: httpx.AsyncClient):
+        for _ in range(requests):
+            for name, call in (('POST /predict', lambda: client.post('/predict', json=payload)),
+                               ('GET /health', lambda: client.get('/health'))):
+                start = time.perf_counter()
+                response = await call()
+                latencies[name].append(time.perf_counter() - start)
+                response.raise_for_status()
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        await wait_ready(client)
+        await client.post('/predict', json=payload)  # warm up imports and pools
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+
+    return {'elapsed': elapsed, 'latencies': latencies}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=10, help='request pairs per client')
+    parser.add_argument('--routes', type=int, default=5)
+    parser.add_argument('--days', type=int, default=14)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--modes', nargs='+', default=['inline', 'thread', 'process'])
+    args = parser.parse_args()
+
+    payload = history_payload(args.routes, args.days)
+    print(f"{args.clients} clients x {args.requests} x (POST /predict + GET /health), "
+          f"{len(payload['data']['ticket_sales']):,} history rows per predict, {args.workers} workers")
+    print(f"{'mode':>8} {'endpoint':>14} {'p50 (ms)':>10} {'p99 (ms)':>10} {'req/s':>8}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes:
+            port = free_port()
+            service = start_service(mode, args.workers, port, workdir)
+            try:
+                result = asyncio.run(drive(f'http://127.0.0.1:{port}', args.clients, args.requests, payload))
+            finally:
+                service.terminate()
+                service.wait()
+
+            total = sum(len(v) for v in result['latencies'].values())
+            for name, values in result['latencies'].items():
+                ms = np.array(values) * 1000
+                print(f"{mode:>8} {name:>14} {np.percentile(ms, 50):>10.1f} {np.percentile(ms, 99):>10.1f} "
+                      f"{total / result['elapsed']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Benchmark: random forest inference, scikit-learn vs PackedForest
+
+Fits forests shaped like the services' models (a 14-feature demand
+regressor and a 12-feature, class-balanced breakdown classifier, 100 trees
+of depth 10 by default), packs them, and compares single-row latency and
+batch throughput of scikit-learn's predict/predict_proba with the packed
+evaluator, memory-mapped as the services load it. Outputs are checked to be
+bit-for-bit identical. Run from ml-service/:
+
+    python benchmarks/bench_forest_inference.py --trees 100 --depth 10
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from forest_arrays import load_packed_forest, save_packed_forest
+
+def fit_models(trees: int, depth: int, rows: int) -> dict:
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(rows, 14))
+    y = 3 * X[:, 0] + np.sin(X[:, 1]) + rng.normal(size=rows)
+    Xc = rng.normal(size=(rows, 12))
+    yc = (Xc[:, 0] + Xc[:, 1] ** 2 + rng.normal(size=rows) > 2).astype(int)
+
+    return {
+        'demand regressor': (
+            RandomForestRegressor(trees, max_depth=depth, min_samples_leaf=2, random_state=0).fit(X, y),
+            'predict'
+        ),
+        'breakdown classifier': (
+            RandomForestClassifier(trees, max_depth=depth, min_samples_leaf=2, class_weight='balanced',
+                                   random_state=0).fit(Xc, yc),
+            'predict_proba'
+        )
+    }
+
+def best_time(func, X: np.ndarray, calls: int, repeats: int = 3) -> float:
+    """Best mean seconds per call over `repeats` rounds"""
+    func(X)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func(X)
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=10)
+    parser.add_argument('--train-rows', type=int, default=20000)
+    parser.add_argument('--batches', type=int, nargs='+', default=[100, 1000, 100000])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (model, method) in fit_models(args.trees, args.depth, args.train_rows).items():
+            path = save_packed_forest(model, Path(workdir) / f"{name.split()[0]}.forest.joblib")
+            packed = load_packed_forest(path)
+            X = rng.normal(size=(max(args.batches), model.n_features_in_))
+
+            expected, actual = getattr(model, method)(X), getattr(packed, method)(X)
+            assert np.array_equal(expected, actual), f"{name}: outputs differ"
+            print(f"{name} ({packed.n_estimators} trees, depth {packed.max_depth}): "
+                  f"{method} identical on {len(X):,} rows")
+
+            sklearn_call, packed_call = getattr(model, method), getattr(packed, method)
+            one = X[:1]
+            sklearn_us = best_time(sklearn_call, one, 100) * 1e6
+            packed_us = best_time(packed_call, one, 1000) * 1e6
+            print(f"  {'single row':>14}: sklearn {sklearn_us:9.0f} us   packed {packed_us:9.0f} us   "
+                  f"{sklearn_us / packed_us:5.1f}x")
+            for n in args.batches:
+                calls = max(1, 20000 // n)
+                sklearn_rate = n / best_time(sklearn_call, X[:n], calls)
+                packed_rate = n / best_time(packed_call, X[:n], calls)
+                print(f"  {f'batch {n:,}':>14}: sklearn {sklearn_rate:9.0f} rows/s packed {packed_rate:9.0f} rows/s "
+                      f"{packed_rate / sklearn_rate:5.1f}x")
+
+if __name__ == "__main__":
+    main()
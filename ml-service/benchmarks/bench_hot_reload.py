@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Benchmark: swapping in a new demand model under load, hot reload vs restart
+
+Publishes two demand model versions to a scratch registry and serves them
+with enhanced_main under uvicorn while client threads post /predict
+continuously (a fresh seed per request, so the forecast cache never
+answers). Every few seconds the other version is made current and either
+
+    reload   POST /model/reload swaps it in, in-process
+    restart  the service is stopped and started again (the old way)
+
+Reports failed requests, the longest gap between successful responses, and
+latency percentiles over the run. Run from ml-service/:
+
+    python benchmarks/bench_hot_reload.py --swaps 4 --clients 4
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(SERVICE_DIR))
+
+from model_registry import ModelRegistry
+from training.train_demand_model import DemandModelTrainer
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def publish_versions(days: int) -> list:
+    """Train and publish two demand models (different data seeds); returns their versions"""
+    trainer = DemandModelTrainer()
+    versions = []
+    for seed in (0, 1):
+        X, y = trainer.prepare_training_data(trainer.generate_training_data(days=days, seed=seed))
+        versions.append(trainer.save_model(trainer.train_advanced_model(X, y)))
+    return versions
+
+def start_service(workdir: str, port: int) -> subprocess.Popen:
+    env = {**os.environ, 'PYTHONPATH': str(SERVICE_DIR), 'MODEL_LOADING': 'eager',
+           'MODEL_RELOAD_SECONDS': '0', 'PYTHONWARNINGS': 'ignore'}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'enhanced_main:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+def wait_healthy(client: httpx.Client, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if client.get('/health').json()['model_loaded']:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    raise RuntimeError("service did not start")
+
+def run(workdir: str, versions: list, mode: str, swaps: int, interval: float, clients: int) -> dict:
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    registry = ModelRegistry(Path(workdir) / "models")
+    registry.activate('demand_model', versions[0])
+    service = start_service(workdir, port)
+
+    latencies, failures, served = [], [], set()
+    last_ok = [time.monotonic()]
+    longest_gap = [0.0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client_loop(offset: int):
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            seed = offset
+            while not stop.is_set():
+                seed += clients
+                started = time.monotonic()
+                try:
+                    response = client.post('/predict', json={'route_id': 1, 'prediction_hours': 24, 'seed': seed})
+                    ok = response.status_code == 200
+                except httpx.TransportError:
+                    ok = False
+                now = time.monotonic()
+                with lock:
+                    if ok:
+                        latencies.append(now - started)
+                        served.add(response.json()['model_info'].get('version'))
+                        longest_gap[0] = max(longest_gap[0], now - last_ok[0])
+                        last_ok[0] = now
+                    else:
+                        failures.append(now)
+                if not ok:
+                    time.sleep(0.01)
+
+    try:
+        with httpx.Client(base_url=base_url, timeout=60) as control:
+            wait_healthy(control)
+            last_ok[0] = time.monotonic()
+            threads = [threading.Thread(target=client_loop, args=(i,)) for i in range(clients)]
+            for thread in threads:
+                thread.start()
+
+            for swap in range(swaps):
+                time.sleep(interval)
+                registry.activate('demand_model', versions[(swap + 1) % 2])
+                if mode == 'reload':
+                    control.post('/model/reload').raise_for_status()
+                else:
+                    service.terminate()
+                    service.wait()
+                    service = start_service(workdir, port)
+                    wait_healthy(control)
+            time.sleep(interval)
+
+            stop.set()
+            for thread in threads:
+                thread.join()
+    finally:
+        service.terminate()
+        service.wait()
+
+    ms = np.array(latencies) * 1000
+    return {
+        'ok': len(latencies),
+        'failed': len(failures),
+        'longest_gap': longest_gap[0],
+        'p50': np.percentile(ms, 50),
+        'p99': np.percentile(ms, 99),
+        'max': ms.max(),
+        'versions': len(served - {None})
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=30, help="Training history per version")
+    parser.add_argument('--swaps', type=int, default=4)
+    parser.add_argument('--interval', type=float, default=2.0, help="Seconds between swaps")
+    parser.add_argument('--clients', type=int, default=4)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore')
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        versions = publish_versions(args.days)
+        print(f"Versions: {', '.join(versions)}; {args.swaps} swaps, {args.clients} clients\n")
+        print(f"{'swap by':>8} {'ok':>7} {'failed':>7} {'longest gap (s)':>16} "
+              f"{'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'versions':>9}")
+        for mode in ('restart', 'reload'):
+            r = run(workdir, versions, mode, args.swaps, args.interval, args.clients)
+            print(f"{mode:>8} {r['ok']:>7} {r['failed']:>7} {r['longest_gap']:>16.2f} "
+                  f"{r['p50']:>9.1f} {r['p99']:>9.1f} {r['max']:>9.1f} {r['versions']:>9}")
+
+if __name__ == "__main__":
+    main()
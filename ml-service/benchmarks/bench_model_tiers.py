@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: full vs fast model tiers
+
+Trains the demand and breakdown models (each with its fast tier), loads
+both tiers the way the services do (memory-mapped packed forests) and
+reports single-row latency, batch throughput and the fast tier's held-out
+accuracy delta. Run from ml-service/:
+
+    python benchmarks/bench_model_tiers.py --days 60 --buses 50
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from breakdown_predictor import BreakdownPredictor
+from forest_arrays import load_model_file
+from model_tiers import tier_path
+from training.train_demand_model import DemandModelTrainer
+
+def best_time(func, calls: int, repeats: int = 3) -> float:
+    """Best mean seconds per call over `repeats` rounds"""
+    func()
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        best = min(best, (time.perf_counter() - start) / calls)
+    return best
+
+def report(name: str, full, fast, X: np.ndarray, delta: dict, batch: int):
+    print(f"\n{name}: full {full.n_estimators} trees, fast {fast.n_estimators} trees of depth {fast.max_depth}")
+    score = 'predict_proba' if full.kind == 'classifier' else 'predict'
+    for label, rows, calls in [('single row', X[:1], 500), (f'batch {batch}', X[:batch], 50)]:
+        timings = {
+            tier: best_time(lambda: getattr(model, score)(rows), calls)
+            for tier, model in [('full', full), ('fast', fast)]
+        }
+        print(f"  {label:>12}: full {timings['full'] * 1e6:8.0f} us   fast {timings['fast'] * 1e6:8.0f} us"
+              f"   {timings['full'] / timings['fast']:5.1f}x")
+    print("  held-out delta (fast - full): " + ", ".join(f"{key} {value:+.4f}" for key, value in delta.items()))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=60, help="Demand training history")
+    parser.add_argument('--buses', type=int, default=50, help="Breakdown training fleet size")
+    parser.add_argument('--batch', type=int, default=100)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', message='X does not have valid feature names')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+
+        trainer = DemandModelTrainer()
+        X, y = trainer.prepare_training_data(trainer.generate_training_data(days=args.days, seed=0))
+        model_data = trainer.train_advanced_model(X, y)
+        version = trainer.save_model(model_data)
+        model_path = Path("models/demand_model") / version / "demand_model.pkl"
+        report('demand regressor', load_model_file(model_path), load_model_file(tier_path(model_path, 'fast')),
+               X[-args.batch:], model_data['fast_tier']['delta'], args.batch)
+
+        predictor = BreakdownPredictor()
+        df = predictor.generate_training_data(num_buses=args.buses, days=180, seed=0)
+        metrics = predictor.train_model(df)
+        predictor.save_model()
+        predictor.load_model()
+        report('breakdown classifier', predictor.model, predictor.fast_model,
+               df[predictor.feature_names].to_numpy(float)[:args.batch], metrics['fast_tier']['delta'], args.batch)
+
+if __name__ == "__main__":
+    main()
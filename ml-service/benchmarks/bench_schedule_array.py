@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Benchmark: POST /optimize route mode on list-of-dict vs array schedules
+
+Runs the original dict-based optimizer (copied below, re-parsing
+'HH:MM:SS' strings in every helper) and the ScheduleArray version on the
+same trips, checks they return identical responses, and times both.
+Run from ml-service/:
+
+    python benchmarks/bench_schedule_array.py --trips 1000 10000 100000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from main import run_schedule_optimization
+
+def legacy_optimize_bus_schedules(routes: List[Dict], current_schedules: List[Dict], 
+                           constraints: Dict) -> List[Dict]:
+    """
+    Optimize bus schedules to reduce bunching and improve efficiency
+    """
+    optimized_schedules = []
+    
+    # Group schedules by route
+    schedules_by_route = {}
+    for schedule in current_schedules:
+        route_id = schedule.get('route_id')
+        if route_id not in schedules_by_route:
+            schedules_by_route[route_id] = []
+        schedules_by_route[route_id].append(schedule)
+    
+    # Optimize each route
+    for route_id, route_schedules in schedules_by_route.items():
+        route_optimized = legacy_optimize_route_schedules(route_id, route_schedules, constraints)
+        optimized_schedules.extend(route_optimized)
+    
+    return optimized_schedules
+
+def legacy_optimize_route_schedules(route_id: int, schedules: List[Dict], 
+                           constraints: Dict) -> List[Dict]:
+    """
+    Optimize schedules for a specific route
+    """
+    if not schedules:
+        return []
+    
+    # Sort schedules by start time
+    schedules.sort(key=lambda x: x.get('start_time', '00:00:00'))
+    
+    optimized = []
+    target_headway = constraints.get('target_headway_minutes', 15)
+    min_headway = constraints.get('min_headway_minutes', 5)
+    max_headway = constraints.get('max_headway_minutes', 30)
+    
+    for i, schedule in enumerate(schedules):
+        # Calculate optimal start time
+        if i == 0:
+            # First bus starts at original time
+            new_start_time = schedule.get('start_time', '06:00:00')
+        else:
+            # Subsequent buses with optimal headway
+            prev_time = legacy_time_to_minutes(optimized[i-1]['start_time'])
+            new_time_minutes = prev_time + target_headway
+            new_start_time = legacy_minutes_to_time(new_time_minutes)
+        
+        # Calculate end time (assume 1.5 hour trip duration)
+        start_minutes = legacy_time_to_minutes(new_start_time)
+        end_minutes = start_minutes + 90  # 90 minutes trip
+        new_end_time = legacy_minutes_to_time(end_minutes)
+        
+        # Determine adjustment reason
+        original_start = schedule.get('start_time', '00:00:00')
+        time_diff = legacy_time_to_minutes(new_start_time) - legacy_time_to_minutes(original_start)
+        
+        if abs(time_diff) > 5:  # Significant change
+            if time_diff > 0:
+                reason = f"Delayed by {time_diff} minutes to improve headway"
+            else:
+                reason = f"Advanced by {abs(time_diff)} minutes to reduce bunching"
+        else:
+            reason = "Minor adjustment for optimal spacing"
+        
+        optimized_schedule = {
+            "bus_id": schedule.get('bus_id'),
+            "route_id": route_id,
+            "start_time": new_start_time,
+            "end_time": new_end_time,
+            "adjustment_reason": reason,
+            "original_start_time": original_start,
+            "time_adjustment_minutes": time_diff
+        }
+        
+        optimized.append(optimized_schedule)
+    
+    return optimized
+
+def legacy_calculate_improvement_metrics(current: List[Dict], optimized: List[Dict]) -> Dict:
+    """
+    Calculate improvement metrics between current and optimized schedules
+    """
+    if not current or not optimized:
+        return {}
+    
+    # Calculate headway statistics
+    current_headways = legacy_calculate_headways(current)
+    optimized_headways = legacy_calculate_headways(optimized)
+    
+    # Calculate efficiency scores
+    current_efficiency = legacy_calculate_efficiency_score(current)
+    optimized_efficiency = legacy_calculate_efficiency_score(optimized)
+    
+    return {
+        "headway_improvement": {
+            "current_avg_headway": current_headways['average'],
+            "optimized_avg_headway": optimized_headways['average'],
+            "improvement_minutes": current_headways['average'] - optimized_headways['average']
+        },
+        "efficiency_improvement": {
+            "current_efficiency": current_efficiency,
+            "optimized_efficiency": optimized_efficiency,
+            "improvement_percentage": ((optimized_efficiency - current_efficiency) / current_efficiency) * 100
+        },
+        "schedule_changes": {
+            "total_schedules": len(optimized),
+            "schedules_adjusted": sum(1 for s in optimized if s.get('time_adjustment_minutes', 0) != 0),
+            "average_adjustment_minutes": np.mean([abs(s.get('time_adjustment_minutes', 0)) for s in optimized])
+        }
+    }
+
+def legacy_calculate_headways(schedules: List[Dict]) -> Dict:
+    """
+    Calculate headway statistics for schedules
+    """
+    if len(schedules) < 2:
+        return {"average": 0, "min": 0, "max": 0, "variance": 0}
+    
+    headways = []
+    for i in range(1, len(schedules)):
+        prev_time = legacy_time_to_minutes(schedules[i-1].get('start_time', '00:00:00'))
+        curr_time = legacy_time_to_minutes(schedules[i].get('start_time', '00:00:00'))
+        headways.append(curr_time - prev_time)
+    
+    return {
+        "average": np.mean(headways),
+        "min": np.min(headways),
+        "max": np.max(headways),
+        "variance": np.var(headways)
+    }
+
+def legacy_calculate_efficiency_score(schedules: List[Dict]) -> float:
+    """
+    Calculate efficiency score for schedules (0-100)
+    """
+    if not schedules:
+        return 0
+    
+    headways = legacy_calculate_headways(schedules)
+    target_headway = 15  # minutes
+    
+    # Score based on how close to target headway
+    headway_score = max(0, 100 - abs(headways['average'] - target_headway) * 2)
+    
+    # Penalty for high variance
+    variance_penalty = min(50, headways['variance'] * 0.5)
+    
+    return max(0, headway_score - variance_penalty)
+
+def legacy_generate_optimization_reasons(current: List[Dict], optimized: List[Dict]) -> List[str]:
+    """
+    Generate human-readable optimization reasons
+    """
+    reasons = []
+    
+    # Check for bunching reduction
+    current_headways = legacy_calculate_headways(current)
+    optimized_headways = legacy_calculate_headways(optimized)
+    
+    if optimized_headways['variance'] < current_headways['variance']:
+        reasons.append("Reduced schedule variance to prevent bus bunching")
+    
+    # Check for headway improvements
+    if optimized_headways['average'] > current_headways['average']:
+        reasons.append("Improved average headway for better passenger experience")
+    elif optimized_headways['average'] < current_headways['average']:
+        reasons.append("Reduced headway to increase service frequency")
+    
+    # Check for efficiency improvements
+    current_efficiency = legacy_calculate_efficiency_score(current)
+    optimized_efficiency = legacy_calculate_efficiency_score(optimized)
+    
+    if optimized_efficiency > current_efficiency:
+        reasons.append(f"Improved overall efficiency by {optimized_efficiency - current_efficiency:.1f} points")
+    
+    # Count adjustments
+    adjustments = sum(1 for s in optimized if s.get('time_adjustment_minutes', 0) != 0)
+    if adjustments > 0:
+        reasons.append(f"Adjusted {adjustments} out of {len(optimized)} schedules for optimal spacing")
+    
+    return reasons if reasons else ["No significant optimizations needed"]
+
+def legacy_time_to_minutes(time_str: str) -> int:
+    """Convert time string (HH:MM:SS) to minutes since midnight"""
+    try:
+        parts = time_str.split(':')
+        return int(parts[0]) * 60 + int(parts[1])
+    except:
+        return 0
+
+def legacy_minutes_to_time(minutes: int) -> str:
+    """Convert minutes since midnight to time string (HH:MM:SS)"""
+    hours = minutes // 60
+    mins = minutes % 60
+    return f"{hours:02d}:{mins:02d}:00"
+
+
+def legacy_run(current_schedules: List[Dict], constraints: Dict):
+    optimized = legacy_optimize_bus_schedules([], current_schedules, constraints)
+    return (optimized, legacy_calculate_improvement_metrics(current_schedules, optimized),
+            legacy_generate_optimization_reasons(current_schedules, optimized))
+
+def generate_trips(n: int, routes: int) -> List[Dict]:
+    """Unordered trips over a 05:00-23:00 day on `routes` routes"""
+    rng = np.random.default_rng(0)
+    route_ids = rng.integers(1, routes + 1, n)
+    minutes = 300 + rng.integers(0, 18 * 60, n)
+    return [
+        {'bus_id': i + 1, 'route_id': int(r), 'start_time': f"{m // 60:02d}:{m % 60:02d}:00"}
+        for i, (r, m) in enumerate(zip(route_ids.tolist(), minutes.tolist()))
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trips', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--routes', type=int, default=50)
+    args = parser.parse_args()
+    constraints = {'target_headway_minutes': 12}
+
+    print(f"{'trips':>8} {'dicts (s)':>10} {'arrays (s)':>11} {'speedup':>8} {'identical':>10}")
+    for n in args.trips:
+        trips = generate_trips(n, args.routes)
+
+        start = time.perf_counter()
+        expected = legacy_run([dict(t) for t in trips], constraints)
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = run_schedule_optimization([], trips, constraints)
+        arrays = time.perf_counter() - start
+
+        print(f"{n:>8,} {legacy:>10.3f} {arrays:>11.3f} {legacy / arrays:>7.1f}x {str(expected == actual):>10}")
+
+if __name__ == "__main__":
+    main()
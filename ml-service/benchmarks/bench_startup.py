@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: service import time and time to healthy / ready
+
+1. Imports each service module under `python -X importtime` in a fresh
+   interpreter and reports the total and its heaviest direct imports.
+2. Trains small demand and breakdown models into a scratch directory,
+   starts each service with uvicorn under every MODEL_LOADING mode and
+   measures, from process spawn, when GET /health first answers and when
+   GET /ready first returns 200.
+
+--service-dir points at another checkout's ml-service/ to compare against
+it (modes it does not know behave as its own startup does). Run from
+ml-service/:
+
+    python benchmarks/bench_startup.py
+"""
+
+import argparse
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import warnings
+from pathlib import Path
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(SERVICE_DIR))
+
+SERVICES = ['main', 'enhanced_main', 'breakdown_api']
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+def import_times(module: str, service_dir: Path, repeats: int = 3):
+    """Best cumulative import time of `module` (ms) and its heaviest direct imports"""
+    best = None
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=service_dir, capture_output=True, text=True, check=True
+        )
+        rows = [IMPORT_LINE.match(line) for line in result.stderr.splitlines()]
+        rows = [(int(m.group(2)) / 1000, len(m.group(3)), m.group(4)) for m in rows if m]
+        total = next(ms for ms, depth, name in rows if name == module and depth == 1)
+        if best is None or total < best[0]:
+            children = sorted(((ms, name) for ms, depth, name in rows if depth == 3), reverse=True)
+            best = (total, children[:5])
+    return best
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def get_status(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+def time_to_ready(module: str, service_dir: Path, workdir: Path, mode: str, timeout: float = 60.0):
+    """Seconds from spawn until /health answers and until /ready returns 200 (None if it never does)"""
+    port = free_port()
+    env = {**os.environ, 'MODEL_LOADING': mode, 'PYTHONPATH': str(service_dir), 'PYTHONWARNINGS': 'ignore'}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', f'{module}:app', '--port', str(port), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    healthy = ready = None
+    try:
+        while time.perf_counter() - started < timeout and ready is None:
+            if healthy is None and get_status(f'http://127.0.0.1:{port}/health') == 200:
+                healthy = time.perf_counter() - started
+            if healthy is not None:
+                status = get_status(f'http://127.0.0.1:{port}/ready')
+                if status == 200:
+                    ready = time.perf_counter() - started
+                elif status == 404:
+                    # No readiness endpoint: models were loaded before /health answered
+                    ready = healthy
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return healthy, ready
+
+def train_models(workdir: Path):
+    from breakdown_predictor import BreakdownPredictor
+    from training.train_demand_model import DemandModelTrainer
+
+    os.chdir(workdir)
+    trainer = DemandModelTrainer()
+    X, y = trainer.prepare_training_data(trainer.generate_training_data(days=30, seed=0))
+    trainer.save_model(trainer.train_advanced_model(X, y))
+
+    predictor = BreakdownPredictor()
+    predictor.train_model(predictor.generate_training_data(num_buses=30, days=180, seed=0))
+    predictor.save_model()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service-dir', type=Path, default=SERVICE_DIR)
+    parser.add_argument('--modes', nargs='+', default=['eager', 'background', 'lazy'])
+    args = parser.parse_args()
+    service_dir = args.service_dir.resolve()
+
+    print(f"Import time ({service_dir}):")
+    for module in SERVICES:
+        total, children = import_times(module, service_dir)
+        heaviest = ', '.join(f"{name} {ms:.0f}" for ms, name in children)
+        print(f"  {module:<14} {total:6.0f} ms   heaviest: {heaviest}")
+
+    warnings.filterwarnings('ignore')
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        train_models(workdir)
+
+        print("\nSeconds from spawn to first /health and to /ready (trained models present):")
+        for module in ['enhanced_main', 'breakdown_api']:
+            for mode in args.modes:
+                healthy, ready = time_to_ready(module, service_dir, workdir, mode)
+                ready_text = f"{ready:6.2f}" if ready is not None else "   n/a"
+                print(f"  {module:<14} {mode:<11} health {healthy:6.2f}   ready {ready_text}")
+
+if __name__ == "__main__":
+    main()
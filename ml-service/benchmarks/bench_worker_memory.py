@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-worker memory of enhanced_main.py with N uvicorn workers
+
+Trains a random forest demand model into a scratch models/ directory, then
+serves it with 1, 2 and 4 workers, loading the model either by unpickling
+(MODEL_MMAP=0) or by memory-mapping the packed forest (MODEL_MMAP=1). After
+a few predictions it reads every worker's /proc/<pid>/smaps_rollup. Pss
+splits shared pages between the workers mapping them, so total Pss is the
+real footprint. Linux only. Run from ml-service/:
+
+    python benchmarks/bench_worker_memory.py --rows 50000 --trees 100
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import joblib
+import numpy as np
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(SERVICE_DIR))
+
+from forest_arrays import packed_path, save_packed_forest
+from serving import read_memory_kb
+from training.train_demand_model import DemandModelTrainer
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def train_model(models_dir: Path, rows: int, trees: int):
+    """Fit an unpruned forest on synthetic demand data and save both formats"""
+    from sklearn.ensemble import RandomForestRegressor
+
+    trainer = DemandModelTrainer()
+    X, y = trainer.prepare_training_data(trainer.generate_training_data(days=rows // 144 + 1, routes=6, seed=0))
+    X, y = X[:rows], y[:rows]
+
+    model = RandomForestRegressor(n_estimators=trees, random_state=0).fit(X, y)
+    model_path = models_dir / "demand_model.pkl"
+    joblib.dump(model, model_path)
+    save_packed_forest(model, packed_path(model_path))
+
+    feature_names = [f"f{i}" for i in range(X.shape[1])]
+    with open(models_dir / "demand_model_metadata.json", 'w') as f:
+        json.dump({'training_date': 'benchmark', 'feature_names': feature_names,
+                   'metrics': {'accuracy': 0.0, 'mae': 0.0, 'rmse': 0.0, 'r2_score': 0.0}}, f)
+
+    sizes = {p.name: p.stat().st_size / 2**20 for p in (model_path, packed_path(model_path))}
+    print(f"Model: {trees} trees, {sum(e.tree_.node_count for e in model.estimators_):,} nodes; "
+          + ", ".join(f"{name} {size:.0f} MB" for name, size in sizes.items()))
+
+def worker_pids(master_pid: int, workers: int) -> list:
+    """uvicorn worker processes: spawned children of the master, minus helpers"""
+    if workers == 1:
+        return [master_pid]  # uvicorn serves in-process
+    pids = []
+    for task in Path(f"/proc/{master_pid}/task").iterdir():
+        pids += [int(pid) for pid in (task / "children").read_text().split()]
+    found = []
+    for pid in pids:
+        cmdline = Path(f"/proc/{pid}/cmdline").read_bytes().replace(b'\0', b' ').decode()
+        if 'resource_tracker' not in cmdline:
+            found.append(pid)
+    return found
+
+def measure(workdir: str, workers: int, mmap: bool, requests: int) -> list:
+    port = free_port()
+    env = {**os.environ, 'MODEL_MMAP': '1' if mmap else '0', 'PYTHONPATH': str(SERVICE_DIR),
+           'ML_EXECUTOR': 'inline'}
+    service = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'enhanced_main:app', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning'],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f'http://127.0.0.1:{port}', timeout=120) as client:
+            deadline = time.monotonic() + 120
+            while True:
+                try:
+                    health = client.get('/health').json()
+                    if health['model_loaded'] and len(worker_pids(service.pid, workers)) >= workers:
+                        break
+                except httpx.TransportError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise RuntimeError("service did not start")
+                time.sleep(0.5)
+            # Give every worker time to finish loading, then exercise the model
+            time.sleep(2)
+            for i in range(requests):
+                client.post('/predict', json={'route_ids': list(range(1, 7)), 'prediction_hours': 168,
+                                              'seed': i}).raise_for_status()
+        return [read_memory_kb(pid) for pid in worker_pids(service.pid, workers)]
+    finally:
+        service.terminate()
+        service.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        models_dir = Path(workdir) / "models"
+        models_dir.mkdir()
+        train_model(models_dir, args.rows, args.trees)
+
+        print(f"{'load':>7} {'workers':>8} {'RSS/worker (MB)':>16} {'private/worker':>15} "
+              f"{'total RSS (MB)':>15} {'total PSS (MB)':>15}")
+        for mmap in (False, True):
+            for workers in args.workers:
+                memory = measure(workdir, workers, mmap, args.requests)
+                rss = np.array([m['rss_kb'] for m in memory]) / 1024
+                private = np.array([m['private_kb'] for m in memory]) / 1024
+                pss = np.array([m['pss_kb'] for m in memory]) / 1024
+                print(f"{'mmap' if mmap else 'pickle':>7} {workers:>8} {rss.mean():>16.0f} {private.mean():>15.0f} "
+                      f"{rss.sum():>15.0f} {pss.sum():>15.0f}")
+
+if __name__ == "__main__":
+    main()
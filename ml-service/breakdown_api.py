@@ -6,12 +6,20 @@ FastAPI endpoints for bus breakdown prediction and monitoring.
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import logging
+import numpy as np
 
-from breakdown_predictor import BreakdownPredictor
+from breakdown_predictor import MODEL_NAME, BreakdownPredictor
+from executor import executor_info, run_threaded, shutdown_executors
+from model_loading import ModelLoader
+from model_registry import ModelRegistry, RegistryWatcher
+from model_tiers import ModelTier
+from serving import process_memory, run_service
+from training_jobs import TrainingJobManager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +42,21 @@ app.add_middleware(
 
 # Global predictor instance
 breakdown_predictor = BreakdownPredictor()
+registry = ModelRegistry()
+
+def install_trained_model(result: Dict[str, Any]):
+    """Atomically swap in a freshly trained model; in-flight requests keep the old one"""
+    global breakdown_predictor
+    if result.get('model_path') is None:
+        # Reload from the registry to serve the memory-mapped packed forest the job published
+        models.reload()
+        return
+    predictor = BreakdownPredictor()
+    if not predictor.load_model(result['model_path']):
+        raise RuntimeError(f"Could not load the trained model from {result['model_path']}")
+    breakdown_predictor = predictor
+
+training_jobs = TrainingJobManager(on_complete=install_trained_model, jobs_dir=registry.jobs_dir(MODEL_NAME))
 
 # Pydantic models
 class BusSensorData(BaseModel):
@@ -59,6 +82,7 @@ class BreakdownPredictionResponse(BaseModel):
     recommendations: List[str]
     predicted_failure_time: str
     confidence: float
+    tier: str = 'full'
     timestamp: datetime
 
 class MaintenanceRecommendation(BaseModel):
@@ -69,6 +93,12 @@ class MaintenanceRecommendation(BaseModel):
     estimated_downtime: Optional[str] = None
     parts_needed: Optional[List[str]] = None
 
+class TrainingJobRequest(BaseModel):
+    num_buses: int = 50
+    days: int = 180
+    tune: bool = False  # Search forest hyperparameters first (on ML_TRAINING_N_JOBS cores)
+    tune_candidates: int = Field(100, ge=1)
+
 class FleetHealthOverview(BaseModel):
     total_buses: int
     critical_risk: int
@@ -78,16 +108,33 @@ class FleetHealthOverview(BaseModel):
     maintenance_due: int
     last_updated: datetime
 
+def load_breakdown_model():
+    """
+    Load the registry's current breakdown model version (run by the model
+    loader at startup and on reload, see model_loading.py). Does nothing if
+    that version is already being served.
+    """
+    global breakdown_predictor
+    version = registry.current_version(MODEL_NAME)
+    if breakdown_predictor.model is not None and version == breakdown_predictor.version:
+        return
+    predictor = BreakdownPredictor()
+    if predictor.load_model():
+        breakdown_predictor = predictor
+        logger.info(f"Breakdown prediction model loaded successfully (version {predictor.version or 'unversioned'})")
+    elif version is not None:
+        raise RuntimeError(f"Could not load {MODEL_NAME} version {version}")
+    else:
+        logger.warning("No trained model found, using fallback predictions")
+
+models = ModelLoader(load_breakdown_model)
+registry_watcher = RegistryWatcher(registry, [MODEL_NAME], models.reload)
+
 @app.on_event("startup")
-async def load_breakdown_model():
-    """Load breakdown prediction model on startup"""
-    try:
-        if breakdown_predictor.load_model():
-            logger.info("Breakdown prediction model loaded successfully")
-        else:
-            logger.warning("No trained model found, using fallback predictions")
-    except Exception as e:
-        logger.error(f"Error loading breakdown model: {str(e)}")
+async def start_model_loading():
+    """Start loading the breakdown model (in the background unless MODEL_LOADING=eager) and watching for new versions"""
+    models.start()
+    registry_watcher.start()
 
 @app.get("/health")
 async def health_check():
@@ -96,22 +143,35 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "model_loaded": breakdown_predictor.model is not None,
-        "service": "breakdown_prediction"
+        "model_version": breakdown_predictor.version,
+        "service": "breakdown_prediction",
+        "executor": executor_info(),
+        "model_memory_mapped": getattr(breakdown_predictor.model, 'is_memory_mapped', False),
+        "model_loading": models.status(),
+        "process": process_memory()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once the model is loaded (or MODEL_LOADING=lazy), 503 while it loads or after a failed load"""
+    status = models.status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
 @app.post("/predict-breakdown", response_model=BreakdownPredictionResponse)
-async def predict_breakdown(sensor_data: BusSensorData):
+async def predict_breakdown(sensor_data: BusSensorData, tier: ModelTier = 'full'):
     """
-    Predict breakdown risk for a specific bus based on sensor data
+    Predict breakdown risk for a specific bus based on sensor data.
+    ?tier=fast scores with the smaller, lower-latency forest.
     """
     try:
         logger.info(f"Predicting breakdown risk for bus {sensor_data.bus_id}")
+        await models.wait()
         
         # Convert sensor data to dictionary
         bus_data = sensor_data.dict()
         
         # Predict breakdown risk
-        prediction = breakdown_predictor.predict_breakdown_risk(bus_data)
+        prediction = await run_threaded(breakdown_predictor.predict_breakdown_risk, bus_data, tier=tier)
         
         return BreakdownPredictionResponse(
             bus_id=sensor_data.bus_id,
@@ -120,6 +180,7 @@ async def predict_breakdown(sensor_data: BusSensorData):
             recommendations=prediction['recommendations'],
             predicted_failure_time=prediction['predicted_failure_time'],
             confidence=prediction['confidence'],
+            tier=prediction['tier'],
             timestamp=datetime.now()
         )
         
@@ -128,26 +189,30 @@ async def predict_breakdown(sensor_data: BusSensorData):
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
 @app.post("/predict-fleet-breakdowns")
-async def predict_fleet_breakdowns(sensor_data_list: List[BusSensorData]):
+async def predict_fleet_breakdowns(sensor_data_list: List[BusSensorData], tier: ModelTier = 'full'):
     """
-    Predict breakdown risk for multiple buses
+    Predict breakdown risk for multiple buses (?tier=fast as for /predict-breakdown)
     """
     try:
         logger.info(f"Predicting breakdown risk for {len(sensor_data_list)} buses")
+        await models.wait()
+        
+        # Score the whole fleet in one batch
+        bus_data_list = [sensor_data.dict() for sensor_data in sensor_data_list]
+        fleet_predictions = await run_threaded(breakdown_predictor.predict_breakdown_risk_batch, bus_data_list,
+                                               tier=tier)
         
         predictions = []
         
-        for sensor_data in sensor_data_list:
-            bus_data = sensor_data.dict()
-            prediction = breakdown_predictor.predict_breakdown_risk(bus_data)
-            
+        for sensor_data, prediction in zip(sensor_data_list, fleet_predictions):
             predictions.append({
                 'bus_id': sensor_data.bus_id,
                 'risk_score': prediction['risk_score'],
                 'risk_level': prediction['risk_level'],
                 'recommendations': prediction['recommendations'],
                 'predicted_failure_time': prediction['predicted_failure_time'],
-                'confidence': prediction['confidence']
+                'confidence': prediction['confidence'],
+                'tier': prediction['tier']
             })
         
         return {
@@ -191,56 +256,58 @@ async def get_maintenance_recommendations(sensor_data_list: List[BusSensorData])
     """
     try:
         logger.info(f"Generating maintenance recommendations for {len(sensor_data_list)} buses")
+        await models.wait()
+        
+        # Score the whole fleet in one batch
+        bus_data_list = [sensor_data.dict() for sensor_data in sensor_data_list]
+        fleet_predictions = await run_threaded(breakdown_predictor.predict_breakdown_risk_batch, bus_data_list)
+        
+        # Determine priority based on risk level
+        priority_map = {
+            'CRITICAL': 'IMMEDIATE',
+            'HIGH': 'HIGH',
+            'MEDIUM': 'MEDIUM',
+            'LOW': 'LOW'
+        }
+        
+        # Estimate cost and downtime based on risk level
+        cost_estimates = {
+            'CRITICAL': 50000,
+            'HIGH': 25000,
+            'MEDIUM': 10000,
+            'LOW': 5000
+        }
+        
+        downtime_estimates = {
+            'CRITICAL': '2-3 days',
+            'HIGH': '1-2 days',
+            'MEDIUM': '4-8 hours',
+            'LOW': '2-4 hours'
+        }
+        
+        # Determine parts needed based on sensor data, one mask per part
+        def column(name: str, default: float) -> np.ndarray:
+            return np.array([bus_data.get(name, default) for bus_data in bus_data_list], dtype=float)
+        
+        part_masks = [
+            ('Brake Pads', column('brake_pad_wear', 0) > 0.7),
+            ('Tires', column('tire_condition', 0) > 0.6),
+            ('Oil Filter', column('oil_pressure', 1) < 0.3),
+            ('Coolant', column('engine_temp_trend', 0) > 0.7)
+        ]
         
         recommendations = []
         
-        for sensor_data in sensor_data_list:
-            bus_data = sensor_data.dict()
-            prediction = breakdown_predictor.predict_breakdown_risk(bus_data)
-            
-            # Determine priority based on risk level
-            priority_map = {
-                'CRITICAL': 'IMMEDIATE',
-                'HIGH': 'HIGH',
-                'MEDIUM': 'MEDIUM',
-                'LOW': 'LOW'
-            }
-            
-            priority = priority_map.get(prediction['risk_level'], 'LOW')
-            
-            # Estimate cost and downtime based on risk level
-            cost_estimates = {
-                'CRITICAL': 50000,
-                'HIGH': 25000,
-                'MEDIUM': 10000,
-                'LOW': 5000
-            }
-            
-            downtime_estimates = {
-                'CRITICAL': '2-3 days',
-                'HIGH': '1-2 days',
-                'MEDIUM': '4-8 hours',
-                'LOW': '2-4 hours'
-            }
-            
-            # Determine parts needed based on sensor data
-            parts_needed = []
-            if bus_data.get('brake_pad_wear', 0) > 0.7:
-                parts_needed.append('Brake Pads')
-            if bus_data.get('tire_condition', 0) > 0.6:
-                parts_needed.append('Tires')
-            if bus_data.get('oil_pressure', 1) < 0.3:
-                parts_needed.append('Oil Filter')
-            if bus_data.get('engine_temp_trend', 0) > 0.7:
-                parts_needed.append('Coolant')
+        for i, (sensor_data, prediction) in enumerate(zip(sensor_data_list, fleet_predictions)):
+            risk_level = prediction['risk_level']
             
             recommendations.append(MaintenanceRecommendation(
                 bus_id=sensor_data.bus_id,
-                priority=priority,
+                priority=priority_map.get(risk_level, 'LOW'),
                 recommended_actions=prediction['recommendations'],
-                estimated_cost=cost_estimates.get(prediction['risk_level'], 5000),
-                estimated_downtime=downtime_estimates.get(prediction['risk_level'], '2-4 hours'),
-                parts_needed=parts_needed
+                estimated_cost=cost_estimates.get(risk_level, 5000),
+                estimated_downtime=downtime_estimates.get(risk_level, '2-4 hours'),
+                parts_needed=[part for part, mask in part_masks if mask[i]]
             ))
         
         return recommendations
@@ -294,6 +361,7 @@ async def get_breakdown_alerts():
 @app.get("/model/info")
 async def get_model_info():
     """Get information about the breakdown prediction model"""
+    await models.wait()
     if breakdown_predictor.model is None:
         return {
             "model_loaded": False,
@@ -303,47 +371,94 @@ async def get_model_info():
     return {
         "model_loaded": True,
         "model_type": "Random Forest Classifier",
+        "version": breakdown_predictor.version,
+        "versions": registry.versions(MODEL_NAME),
         "feature_count": len(breakdown_predictor.feature_names),
         "features": breakdown_predictor.feature_names,
         "risk_thresholds": breakdown_predictor.risk_thresholds,
+        "best_params": breakdown_predictor.best_params,
+        "tiers": {
+            "full": {"n_estimators": breakdown_predictor.model.n_estimators},
+            "fast": {"available": breakdown_predictor.fast_model is not None, **(breakdown_predictor.fast_tier or {})}
+        },
         "last_updated": datetime.now().isoformat()
     }
 
-@app.post("/train-model")
-async def train_breakdown_model():
+@app.post("/model/reload")
+async def reload_model():
     """
-    Train the breakdown prediction model (for development/testing)
+    Swap in the registry's current model version without a restart (also
+    done by the registry watcher); requests already running finish on the
+    model they started with
     """
     try:
-        logger.info("Starting breakdown model training...")
-        
-        # Generate training data
-        df = breakdown_predictor.generate_training_data(num_buses=50, days=180)
+        previous = breakdown_predictor.version
+        await run_threaded(models.reload)
+        return {
+            "previous_version": previous,
+            "version": breakdown_predictor.version,
+            "reloaded": breakdown_predictor.version != previous,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error reloading model: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+
+@app.post("/train-model", status_code=202)
+async def train_breakdown_model(request: Optional[TrainingJobRequest] = None):
+    """
+    Queue breakdown model training (for development/testing). Training runs
+    in a worker process; the new model is swapped in when the job finishes.
+    """
+    try:
+        request = request or TrainingJobRequest()
+        logger.info("Queueing breakdown model training...")
         
-        # Train model
-        metrics = breakdown_predictor.train_model(df)
+        job = training_jobs.submit(num_buses=request.num_buses, days=request.days, tune=request.tune,
+                                   tune_candidates=request.tune_candidates)
         
-        if metrics:
-            # Save model
-            breakdown_predictor.save_model()
-            
-            return {
-                "status": "success",
-                "message": "Model trained successfully",
-                "metrics": metrics,
-                "timestamp": datetime.now().isoformat()
-            }
-        else:
-            return {
-                "status": "error",
-                "message": "Model training failed",
-                "timestamp": datetime.now().isoformat()
-            }
+        return {
+            "status": "accepted",
+            "message": "Model training queued",
+            "job_id": job['job_id'],
+            "job": job,
+            "status_url": f"/train-model/jobs/{job['job_id']}",
+            "timestamp": datetime.now().isoformat()
+        }
             
     except Exception as e:
-        logger.error(f"Error training model: {str(e)}")
+        logger.error(f"Error queueing training: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Model training failed: {str(e)}")
 
+@app.get("/train-model/jobs")
+async def list_training_jobs():
+    """List recent training jobs"""
+    return {"jobs": training_jobs.list()}
+
+@app.get("/train-model/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """Status of a training job, including metrics once completed"""
+    job = training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    return job
+
+@app.get("/train-model/jobs/{job_id}/progress")
+async def get_training_job_progress(job_id: str):
+    """Current stage and percent complete of a training job"""
+    progress = training_jobs.progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Training job {job_id} not found")
+    return {"job_id": job_id, **progress}
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    registry_watcher.stop()
+    training_jobs.shutdown()
+    shutdown_executors()
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8002)
+    # Other workers only see a job's model through the registry watcher
+    run_service(app, "breakdown_api:app", port=8002,
+                single_process_reason=None if registry_watcher.interval > 0 else
+                "MODEL_RELOAD_SECONDS=0 leaves workers other than the one that trained a model on the old one")
@@ -4,25 +4,40 @@ Smart Bus System - Breakdown Prediction Module
 This module implements machine learning models to predict bus breakdowns.
 """
 
-import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional
-import joblib
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
 import json
 from pathlib import Path
 import logging
 
+from forest_arrays import load_model_file, load_packed_if_available, packed_path, save_packed_forest
+from model_registry import ModelRegistry
+from model_tiers import fit_fast_variant, tier_path, tier_summary
+from tuning import fit_parallel, tune_forest
+
+# pandas and joblib are imported where data is generated, saved or loaded, not on the prediction path
+if TYPE_CHECKING:
+    import pandas as pd
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Registry name of the breakdown model (models/breakdown_predictor/<version>/)
+MODEL_NAME = "breakdown_predictor"
+
 class BreakdownPredictor:
     """Machine learning model for predicting bus breakdowns"""
     
     def __init__(self):
         self.model = None
         self.scaler = None
+        # Smaller forest served for ?tier=fast, and its held-out scores vs the full model
+        self.fast_model = None
+        self.fast_tier = None
+        # Registry version loaded or saved last (None for an explicit path)
+        self.version = None
         self.feature_names = [
             'bus_age_months', 'total_mileage', 'days_since_maintenance',
             'avg_daily_mileage', 'engine_temp_trend', 'oil_pressure',
@@ -35,125 +50,142 @@ class BreakdownPredictor:
             'HIGH': 0.6,
             'CRITICAL': 0.8
         }
+        self.best_params = None
     
-    def generate_training_data(self, num_buses: int = 100, days: int = 365) -> pd.DataFrame:
-        """Generate synthetic training data for breakdown prediction"""
+    @property
+    def scaler_folded(self) -> bool:
+        """True when the loaded forest takes unscaled features (scaler folded into its thresholds)"""
+        return getattr(self.model, 'scaler_folded', False)
+    
+    def generate_training_data(self, num_buses: int = 100, days: int = 365,
+                               seed: Optional[int] = None) -> "pd.DataFrame":
+        """
+        Generate synthetic training data for breakdown prediction.
+        
+        Every feature is computed as an array over the (bus, day) grid,
+        bus-major: row (bus_id - 1) * days + day.
+        """
+        import pandas as pd
+        
         logger.info(f"Generating training data for {num_buses} buses over {days} days")
         
-        data = []
+        rng = np.random.default_rng(seed)
+        n = num_buses * days
         
-        for bus_id in range(1, num_buses + 1):
-            # Generate bus characteristics
-            bus_age = np.random.randint(6, 120)  # 6 months to 10 years
-            total_mileage = np.random.randint(10000, 500000)
-            
-            # Generate daily data
-            for day in range(days):
-                date = datetime.now() - timedelta(days=days-day)
-                
-                # Calculate features
-                days_since_maintenance = np.random.randint(0, 90)
-                avg_daily_mileage = total_mileage / max(bus_age * 30, 1)
-                
-                # Engine health indicators
-                engine_temp_trend = self._generate_engine_temp_trend(bus_age, days_since_maintenance)
-                oil_pressure = self._generate_oil_pressure(bus_age, days_since_maintenance)
-                
-                # Mechanical wear
-                brake_pad_wear = self._generate_brake_pad_wear(total_mileage, days_since_maintenance)
-                tire_condition = self._generate_tire_condition(total_mileage, days_since_maintenance)
-                
-                # Operational factors
-                recent_repairs = self._generate_recent_repairs(bus_age, total_mileage)
-                weather_exposure = self._generate_weather_exposure(date)
-                driver_aggression = np.random.normal(0.5, 0.2)
-                route_difficulty = np.random.uniform(0.3, 0.9)
-                
-                # Calculate breakdown probability
-                breakdown_prob = self._calculate_breakdown_probability(
-                    bus_age, total_mileage, days_since_maintenance,
-                    engine_temp_trend, oil_pressure, brake_pad_wear,
-                    tire_condition, recent_repairs, weather_exposure,
-                    driver_aggression, route_difficulty
-                )
-                
-                # Determine if breakdown occurred
-                breakdown_occurred = np.random.random() < breakdown_prob
-                
-                data.append({
-                    'bus_id': bus_id,
-                    'date': date,
-                    'bus_age_months': bus_age,
-                    'total_mileage': total_mileage,
-                    'days_since_maintenance': days_since_maintenance,
-                    'avg_daily_mileage': avg_daily_mileage,
-                    'engine_temp_trend': engine_temp_trend,
-                    'oil_pressure': oil_pressure,
-                    'brake_pad_wear': brake_pad_wear,
-                    'tire_condition': tire_condition,
-                    'recent_repairs': recent_repairs,
-                    'weather_exposure': weather_exposure,
-                    'driver_aggression_score': driver_aggression,
-                    'route_difficulty': route_difficulty,
-                    'breakdown_occurred': breakdown_occurred,
-                    'breakdown_probability': breakdown_prob
-                })
-        
-        df = pd.DataFrame(data)
+        # Generate bus characteristics, repeated for each day
+        bus_age = np.repeat(rng.integers(6, 120, num_buses), days)  # 6 months to 10 years
+        total_mileage = np.repeat(rng.integers(10000, 500000, num_buses), days)
+        
+        # Generate daily data
+        today = pd.Timestamp(datetime.now())
+        dates = today - pd.to_timedelta(np.arange(days, 0, -1), unit='D')
+        date = np.tile(dates.to_numpy(), num_buses)
+        month = np.tile(dates.month.to_numpy(), num_buses)
+        
+        # Calculate features
+        days_since_maintenance = rng.integers(0, 90, n)
+        avg_daily_mileage = total_mileage / np.maximum(bus_age * 30, 1)
+        
+        # Engine health indicators
+        engine_temp_trend = self._generate_engine_temp_trend(bus_age, days_since_maintenance, rng)
+        oil_pressure = self._generate_oil_pressure(bus_age, days_since_maintenance, rng)
+        
+        # Mechanical wear
+        brake_pad_wear = self._generate_brake_pad_wear(total_mileage, days_since_maintenance, rng)
+        tire_condition = self._generate_tire_condition(total_mileage, days_since_maintenance, rng)
+        
+        # Operational factors
+        recent_repairs = self._generate_recent_repairs(bus_age, total_mileage, rng)
+        weather_exposure = self._generate_weather_exposure(month, rng)
+        driver_aggression = rng.normal(0.5, 0.2, n)
+        route_difficulty = rng.uniform(0.3, 0.9, n)
+        
+        # Calculate breakdown probability
+        breakdown_prob = self._calculate_breakdown_probability(
+            bus_age, total_mileage, days_since_maintenance,
+            engine_temp_trend, oil_pressure, brake_pad_wear,
+            tire_condition, recent_repairs, weather_exposure,
+            driver_aggression, route_difficulty
+        )
+        
+        # Determine if breakdown occurred
+        breakdown_occurred = rng.random(n) < breakdown_prob
+        
+        df = pd.DataFrame({
+            'bus_id': np.repeat(np.arange(1, num_buses + 1), days),
+            'date': date,
+            'bus_age_months': bus_age,
+            'total_mileage': total_mileage,
+            'days_since_maintenance': days_since_maintenance,
+            'avg_daily_mileage': avg_daily_mileage,
+            'engine_temp_trend': engine_temp_trend,
+            'oil_pressure': oil_pressure,
+            'brake_pad_wear': brake_pad_wear,
+            'tire_condition': tire_condition,
+            'recent_repairs': recent_repairs,
+            'weather_exposure': weather_exposure,
+            'driver_aggression_score': driver_aggression,
+            'route_difficulty': route_difficulty,
+            'breakdown_occurred': breakdown_occurred,
+            'breakdown_probability': breakdown_prob
+        })
         logger.info(f"Generated {len(df)} training samples")
         return df
     
-    def _generate_engine_temp_trend(self, bus_age: int, days_since_maintenance: int) -> float:
+    def _generate_engine_temp_trend(self, bus_age: np.ndarray, days_since_maintenance: np.ndarray,
+                                    rng: np.random.Generator) -> np.ndarray:
         """Generate engine temperature trend (0-1, higher is worse)"""
         base_temp = 0.3 + (bus_age / 120) * 0.4  # Age factor
-        maintenance_factor = min(days_since_maintenance / 90, 1) * 0.3
-        noise = np.random.normal(0, 0.1)
-        return max(0, min(1, base_temp + maintenance_factor + noise))
+        maintenance_factor = np.minimum(days_since_maintenance / 90, 1) * 0.3
+        noise = rng.normal(0, 0.1, np.shape(bus_age))
+        return np.clip(base_temp + maintenance_factor + noise, 0, 1)
     
-    def _generate_oil_pressure(self, bus_age: int, days_since_maintenance: int) -> float:
+    def _generate_oil_pressure(self, bus_age: np.ndarray, days_since_maintenance: np.ndarray,
+                               rng: np.random.Generator) -> np.ndarray:
         """Generate oil pressure (0-1, lower is worse)"""
         base_pressure = 0.8 - (bus_age / 120) * 0.3  # Age factor
-        maintenance_factor = min(days_since_maintenance / 90, 1) * 0.2
-        noise = np.random.normal(0, 0.05)
-        return max(0, min(1, base_pressure - maintenance_factor + noise))
+        maintenance_factor = np.minimum(days_since_maintenance / 90, 1) * 0.2
+        noise = rng.normal(0, 0.05, np.shape(bus_age))
+        return np.clip(base_pressure - maintenance_factor + noise, 0, 1)
     
-    def _generate_brake_pad_wear(self, total_mileage: int, days_since_maintenance: int) -> float:
+    def _generate_brake_pad_wear(self, total_mileage: np.ndarray, days_since_maintenance: np.ndarray,
+                                 rng: np.random.Generator) -> np.ndarray:
         """Generate brake pad wear (0-1, higher is worse)"""
-        mileage_factor = min(total_mileage / 200000, 1) * 0.6
-        maintenance_factor = min(days_since_maintenance / 90, 1) * 0.4
-        noise = np.random.normal(0, 0.1)
-        return max(0, min(1, mileage_factor + maintenance_factor + noise))
+        mileage_factor = np.minimum(total_mileage / 200000, 1) * 0.6
+        maintenance_factor = np.minimum(days_since_maintenance / 90, 1) * 0.4
+        noise = rng.normal(0, 0.1, np.shape(total_mileage))
+        return np.clip(mileage_factor + maintenance_factor + noise, 0, 1)
     
-    def _generate_tire_condition(self, total_mileage: int, days_since_maintenance: int) -> float:
+    def _generate_tire_condition(self, total_mileage: np.ndarray, days_since_maintenance: np.ndarray,
+                                 rng: np.random.Generator) -> np.ndarray:
         """Generate tire condition (0-1, higher is worse)"""
-        mileage_factor = min(total_mileage / 100000, 1) * 0.5
-        maintenance_factor = min(days_since_maintenance / 60, 1) * 0.5
-        noise = np.random.normal(0, 0.1)
-        return max(0, min(1, mileage_factor + maintenance_factor + noise))
+        mileage_factor = np.minimum(total_mileage / 100000, 1) * 0.5
+        maintenance_factor = np.minimum(days_since_maintenance / 60, 1) * 0.5
+        noise = rng.normal(0, 0.1, np.shape(total_mileage))
+        return np.clip(mileage_factor + maintenance_factor + noise, 0, 1)
     
-    def _generate_recent_repairs(self, bus_age: int, total_mileage: int) -> int:
+    def _generate_recent_repairs(self, bus_age: np.ndarray, total_mileage: np.ndarray,
+                                 rng: np.random.Generator) -> np.ndarray:
         """Generate number of recent repairs (last 30 days)"""
         base_repairs = (bus_age / 120) * 2 + (total_mileage / 200000) * 3
-        return max(0, int(np.random.poisson(base_repairs)))
+        return rng.poisson(base_repairs)
     
-    def _generate_weather_exposure(self, date: datetime) -> float:
+    def _generate_weather_exposure(self, month: np.ndarray, rng: np.random.Generator) -> np.ndarray:
         """Generate weather exposure factor (0-1, higher is worse)"""
-        month = date.month
-        # Monsoon season (June-September) has higher exposure
-        if month in [6, 7, 8, 9]:
-            return np.random.uniform(0.6, 1.0)
-        elif month in [12, 1, 2]:  # Winter
-            return np.random.uniform(0.4, 0.8)
-        else:
-            return np.random.uniform(0.2, 0.6)
+        # Monsoon season (June-September) has higher exposure, then winter
+        monsoon = np.isin(month, [6, 7, 8, 9])
+        winter = np.isin(month, [12, 1, 2])
+        low = np.select([monsoon, winter], [0.6, 0.4], default=0.2)
+        high = np.select([monsoon, winter], [1.0, 0.8], default=0.6)
+        return rng.uniform(low, high)
     
-    def _calculate_breakdown_probability(self, bus_age: int, total_mileage: int,
-                                       days_since_maintenance: int, engine_temp_trend: float,
-                                       oil_pressure: float, brake_pad_wear: float,
-                                       tire_condition: float, recent_repairs: int,
-                                       weather_exposure: float, driver_aggression: float,
-                                       route_difficulty: float) -> float:
-        """Calculate breakdown probability based on all factors"""
+    def _calculate_breakdown_probability(self, bus_age: np.ndarray, total_mileage: np.ndarray,
+                                       days_since_maintenance: np.ndarray, engine_temp_trend: np.ndarray,
+                                       oil_pressure: np.ndarray, brake_pad_wear: np.ndarray,
+                                       tire_condition: np.ndarray, recent_repairs: np.ndarray,
+                                       weather_exposure: np.ndarray, driver_aggression: np.ndarray,
+                                       route_difficulty: np.ndarray) -> np.ndarray:
+        """Calculate breakdown probability based on all factors (element-wise over arrays)"""
         
         # Age factor (exponential increase with age)
         age_factor = (bus_age / 120) ** 2
@@ -172,7 +204,7 @@ class BreakdownPredictor:
         operational_stress = (weather_exposure + driver_aggression + route_difficulty) / 3
         
         # Recent repairs increase risk
-        repair_factor = min(recent_repairs / 5, 1)
+        repair_factor = np.minimum(recent_repairs / 5, 1)
         
         # Combine all factors
         breakdown_prob = (
@@ -185,15 +217,14 @@ class BreakdownPredictor:
             repair_factor * 0.05
         )
         
-        return min(breakdown_prob, 1.0)
+        return np.minimum(breakdown_prob, 1.0)
     
-    def train_model(self, df: pd.DataFrame) -> Dict:
-        """Train breakdown prediction model"""
+    def train_model(self, df: "pd.DataFrame", n_jobs: int = -1) -> Dict:
+        """Train breakdown prediction model on `n_jobs` cores (all by default)"""
         try:
             from sklearn.ensemble import RandomForestClassifier
             from sklearn.model_selection import train_test_split
             from sklearn.preprocessing import StandardScaler
-            from sklearn.metrics import classification_report, confusion_matrix
             
             logger.info("Training breakdown prediction model...")
             
@@ -221,167 +252,322 @@ class BreakdownPredictor:
                 class_weight='balanced'  # Handle imbalanced data
             )
             
-            self.model.fit(X_train_scaled, y_train)
+            fit_parallel(self.model, X_train_scaled, y_train, n_jobs=n_jobs)
             
-            # Evaluate model
-            y_pred = self.model.predict(X_test_scaled)
-            y_pred_proba = self.model.predict_proba(X_test_scaled)[:, 1]
+            metrics = self._evaluate(X_test_scaled, y_test)
+            self._fit_fast_tier(X_train_scaled, y_train, X_test_scaled, y_test, metrics, n_jobs=n_jobs)
+            return metrics
             
-            # Calculate metrics
-            accuracy = self.model.score(X_test_scaled, y_test)
+        except ImportError:
+            logger.error("scikit-learn not available. Install with: pip install scikit-learn")
+            return {}
+    
+    def tune_model(self, df: "pd.DataFrame", n_candidates: int = 100, factor: int = 3,
+                   n_jobs: int = -1) -> Dict:
+        """
+        Train with forest hyperparameters chosen by a parallel successive-halving
+        search (stratified 5-fold ROC AUC on the training split). The winning
+        parameters are kept in best_params and saved with the model.
+        """
+        try:
+            from sklearn.ensemble import RandomForestClassifier
+            from sklearn.model_selection import StratifiedKFold, train_test_split
+            from sklearn.preprocessing import StandardScaler
             
-            # Feature importance
-            feature_importance = dict(zip(self.feature_names, self.model.feature_importances_))
+            logger.info(f"Tuning breakdown prediction model over {n_candidates} candidates...")
             
-            metrics = {
-                'accuracy': accuracy,
-                'classification_report': classification_report(y_test, y_pred, output_dict=True),
-                'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
-                'feature_importance': feature_importance
-            }
+            X = df[self.feature_names]
+            y = df['breakdown_occurred'].astype(int)
             
-            logger.info(f"Model trained successfully. Accuracy: {accuracy:.3f}")
+            X_train, X_test, y_train, y_test = train_test_split(
+                X, y, test_size=0.2, random_state=42, stratify=y
+            )
+            
+            self.scaler = StandardScaler()
+            X_train_scaled = self.scaler.fit_transform(X_train)
+            X_test_scaled = self.scaler.transform(X_test)
             
+            tuning = tune_forest(
+                RandomForestClassifier(random_state=42, class_weight='balanced'),
+                X_train_scaled, y_train,
+                cv=StratifiedKFold(n_splits=5, shuffle=True, random_state=42),
+                scoring='roc_auc',
+                n_candidates=n_candidates,
+                factor=factor,
+                n_jobs=n_jobs
+            )
+            
+            self.best_params = tuning['best_params']
+            self.model = RandomForestClassifier(random_state=42, class_weight='balanced', **self.best_params)
+            fit_parallel(self.model, X_train_scaled, y_train, n_jobs=n_jobs)
+            
+            metrics = self._evaluate(X_test_scaled, y_test)
+            self._fit_fast_tier(X_train_scaled, y_train, X_test_scaled, y_test, metrics, n_jobs=n_jobs)
+            metrics['best_params'] = self.best_params
+            metrics['tuning'] = tuning
             return metrics
             
         except ImportError:
             logger.error("scikit-learn not available. Install with: pip install scikit-learn")
             return {}
     
-    def predict_breakdown_risk(self, bus_data: Dict) -> Dict:
+    def _evaluate(self, X_test_scaled: np.ndarray, y_test: "pd.Series") -> Dict:
+        """Held-out metrics for the fitted model"""
+        from sklearn.metrics import classification_report, confusion_matrix
+        
+        y_pred = self.model.predict(X_test_scaled)
+        
+        # Calculate metrics
+        accuracy = self.model.score(X_test_scaled, y_test)
+        
+        # Feature importance
+        feature_importance = dict(zip(self.feature_names, self.model.feature_importances_))
+        
+        metrics = {
+            'accuracy': accuracy,
+            'classification_report': classification_report(y_test, y_pred, output_dict=True),
+            'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+            'feature_importance': feature_importance
+        }
+        
+        logger.info(f"Model trained successfully. Accuracy: {accuracy:.3f}")
+        
+        return metrics
+    
+    def _fit_fast_tier(self, X_train_scaled: np.ndarray, y_train: "pd.Series",
+                       X_test_scaled: np.ndarray, y_test: "pd.Series", metrics: Dict, n_jobs: int = -1):
+        """Fit the fast tier and add its held-out scores vs the full model to metrics['fast_tier']"""
+        self.fast_model = fit_fast_variant(self.model, X_train_scaled, y_train, n_jobs=n_jobs)
+        self.fast_tier = tier_summary(
+            self.fast_model,
+            self._tier_scores(self.model, X_test_scaled, y_test),
+            self._tier_scores(self.fast_model, X_test_scaled, y_test)
+        )
+        metrics['fast_tier'] = self.fast_tier
+        
+        logger.info(f"Fast tier: {self.fast_model.n_estimators} trees of depth {self.fast_model.max_depth}, "
+                    f"accuracy {self.fast_tier['delta']['accuracy']:+.3f}, "
+                    f"ROC AUC {self.fast_tier['delta']['roc_auc']:+.3f} vs full model")
+    
+    def _tier_scores(self, model, X_test_scaled: np.ndarray, y_test: "pd.Series") -> Dict[str, float]:
+        """Held-out accuracy and ROC AUC of one tier"""
+        from sklearn.metrics import roc_auc_score
+        
+        return {
+            'accuracy': model.score(X_test_scaled, y_test),
+            'roc_auc': roc_auc_score(y_test, model.predict_proba(X_test_scaled)[:, 1])
+        }
+    
+    def predict_breakdown_risk(self, bus_data: Dict, tier: str = 'full') -> Dict:
         """Predict breakdown risk for a specific bus"""
+        return self.predict_breakdown_risk_batch([bus_data], tier=tier)[0]
+    
+    def predict_breakdown_risk_batch(self, bus_data_list: List[Dict], tier: str = 'full') -> List[Dict]:
+        """
+        Predict breakdown risk for many buses with one scaler.transform
+        (skipped when the scaler is folded into the loaded forest) and one
+        predict_proba over the stacked feature matrix. Risk levels,
+        failure times, confidence and recommendations are derived with
+        vectorised thresholding.
+        
+        tier='fast' scores with the fast tier when one is loaded; each
+        result names the tier that was used.
+        """
         if self.model is None or self.scaler is None:
-            return {
+            return [{
                 'risk_score': 0.5,
                 'risk_level': 'UNKNOWN',
                 'message': 'Model not trained'
-            }
+            } for _ in bus_data_list]
+        
+        if not bus_data_list:
+            return []
         
         try:
             # Prepare features
-            features = []
-            for feature_name in self.feature_names:
-                features.append(bus_data.get(feature_name, 0))
+            features = np.array([
+                [bus_data.get(feature_name, 0) for feature_name in self.feature_names]
+                for bus_data in bus_data_list
+            ], dtype=float)
+            
+            if tier == 'fast' and self.fast_model is not None:
+                model = self.fast_model
+            else:
+                model, tier = self.model, 'full'
             
             # Scale features
-            features_scaled = self.scaler.transform([features])
+            if not getattr(model, 'scaler_folded', False):
+                features = self.scaler.transform(features)
             
             # Predict
-            risk_score = self.model.predict_proba(features_scaled)[0][1]
-            
-            # Determine risk level
-            risk_level = self._categorize_risk(risk_score)
+            risk_scores = model.predict_proba(features)[:, 1]
             
-            # Get recommendations
-            recommendations = self._get_recommendations(risk_score, bus_data)
+            risk_levels = self._categorize_risk(risk_scores)
+            recommendations = self._get_recommendations(risk_scores, bus_data_list)
+            failure_times = self._predict_failure_time(risk_scores)
+            confidence = self._calculate_confidence(risk_scores)
             
-            return {
-                'risk_score': float(risk_score),
-                'risk_level': risk_level,
-                'recommendations': recommendations,
-                'predicted_failure_time': self._predict_failure_time(risk_score),
-                'confidence': self._calculate_confidence(risk_score)
-            }
+            return [
+                {
+                    'risk_score': float(risk_scores[i]),
+                    'risk_level': str(risk_levels[i]),
+                    'recommendations': recommendations[i],
+                    'predicted_failure_time': str(failure_times[i]),
+                    'confidence': float(confidence[i]),
+                    'tier': tier
+                }
+                for i in range(len(bus_data_list))
+            ]
             
         except Exception as e:
             logger.error(f"Error in prediction: {str(e)}")
-            return {
+            return [{
                 'risk_score': 0.5,
                 'risk_level': 'ERROR',
                 'message': str(e)
-            }
+            } for _ in bus_data_list]
     
-    def _categorize_risk(self, risk_score: float) -> str:
-        """Categorize risk score into risk level"""
-        if risk_score >= self.risk_thresholds['CRITICAL']:
-            return 'CRITICAL'
-        elif risk_score >= self.risk_thresholds['HIGH']:
-            return 'HIGH'
-        elif risk_score >= self.risk_thresholds['MEDIUM']:
-            return 'MEDIUM'
-        else:
-            return 'LOW'
+    def _categorize_risk(self, risk_scores: np.ndarray) -> np.ndarray:
+        """Categorize risk scores into risk levels"""
+        return np.select(
+            [
+                risk_scores >= self.risk_thresholds['CRITICAL'],
+                risk_scores >= self.risk_thresholds['HIGH'],
+                risk_scores >= self.risk_thresholds['MEDIUM']
+            ],
+            ['CRITICAL', 'HIGH', 'MEDIUM'],
+            default='LOW'
+        )
     
-    def _get_recommendations(self, risk_score: float, bus_data: Dict) -> List[str]:
-        """Get maintenance recommendations based on risk score and bus data"""
-        recommendations = []
-        
-        if risk_score >= 0.8:
-            recommendations.append("IMMEDIATE: Remove bus from service")
-            recommendations.append("Schedule emergency maintenance")
-        elif risk_score >= 0.6:
-            recommendations.append("Schedule maintenance within 24 hours")
-            recommendations.append("Monitor closely during operation")
-        elif risk_score >= 0.4:
-            recommendations.append("Schedule maintenance within 1 week")
-            recommendations.append("Increase monitoring frequency")
-        else:
-            recommendations.append("Continue normal operation")
-            recommendations.append("Schedule routine maintenance")
+    def _get_recommendations(self, risk_scores: np.ndarray, bus_data_list: List[Dict]) -> List[List[str]]:
+        """Get maintenance recommendations based on risk scores and bus data"""
+        band_recommendations = [
+            ["Continue normal operation", "Schedule routine maintenance"],
+            ["Schedule maintenance within 1 week", "Increase monitoring frequency"],
+            ["Schedule maintenance within 24 hours", "Monitor closely during operation"],
+            ["IMMEDIATE: Remove bus from service", "Schedule emergency maintenance"]
+        ]
+        bands = np.digitize(risk_scores, [0.4, 0.6, 0.8])
         
         # Specific recommendations based on bus data
-        if bus_data.get('days_since_maintenance', 0) > 60:
-            recommendations.append("Overdue for maintenance")
-        
-        if bus_data.get('recent_repairs', 0) > 3:
-            recommendations.append("High repair frequency - investigate root cause")
+        def column(name: str, default: float) -> np.ndarray:
+            return np.array([bus_data.get(name, default) for bus_data in bus_data_list], dtype=float)
         
-        if bus_data.get('engine_temp_trend', 0) > 0.7:
-            recommendations.append("Check engine cooling system")
-        
-        if bus_data.get('oil_pressure', 1) < 0.3:
-            recommendations.append("Check oil system and pressure")
+        flags = [
+            (column('days_since_maintenance', 0) > 60, "Overdue for maintenance"),
+            (column('recent_repairs', 0) > 3, "High repair frequency - investigate root cause"),
+            (column('engine_temp_trend', 0) > 0.7, "Check engine cooling system"),
+            (column('oil_pressure', 1) < 0.3, "Check oil system and pressure")
+        ]
         
-        return recommendations
+        return [
+            band_recommendations[band] + [message for mask, message in flags if mask[i]]
+            for i, band in enumerate(bands)
+        ]
     
-    def _predict_failure_time(self, risk_score: float) -> str:
+    def _predict_failure_time(self, risk_scores: np.ndarray) -> np.ndarray:
         """Predict when failure might occur"""
-        if risk_score >= 0.8:
-            return "Within 24 hours"
-        elif risk_score >= 0.6:
-            return "Within 1 week"
-        elif risk_score >= 0.4:
-            return "Within 1 month"
-        else:
-            return "Low risk - no immediate concern"
+        return np.select(
+            [risk_scores >= 0.8, risk_scores >= 0.6, risk_scores >= 0.4],
+            ["Within 24 hours", "Within 1 week", "Within 1 month"],
+            default="Low risk - no immediate concern"
+        )
     
-    def _calculate_confidence(self, risk_score: float) -> float:
+    def _calculate_confidence(self, risk_scores: np.ndarray) -> np.ndarray:
         """Calculate prediction confidence"""
         # Higher confidence for extreme risk scores
-        if risk_score >= 0.8 or risk_score <= 0.2:
-            return 0.9
-        elif risk_score >= 0.6 or risk_score <= 0.4:
-            return 0.7
-        else:
-            return 0.5
+        return np.select(
+            [
+                (risk_scores >= 0.8) | (risk_scores <= 0.2),
+                (risk_scores >= 0.6) | (risk_scores <= 0.4)
+            ],
+            [0.9, 0.7],
+            default=0.5
+        )
     
-    def save_model(self, model_path: str = "models/breakdown_predictor.pkl"):
-        """Save trained model"""
+    def save_model(self, model_path: Optional[str] = None, fold_scaler: bool = True) -> Optional[str]:
+        """
+        Save trained model and its fast tier as a new registry version, which
+        becomes current, and return the version; given model_path, save there
+        instead. The packed copies have the scaler folded into their
+        thresholds unless fold_scaler is False; the pickle keeps both.
+        """
         if self.model is None:
             logger.warning("No model to save")
-            return
+            return None
         
-        # Create models directory
-        Path("models").mkdir(exist_ok=True)
+        import joblib
+        
+        registry = None
+        if model_path is None:
+            registry = ModelRegistry()
+            version_dir = registry.stage(MODEL_NAME)
+            model_path = version_dir / f"{MODEL_NAME}.pkl"
+        else:
+            Path(model_path).parent.mkdir(parents=True, exist_ok=True)
         
         # Save model and scaler
         joblib.dump({
             'model': self.model,
             'scaler': self.scaler,
             'feature_names': self.feature_names,
-            'risk_thresholds': self.risk_thresholds
+            'risk_thresholds': self.risk_thresholds,
+            'best_params': self.best_params,
+            'fast_tier': self.fast_tier
         }, model_path)
         
-        logger.info(f"Model saved to {model_path}")
+        # Packed copy that serving workers memory-map instead of unpickling the forest
+        save_packed_forest(self.model, packed_path(model_path), extras={
+            'scaler': self.scaler,
+            'feature_names': self.feature_names,
+            'risk_thresholds': self.risk_thresholds,
+            'best_params': self.best_params,
+            'fast_tier': self.fast_tier
+        }, scaler=self.scaler if fold_scaler else None)
+        
+        fast_path = tier_path(model_path, 'fast')
+        if self.fast_model is not None:
+            joblib.dump(self.fast_model, fast_path)
+            save_packed_forest(self.fast_model, packed_path(fast_path), scaler=self.scaler if fold_scaler else None)
+        else:
+            fast_path.unlink(missing_ok=True)
+            packed_path(fast_path).unlink(missing_ok=True)
+        
+        if registry is None:
+            logger.info(f"Model saved to {model_path}")
+            return None
+        
+        self.version = registry.publish(MODEL_NAME, version_dir)
+        logger.info(f"Model saved as {MODEL_NAME} version {self.version}")
+        return self.version
     
-    def load_model(self, model_path: str = "models/breakdown_predictor.pkl"):
-        """Load trained model"""
+    def load_model(self, model_path: Optional[str] = None, mmap: Optional[bool] = None):
+        """
+        Load the registry's current model version (or the model at
+        model_path), memory-mapping the packed forest when available
+        """
         try:
-            model_data = joblib.load(model_path)
-            self.model = model_data['model']
+            version = None
+            if model_path is None:
+                model_dir, version = ModelRegistry().resolve(MODEL_NAME)
+                model_path = model_dir / f"{MODEL_NAME}.pkl"
+            packed = load_packed_if_available(model_path, mmap)
+            if packed is not None:
+                self.model = packed
+                model_data = self.model.extras
+            else:
+                import joblib
+                model_data = joblib.load(model_path)
+                self.model = model_data['model']
             self.scaler = model_data['scaler']
             self.feature_names = model_data['feature_names']
             self.risk_thresholds = model_data['risk_thresholds']
+            self.best_params = model_data.get('best_params')
+            self.fast_tier = model_data.get('fast_tier')
+            
+            fast_path = tier_path(model_path, 'fast')
+            self.fast_model = load_model_file(fast_path, mmap) if fast_path.exists() else None
+            self.version = version
             
             logger.info(f"Model loaded from {model_path}")
             return True
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Demand Statistics Store
+Persistent per-route running sums of demand per (day of week, hour) slot,
+so the ML service can forecast without the backend re-sending its history.
+"""
+
+import sqlite3
+import threading
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Next to this module rather than the working directory (DEMAND_STORE_PATH overrides)
+DEFAULT_DB_PATH = Path(__file__).resolve().parent / "data" / "demand_stats.db"
+
+# Source table -> column holding the demand value
+SOURCES = {
+    'ticket_sales': 'passenger_count',
+    'passenger_counts': 'occupancy'
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS slot_stats (
+    source TEXT NOT NULL,
+    route_id INTEGER NOT NULL,
+    day_of_week INTEGER NOT NULL,
+    hour INTEGER NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (source, route_id, day_of_week, hour)
+);
+CREATE TABLE IF NOT EXISTS generation (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS route_watermarks (
+    source TEXT NOT NULL,
+    route_id INTEGER NOT NULL,
+    last_timestamp_us INTEGER NOT NULL,
+    PRIMARY KEY (source, route_id)
+);
+"""
+
+def slot_timestamps(timestamps) -> "pd.Series":
+    """
+    Parse timestamps for (day of week, hour) slotting. Offset-aware values
+    are converted to UTC and naive ones taken as UTC, so ingested and
+    request-body history land in the same slots.
+    """
+    import pandas as pd
+
+    return pd.to_datetime(timestamps, utc=True)
+
+class DemandStatsStore:
+    """SQLite-backed running demand statistics with per-(source, route) ingest watermarks"""
+
+    def __init__(self, db_path: Union[str, Path] = DEFAULT_DB_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._migrate_source_watermarks()
+        self._conn.commit()
+
+    def _migrate_source_watermarks(self):
+        """
+        Stores written before watermarks were kept per route had one per
+        source; carry it over to every route that source has statistics
+        for, so nothing already counted is counted again.
+        """
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'watermarks'"
+        ).fetchone()
+        if not exists:
+            return
+        self._conn.execute(
+            """
+            INSERT OR IGNORE INTO route_watermarks (source, route_id, last_timestamp_us)
+            SELECT DISTINCT s.source, s.route_id, w.last_timestamp_us
+            FROM slot_stats s JOIN watermarks w ON w.source = s.source
+            """
+        )
+        self._conn.execute("DROP TABLE watermarks")
+
+    def ingest(self, ticket_sales: List[Dict], passenger_counts: List[Dict]) -> Dict:
+        """
+        Add rows newer than their (source, route) watermark to the running sums.
+
+        Rows at or before the watermark have already been counted and are
+        skipped, so the backend can safely resend an overlapping window.
+        Each route advances on its own, so routes may be delivered in
+        separate batches and one route's late data is not dropped because
+        another route is further ahead.
+        """
+        accepted = {}
+        skipped = {}
+        routes = set()
+
+        with self._lock:
+            for source, rows in (('ticket_sales', ticket_sales), ('passenger_counts', passenger_counts)):
+                accepted[source], skipped[source], source_routes = self._ingest_source(source, rows)
+                routes.update(source_routes)
+            if any(accepted.values()):
+                self._conn.execute(
+                    """
+                    INSERT INTO generation (id, value) VALUES (0, 1)
+                    ON CONFLICT (id) DO UPDATE SET value = value + 1
+                    """
+                )
+            self._conn.commit()
+
+        logger.info(f"Ingested {accepted} rows, skipped {skipped} already-seen rows")
+        return {
+            'accepted': accepted,
+            'skipped': skipped,
+            'routes': sorted(routes),
+            'watermarks': self.watermarks(routes)
+        }
+
+    def _ingest_source(self, source: str, rows: List[Dict]) -> Tuple[int, int, List[int]]:
+        """
+        Aggregate one source's rows into slot sums and advance its routes'
+        watermarks. Returns (accepted, skipped, routes touched).
+        """
+        if not rows:
+            return 0, 0, []
+
+        import pandas as pd
+
+        df = pd.DataFrame(rows)
+        value_column = SOURCES[source]
+        timestamps = slot_timestamps(df['timestamp'])
+        timestamps_us = timestamps.to_numpy(dtype='datetime64[us]').astype(np.int64)
+
+        route_ids = df['route_id'].to_numpy().astype(np.int64)
+        watermarks = pd.Series(route_ids).map(self._route_watermarks_us(source)).to_numpy(dtype=float)
+        new = np.isnan(watermarks) | (timestamps_us > watermarks)
+        values = pd.to_numeric(df[value_column], errors='coerce').to_numpy(dtype=float)
+        keep = new & ~np.isnan(values)
+
+        if not keep.any():
+            return 0, len(df), []
+
+        kept_routes = route_ids[keep]
+        slots = pd.DataFrame({
+            'route_id': kept_routes,
+            'day_of_week': timestamps.dt.dayofweek.to_numpy()[keep],
+            'hour': timestamps.dt.hour.to_numpy()[keep],
+            'value': values[keep]
+        }).groupby(['route_id', 'day_of_week', 'hour'])['value'].agg(['sum', 'count']).reset_index()
+
+        self._conn.executemany(
+            """
+            INSERT INTO slot_stats (source, route_id, day_of_week, hour, total, count)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (source, route_id, day_of_week, hour) DO UPDATE SET
+                total = total + excluded.total,
+                count = count + excluded.count
+            """,
+            [
+                (source, int(r.route_id), int(r.day_of_week), int(r.hour), float(r.sum), int(r.count))
+                for r in slots.itertuples(index=False)
+            ]
+        )
+        latest = pd.Series(timestamps_us[keep]).groupby(kept_routes).max()
+        self._conn.executemany(
+            """
+            INSERT INTO route_watermarks (source, route_id, last_timestamp_us) VALUES (?, ?, ?)
+            ON CONFLICT (source, route_id) DO UPDATE SET
+                last_timestamp_us = MAX(last_timestamp_us, excluded.last_timestamp_us)
+            """,
+            [(source, int(route_id), int(timestamp_us)) for route_id, timestamp_us in latest.items()]
+        )
+
+        return int(keep.sum()), int(len(df) - keep.sum()), slots['route_id'].unique().tolist()
+
+    def _route_watermarks_us(self, source: str) -> Dict[int, int]:
+        return dict(self._conn.execute(
+            "SELECT route_id, last_timestamp_us FROM route_watermarks WHERE source = ?", (source,)
+        ).fetchall())
+
+    def watermarks(self, routes: Optional[Iterable[int]] = None) -> Dict[str, Dict[str, str]]:
+        """
+        Latest ingested timestamp per source and route (ISO 8601, UTC),
+        optionally only for `routes`
+        """
+        import pandas as pd
+
+        wanted = None if routes is None else {int(route_id) for route_id in routes}
+        result = {}
+        for source in SOURCES:
+            with self._lock:
+                watermarks = self._route_watermarks_us(source)
+            result[source] = {
+                str(route_id): pd.Timestamp(watermark, unit='us', tz='UTC').isoformat()
+                for route_id, watermark in sorted(watermarks.items())
+                if wanted is None or route_id in wanted
+            }
+        return result
+
+    def generation(self) -> int:
+        """
+        Counter bumped by every ingest that adds rows. Part of forecast cache
+        keys, so every process reading this file stops serving forecasts
+        built from older statistics.
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM generation WHERE id = 0").fetchone()
+        return row[0] if row else 0
+
+    def total_rows(self) -> int:
+        """Number of rows folded into the running sums"""
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM slot_stats").fetchone()
+        return int(row[0])
+
+    def slot_means(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (route_ids, sales_mean, counts_mean) with the means shaped
+        (route, day_of_week, hour) and NaN for slots without data.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, route_id, day_of_week, hour, total, count FROM slot_stats"
+            ).fetchall()
+
+        if not rows:
+            empty = np.full((0, 7, 24), np.nan)
+            return np.array([], dtype=np.int64), empty, empty.copy()
+
+        import pandas as pd
+
+        stats = pd.DataFrame(rows, columns=['source', 'route_id', 'day_of_week', 'hour', 'total', 'count'])
+        route_ids = np.unique(stats['route_id'].to_numpy())
+        route_index = np.searchsorted(route_ids, stats['route_id'].to_numpy())
+
+        means = {}
+        for source in SOURCES:
+            cube = np.full((len(route_ids), 7, 24), np.nan)
+            mask = (stats['source'] == source).to_numpy()
+            cube[route_index[mask], stats['day_of_week'].to_numpy()[mask], stats['hour'].to_numpy()[mask]] = (
+                stats['total'].to_numpy()[mask] / stats['count'].to_numpy()[mask]
+            )
+            means[source] = cube
+
+        return route_ids, means['ticket_sales'], means['passenger_counts']
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
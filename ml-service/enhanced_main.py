@@ -6,15 +6,25 @@ This service uses machine learning models for demand prediction and schedule opt
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import pandas as pd
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Tuple
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import json
 import logging
-import joblib
-from pathlib import Path
+import os
+
+from executor import executor_info, run_cpu, run_threaded, shutdown_executors
+from feature_store import FEATURE_NAMES, HISTORY_HOURS, LAG_COLUMNS, OnlineFeatureStore
+from forest_arrays import load_model_file
+from model_loading import ModelLoader
+from model_registry import ModelRegistry, RegistryWatcher
+from model_tiers import ModelTier, tier_path
+from headway_optimizer import DEFAULT_CONSTRAINTS, optimize_headways, period_demand, service_periods
+from forecast_cache import ForecastCache
+from forecast_rng import forecast_rng, effective_seed
+from serving import process_memory, run_service
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,11 +45,25 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Longest forecast horizon a request may ask for (one week)
+MAX_PREDICTION_HOURS = 168
+
 # Pydantic models
 class PredictionRequest(BaseModel):
-    route_id: int
-    prediction_hours: int = 24
+    route_id: Optional[int] = None
+    route_ids: Optional[List[int]] = None
+    prediction_hours: int = Field(default=24, ge=1, le=MAX_PREDICTION_HOURS)
     historical_data: Optional[Dict[str, Any]] = None
+    seed: Optional[int] = Field(default=None, ge=0)
+
+    def requested_routes(self) -> List[int]:
+        """All routes to forecast, single route_id first"""
+        routes = [self.route_id] if self.route_id is not None else []
+        routes.extend(r for r in (self.route_ids or []) if r not in routes)
+        return routes
+
+class ObservationRequest(BaseModel):
+    hourly_counts: List[Dict[str, Any]]
 
 class OptimizationRequest(BaseModel):
     route_id: int
@@ -48,7 +72,7 @@ class OptimizationRequest(BaseModel):
     demand_forecast: Optional[List[Dict]] = None
 
 class PredictionResponse(BaseModel):
-    route_id: int
+    route_id: Optional[int]
     predictions: List[Dict[str, Any]]
     model_info: Dict[str, Any]
     generated_at: datetime
@@ -62,35 +86,63 @@ class OptimizationResponse(BaseModel):
 
 # Global variables for models
 demand_model = None
+fast_demand_model = None  # Smaller forest served for ?tier=fast
 model_metadata = None
 feature_names = None
+model_version = None  # Registry version being served (None for the flat pre-registry layout)
+registry = ModelRegistry()
+feature_store = OnlineFeatureStore()
+forecast_cache = ForecastCache(
+    max_entries=int(os.getenv("FORECAST_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL_SECONDS", "300"))
+)
 
-@app.on_event("startup")
-async def load_models():
-    """Load trained models on startup"""
-    global demand_model, model_metadata, feature_names
+def load_demand_models():
+    """
+    Load the registry's current demand model version (run by the model
+    loader at startup and on reload, see model_loading.py). Models are read
+    fully before the globals are swapped, so requests in flight keep the
+    model they started with; a version already being served is not reread.
+    """
+    global demand_model, fast_demand_model, model_metadata, feature_names, model_version
     
-    try:
-        # Load demand prediction model
-        model_path = Path("models/demand_model.pkl")
-        metadata_path = Path("models/demand_model_metadata.json")
+    # Load demand prediction model
+    model_dir, version = registry.resolve("demand_model")
+    if demand_model is not None and version == model_version:
+        return
+    model_path = model_dir / "demand_model.pkl"
+    metadata_path = model_dir / "demand_model_metadata.json"
+    
+    if model_path.exists() and metadata_path.exists():
+        model = load_model_file(model_path)
+        fast_path = tier_path(model_path, 'fast')
+        fast_model = load_model_file(fast_path) if fast_path.exists() else None
         
-        if model_path.exists() and metadata_path.exists():
-            demand_model = joblib.load(model_path)
-            
-            with open(metadata_path, 'r') as f:
-                model_metadata = json.load(f)
-            
-            feature_names = model_metadata.get('feature_names', [])
-            
-            logger.info("Trained models loaded successfully")
-            logger.info(f"Model accuracy: {model_metadata['metrics']['accuracy']:.2%}")
-        else:
-            logger.warning("Trained models not found, using fallback algorithms")
-            
-    except Exception as e:
-        logger.error(f"Error loading models: {str(e)}")
-        logger.warning("Falling back to simple algorithms")
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        
+        demand_model, fast_demand_model, model_metadata, model_version = model, fast_model, metadata, version
+        feature_names = model_metadata.get('feature_names', [])
+        if feature_names != FEATURE_NAMES:
+            logger.warning(f"Model features {feature_names} differ from the service's {FEATURE_NAMES}; "
+                           f"forecasts will use the fallback algorithm")
+        forecast_cache.invalidate_all()
+        
+        logger.info(f"Trained models loaded successfully (version {version or 'unversioned'})")
+        logger.info(f"Model accuracy: {model_metadata['metrics']['accuracy']:.2%}")
+    elif version is not None:
+        raise FileNotFoundError(f"demand_model version {version} is missing {model_path.name} or its metadata")
+    else:
+        logger.warning("Trained models not found, using fallback algorithms")
+
+models = ModelLoader(load_demand_models)
+registry_watcher = RegistryWatcher(registry, ["demand_model"], models.reload)
+
+@app.on_event("startup")
+async def load_models():
+    """Start loading trained models (in the background unless MODEL_LOADING=eager) and watching for new versions"""
+    models.start()
+    registry_watcher.start()
 
 @app.get("/health")
 async def health_check():
@@ -100,168 +152,337 @@ async def health_check():
         "timestamp": datetime.now().isoformat(),
         "version": "2.0.0",
         "model_loaded": demand_model is not None,
-        "model_accuracy": model_metadata['metrics']['accuracy'] if model_metadata else None
+        "model_version": model_version,
+        "model_accuracy": model_metadata['metrics']['accuracy'] if model_metadata else None,
+        "forecast_cache": forecast_cache.stats(),
+        "executor": executor_info(),
+        "model_memory_mapped": getattr(demand_model, 'is_memory_mapped', False),
+        "model_loading": models.status(),
+        "process": process_memory()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 200 once models are loaded (or MODEL_LOADING=lazy), 503 while they load or after a failed load"""
+    status = models.status()
+    return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    registry_watcher.stop()
+    shutdown_executors()
+
 @app.post("/predict", response_model=PredictionResponse)
-async def predict_demand(request: PredictionRequest):
+async def predict_demand(request: PredictionRequest, tier: ModelTier = 'full'):
     """
-    Predict passenger demand using trained ML model
+    Predict passenger demand using trained ML model.
+    ?tier=fast uses the smaller, lower-latency forest when one is trained.
     """
     try:
-        logger.info(f"Predicting demand for route {request.route_id}")
+        route_ids = request.requested_routes()
+        if not route_ids:
+            raise HTTPException(status_code=400, detail="route_id or route_ids is required")
         
-        if demand_model is None:
-            # Fallback to simple prediction
-            predictions = await simple_demand_prediction(request)
-        else:
-            # Use trained model
-            predictions = await ml_demand_prediction(request)
+        await models.wait()
+        logger.info(f"Predicting demand for routes {route_ids}")
+        
+        if request.historical_data and request.historical_data.get('hourly_counts'):
+            await run_threaded(
+                observe_hourly_rows, request.historical_data['hourly_counts'], default_route_id=route_ids[0]
+            )
+        
+        model, tier = serving_model(tier)
+        served_version = model_version
+        
+        # Serve cached routes, forecast only the rest
+        version = (current_model_version(tier), effective_seed(request.seed))
+        by_route = {}
+        for route_id in route_ids:
+            cached = forecast_cache.get(forecast_cache.key(route_id, request.prediction_hours, version))
+            if cached is not None:
+                by_route[route_id] = cached
+        
+        missing = [route_id for route_id in route_ids if route_id not in by_route]
+        if missing:
+            missing_request = request.model_copy(update={'route_id': None, 'route_ids': missing})
+            
+            if demand_model is None:
+                # Fallback to simple prediction
+                fresh = await run_cpu(simple_demand_prediction, missing_request)
+            else:
+                # Use trained model (needs the in-process model and feature store)
+                fresh = await run_threaded(ml_demand_prediction, missing_request, model)
+            
+            for route_id in missing:
+                by_route[route_id] = [p for p in fresh if p['route_id'] == route_id]
+                forecast_cache.put(forecast_cache.key(route_id, request.prediction_hours, version), by_route[route_id])
+        
+        predictions = [p for route_id in route_ids for p in by_route[route_id]]
         
         return PredictionResponse(
-            route_id=request.route_id,
+            route_id=route_ids[0] if len(route_ids) == 1 else None,
             predictions=predictions,
             model_info={
                 "model_type": "trained_ml_model" if demand_model else "simple_algorithm",
                 "accuracy": model_metadata['metrics']['accuracy'] if model_metadata else 0.7,
                 "features_used": feature_names if feature_names else [],
-                "training_date": model_metadata.get('training_date') if model_metadata else None
+                "training_date": model_metadata.get('training_date') if model_metadata else None,
+                "version": served_version,
+                "tier": tier
             },
             generated_at=datetime.now()
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in prediction: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
-async def ml_demand_prediction(request: PredictionRequest) -> List[Dict[str, Any]]:
-    """Predict demand using trained ML model"""
-    predictions = []
+def serving_model(tier: str) -> Tuple[Any, str]:
+    """Model for a requested tier and the tier actually served (full when no fast tier is loaded)"""
+    if tier == 'fast' and fast_demand_model is not None:
+        return fast_demand_model, 'fast'
+    return demand_model, 'full'
+
+def current_model_version(tier: str = 'full') -> str:
+    """Identifier of the active model and tier, part of every forecast cache key"""
+    if demand_model is None:
+        return "simple_algorithm"
+    version = model_version or model_metadata.get('training_date', 'trained_ml_model')
+    return version if tier == 'full' else f"{version}:{tier}"
+
+def observe_hourly_rows(rows: List[Dict], default_route_id: Optional[int] = None) -> int:
+    """Feed hourly counts to the feature store and drop stale cached forecasts"""
+    observed = feature_store.observe_rows(rows, default_route_id=default_route_id)
+    routes = {row.get('route_id', default_route_id) for row in rows}
+    for route_id in routes - {None}:
+        forecast_cache.invalidate_route(int(route_id))
+    return observed
+
+def ml_demand_prediction(request: PredictionRequest, model: Any = None) -> List[Dict[str, Any]]:
+    """Predict demand using trained ML model (the full tier unless `model` is given)"""
+    model = demand_model if model is None else model
+    route_ids = request.requested_routes()
     current_time = datetime.now()
+    prediction_times = [current_time + timedelta(hours=i) for i in range(request.prediction_hours)]
     
-    for i in range(request.prediction_hours):
-        prediction_time = current_time + timedelta(hours=i)
-        
-        # Prepare features for prediction
-        features = prepare_prediction_features(
-            prediction_time, 
-            request.route_id,
-            request.historical_data
-        )
-        
-        # Make prediction
-        if demand_model and len(features) == len(feature_names):
-            predicted_demand = demand_model.predict([features])[0]
-            confidence = 0.85  # High confidence for trained model
+    # Prepare the (routes x hours, features) matrix for the whole horizon
+    features = prepare_prediction_features(
+        prediction_times, route_ids, request.historical_data, seed=request.seed
+    )
+    
+    # Make prediction
+    if model is not None and feature_names == FEATURE_NAMES:
+        predicted_demand = predict_with_feature_store(features, prediction_times, route_ids, request.seed, model)
+        confidence = 0.85  # High confidence for trained model
+    else:
+        # Fallback prediction
+        predicted_demand = np.concatenate([
+            simple_hourly_demand(prediction_times, forecast_rng(request.seed, route_id, current_time))
+            for route_id in route_ids
+        ])
+        confidence = 0.6
+    
+    predicted_demand = np.maximum(0, predicted_demand).astype(int)
+    
+    predictions = []
+    for r, route_id in enumerate(route_ids):
+        offset = r * len(prediction_times)
+        for i, prediction_time in enumerate(prediction_times):
+            predictions.append({
+                "route_id": route_id,
+                "hour": prediction_time.hour,
+                "day_of_week": prediction_time.weekday(),
+                "predicted_passengers": int(predicted_demand[offset + i]),
+                "confidence": confidence,
+                "timestamp": prediction_time.isoformat()
+            })
+    
+    return predictions
+
+def predict_with_feature_store(features: np.ndarray, prediction_times: List[datetime],
+                               route_ids: List[int], seed: Optional[int] = None,
+                               model: Any = None) -> np.ndarray:
+    """
+    Predict the route-major feature matrix, filling lag/rolling columns from
+    the online feature store.
+    
+    Routes without observed history keep the placeholder lag columns and are
+    scored in a single predict call. Routes with history are rolled forward
+    hour by hour, each prediction pushed back into a copy of the route's
+    buffer so later hours see it as lag_1; each step is one predict call
+    across all such routes. Hours between the last observation and the
+    forecast start are rolled forward the same way first.
+    """
+    model = demand_model if model is None else model
+    n_hours = len(prediction_times)
+    predicted = np.empty(len(route_ids) * n_hours)
+    start_hour = prediction_times[0].replace(minute=0, second=0, microsecond=0)
+    # Buffers hold naive UTC hours; prediction times are host-local
+    start_hour_utc = start_hour.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    warm = {}
+    for r, route_id in enumerate(route_ids):
+        buffer = feature_store.snapshot(route_id)
+        if buffer is None:
+            continue
+        gap = max(0, int((start_hour_utc - buffer.last_hour) / timedelta(hours=1)) - 1)
+        if gap <= HISTORY_HOURS:
+            warm[r] = (buffer, gap)
+    
+    cold = [r for r in range(len(route_ids)) if r not in warm]
+    if cold:
+        rows = np.concatenate([np.arange(r * n_hours, (r + 1) * n_hours) for r in cold])
+        predicted[rows] = model.predict(features[rows])
+    
+    if not warm:
+        return predicted
+    
+    # Catch-up hours get their own time/weather features
+    max_gap = max(gap for _, gap in warm.values())
+    catch_up_times = [start_hour - timedelta(hours=h) for h in range(max_gap, 0, -1)]
+    catch_up = prepare_prediction_features(catch_up_times, [None], seed=seed) if catch_up_times else None
+    
+    for step in range(-max_gap, n_hours):
+        active = [r for r, (_, gap) in warm.items() if step >= -gap]
+        if step < 0:
+            step_features = np.repeat(catch_up[[max_gap + step]], len(active), axis=0)
         else:
-            # Fallback prediction
-            predicted_demand = simple_hourly_demand(prediction_time)
-            confidence = 0.6
+            step_features = features[[r * n_hours + step for r in active]]
         
-        predictions.append({
-            "hour": prediction_time.hour,
-            "day_of_week": prediction_time.weekday(),
-            "predicted_passengers": max(0, int(predicted_demand)),
-            "confidence": confidence,
-            "timestamp": prediction_time.isoformat()
-        })
+        step_features[:, LAG_COLUMNS] = [warm[r][0].features() for r in active]
+        step_predictions = model.predict(step_features)
+        
+        for r, value in zip(active, step_predictions):
+            warm[r][0].push(max(0.0, float(value)))
+            if step >= 0:
+                predicted[r * n_hours + step] = value
     
-    return predictions
+    return predicted
 
-async def simple_demand_prediction(request: PredictionRequest) -> List[Dict[str, Any]]:
+def simple_demand_prediction(request: PredictionRequest) -> List[Dict[str, Any]]:
     """Simple demand prediction fallback"""
     predictions = []
     current_time = datetime.now()
+    prediction_times = [current_time + timedelta(hours=i) for i in range(request.prediction_hours)]
     
-    for i in range(request.prediction_hours):
-        prediction_time = current_time + timedelta(hours=i)
-        predicted_demand = simple_hourly_demand(prediction_time)
+    for route_id in request.requested_routes():
+        predicted_demand = simple_hourly_demand(prediction_times, forecast_rng(request.seed, route_id, current_time))
         
-        predictions.append({
-            "hour": prediction_time.hour,
-            "day_of_week": prediction_time.weekday(),
-            "predicted_passengers": predicted_demand,
-            "confidence": 0.6,
-            "timestamp": prediction_time.isoformat()
-        })
+        for i, prediction_time in enumerate(prediction_times):
+            predictions.append({
+                "route_id": route_id,
+                "hour": prediction_time.hour,
+                "day_of_week": prediction_time.weekday(),
+                "predicted_passengers": int(predicted_demand[i]),
+                "confidence": 0.6,
+                "timestamp": prediction_time.isoformat()
+            })
     
     return predictions
 
-def prepare_prediction_features(prediction_time: datetime, route_id: int, 
-                              historical_data: Optional[Dict] = None) -> List[float]:
-    """Prepare features for ML model prediction"""
-    features = []
+HOLIDAYS = [(1, 1), (8, 15), (10, 2), (12, 25)]
+
+def prepare_prediction_features(prediction_times: List[datetime], route_ids: List[int],
+                              historical_data: Optional[Dict] = None,
+                              seed: Optional[int] = None) -> np.ndarray:
+    """
+    Prepare the ML feature matrix for every (route, hour) pair.
     
-    # Time features
-    features.append(prediction_time.hour)
-    features.append(prediction_time.weekday())
-    features.append(prediction_time.month)
-    features.append(1 if prediction_time.weekday() >= 5 else 0)  # is_weekend
-    features.append(1 if prediction_time.hour in [7, 8, 17, 18] else 0)  # is_peak_hour
+    Rows are route-major: row r * len(prediction_times) + i is route_ids[r]
+    at prediction_times[i]. Columns are FEATURE_NAMES, the training order.
+    Weather noise is drawn per route from forecast_rng, so a route's rows
+    do not depend on which other routes are in the batch.
+    """
+    hours = np.array([t.hour for t in prediction_times])
+    weekdays = np.array([t.weekday() for t in prediction_times])
+    months = np.array([t.month for t in prediction_times])
     
     # Holiday feature (simplified)
-    holidays = [(1, 1), (8, 15), (10, 2), (12, 25)]
-    is_holiday = (prediction_time.month, prediction_time.day) in holidays
-    features.append(1 if is_holiday else 0)
+    is_holiday = np.array([(t.month, t.day) in HOLIDAYS for t in prediction_times])
+    
+    n_rows = len(route_ids) * len(prediction_times)
+    features = np.empty((n_rows, len(FEATURE_NAMES)))
+    
+    # Time features
+    features[:, 0] = np.tile(hours, len(route_ids))
+    features[:, 1] = np.tile(weekdays, len(route_ids))
+    features[:, 2] = np.tile(months, len(route_ids))
+    features[:, 3] = np.tile(weekdays >= 5, len(route_ids))  # is_weekend
+    features[:, 4] = np.tile(np.isin(hours, [7, 8, 17, 18]), len(route_ids))  # is_peak_hour
+    features[:, 5] = np.tile(is_holiday, len(route_ids))
     
     # Weather features (simplified)
-    features.append(generate_temperature(prediction_time.hour, prediction_time.month))
-    features.append(generate_precipitation(prediction_time.month))
+    for r, route_id in enumerate(route_ids):
+        block = slice(r * len(prediction_times), (r + 1) * len(prediction_times))
+        rng = forecast_rng(seed, route_id, prediction_times[0]) if prediction_times else None
+        features[block, 6] = generate_temperature(hours, months, rng)
+        features[block, 7] = generate_precipitation(months, rng)
     
-    # Lag features (simplified - would need historical data)
-    features.append(20)  # passenger_count_lag_1 (placeholder)
-    features.append(18)  # passenger_count_lag_24 (placeholder)
-    features.append(22)  # passenger_count_lag_168 (placeholder)
+    # Lag features, placeholders until filled from the online feature store
+    features[:, 8] = 20   # passenger_count_lag_1 (placeholder)
+    features[:, 9] = 18   # passenger_count_lag_24 (placeholder)
+    features[:, 10] = 22  # passenger_count_lag_168 (placeholder)
     
-    # Rolling averages (simplified)
-    features.append(20)  # passenger_avg_24h (placeholder)
-    features.append(19)  # passenger_avg_7d (placeholder)
-    features.append(3)   # passenger_std_24h (placeholder)
+    # Rolling averages (placeholders)
+    features[:, 11] = 20  # passenger_avg_24h (placeholder)
+    features[:, 12] = 19  # passenger_avg_7d (placeholder)
+    features[:, 13] = 3   # passenger_std_24h (placeholder)
     
     return features
 
-def simple_hourly_demand(prediction_time: datetime) -> int:
-    """Simple demand prediction based on time patterns"""
-    hour = prediction_time.hour
-    day_of_week = prediction_time.weekday()
-    
-    # Base demand by hour
-    if hour in [7, 8, 17, 18]:  # Peak hours
-        base_demand = 35
-    elif hour in [6, 9, 16, 19]:  # Moderate hours
-        base_demand = 25
-    elif 6 <= hour <= 22:  # Regular hours
-        base_demand = 15
-    else:  # Night hours
-        base_demand = 5
+def simple_hourly_demand(prediction_times: List[datetime], rng: np.random.Generator) -> np.ndarray:
+    """Simple demand prediction based on time patterns, one noise draw for the horizon"""
+    hours = np.array([t.hour for t in prediction_times])
+    weekdays = np.array([t.weekday() for t in prediction_times])
+    
+    # Base demand by hour: peak, moderate, regular, night
+    base_demand = np.select(
+        [np.isin(hours, [7, 8, 17, 18]), np.isin(hours, [6, 9, 16, 19]), (hours >= 6) & (hours <= 22)],
+        [35, 25, 15],
+        default=5
+    )
     
     # Weekend adjustment
-    if day_of_week >= 5:
-        base_demand = int(base_demand * 0.7)
+    base_demand = np.where(weekdays >= 5, (base_demand * 0.7).astype(int), base_demand)
     
     # Add some randomness
-    noise = np.random.normal(0, base_demand * 0.1)
-    return max(0, int(base_demand + noise))
+    noise = rng.normal(0, base_demand * 0.1)
+    return np.maximum(0, np.trunc(base_demand + noise)).astype(int)
+
+MONTHLY_TEMPERATURE = np.array([25, 20, 22, 28, 32, 35, 33, 30, 29, 30, 28, 24, 21])
 
-def generate_temperature(hour: int, month: int) -> float:
+def generate_temperature(hour: np.ndarray, month: np.ndarray, rng: np.random.Generator) -> np.ndarray:
     """Generate temperature based on hour and month"""
-    monthly_temp = {
-        1: 20, 2: 22, 3: 28, 4: 32, 5: 35, 6: 33,
-        7: 30, 8: 29, 9: 30, 10: 28, 11: 24, 12: 21
-    }
-    
-    base_temp = monthly_temp.get(month, 25)
+    base_temp = MONTHLY_TEMPERATURE[month]
     daily_variation = 8 * np.sin((hour - 6) * np.pi / 12)
-    noise = np.random.normal(0, 2)
+    noise = rng.normal(0, 2, size=len(hour))
     
     return base_temp + daily_variation + noise
 
-def generate_precipitation(month: int) -> float:
+def generate_precipitation(month: np.ndarray, rng: np.random.Generator) -> np.ndarray:
     """Generate precipitation based on month"""
-    if month in [6, 7, 8, 9]:  # Monsoon
-        return np.random.exponential(2.0)
-    else:
-        return np.random.exponential(0.5)
+    monsoon = np.isin(month, [6, 7, 8, 9])  # Monsoon
+    return rng.exponential(np.where(monsoon, 2.0, 0.5))
+
+@app.post("/features/observe")
+async def observe_hourly_counts(request: ObservationRequest):
+    """
+    Feed observed hourly passenger counts ({route_id, timestamp, passenger_count})
+    into the online feature store used for lag and rolling features
+    """
+    try:
+        observed = await run_threaded(observe_hourly_rows, request.hourly_counts)
+        return {
+            "observed_route_hours": observed,
+            "routes": feature_store.routes(),
+            "timestamp": datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error observing hourly counts: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Observation failed: {str(e)}")
 
 @app.post("/optimize", response_model=OptimizationResponse)
 async def optimize_schedule(request: OptimizationRequest):
@@ -270,9 +491,10 @@ async def optimize_schedule(request: OptimizationRequest):
     """
     try:
         logger.info(f"Optimizing schedule for route {request.route_id}")
+        await models.wait()
         
         # Generate optimized schedule
-        optimized_schedule = await generate_optimized_schedule(request)
+        optimized_schedule = await run_cpu(generate_optimized_schedule, request)
         
         # Calculate improvements
         improvements = calculate_improvements(
@@ -285,7 +507,7 @@ async def optimize_schedule(request: OptimizationRequest):
             optimized_schedule=optimized_schedule,
             improvements=improvements,
             model_info={
-                "optimization_method": "constraint_based_optimization",
+                "optimization_method": "period_headway_dynamic_programming",
                 "constraints_applied": list(request.constraints.keys()),
                 "demand_model_used": "trained_ml_model" if demand_model else "simple_algorithm"
             },
@@ -296,68 +518,79 @@ async def optimize_schedule(request: OptimizationRequest):
         logger.error(f"Error in optimization: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
 
-async def generate_optimized_schedule(request: OptimizationRequest) -> Dict[str, Any]:
-    """Generate optimized schedule using AI algorithms"""
+def generate_optimized_schedule(request: OptimizationRequest) -> Dict[str, Any]:
+    """Generate a schedule with a demand-aware headway for each period of the day"""
     
     # Get current schedule
     current = request.current_schedule
-    constraints = request.constraints
-    
-    # Calculate optimal headway based on demand
-    if request.demand_forecast:
-        avg_demand = np.mean([p['predicted_passengers'] for p in request.demand_forecast])
-        optimal_headway = calculate_optimal_headway(avg_demand, constraints)
-    else:
-        optimal_headway = current.get('headway_minutes', 15)
-    
-    # Apply constraints
-    min_headway = constraints.get('min_headway', 5)
-    max_headway = constraints.get('max_headway', 30)
-    optimal_headway = max(min_headway, min(optimal_headway, max_headway))
+    constraints = {
+        'capacity': current.get('capacity'),
+        'cycle_time_minutes': current.get('cycle_time_minutes'),
+        'fleet_size': current.get('fleet_size'),
+        **request.constraints
+    }
     
-    # Calculate new schedule
+    # Parse times
     start_time = current.get('start_time', '06:00')
     end_time = current.get('end_time', '22:00')
+    start_minutes = parse_clock_minutes(start_time)
+    end_minutes = parse_clock_minutes(end_time)
     
-    # Parse times
-    start_hour, start_min = map(int, start_time.split(':'))
-    end_hour, end_min = map(int, end_time.split(':'))
+    period_starts, period_ends = service_periods(
+        start_minutes, end_minutes, constraints.get('period_minutes') or DEFAULT_CONSTRAINTS['period_minutes']
+    )
     
-    start_minutes = start_hour * 60 + start_min
-    end_minutes = end_hour * 60 + end_min
+    if request.demand_forecast:
+        # Choose a headway per period against the forecast
+        demand = period_demand(request.demand_forecast, period_starts, period_ends)
+        plan = optimize_headways(demand, period_starts, period_ends, constraints)
+        reason = "Per-period headways chosen for forecast demand, load factor and fleet size"
+    else:
+        # No forecast: keep the current headway, clamped to the constraints
+        min_headway = constraints.get('min_headway', 5)
+        max_headway = constraints.get('max_headway', 30)
+        headway = max(min_headway, min(current.get('headway_minutes', 15), max_headway))
+        plan = optimize_headways(
+            np.zeros(len(period_starts)), period_starts, period_ends,
+            {**constraints, 'min_headway': headway, 'max_headway': headway}
+        )
+        reason = f"No demand forecast; kept {headway}-minute headway"
     
-    # Calculate total trips
-    total_minutes = end_minutes - start_minutes
-    total_trips = int(total_minutes / optimal_headway)
+    trip_minutes = plan.trip_minutes()
+    trip_times = [f"{(m // 60) % 24:02d}:{m % 60:02d}" for m in trip_minutes.tolist()]
     
-    # Generate trip times
-    trip_times = []
-    for i in range(total_trips):
-        trip_minutes = start_minutes + (i * optimal_headway)
-        trip_hour = trip_minutes // 60
-        trip_min = trip_minutes % 60
-        trip_times.append(f"{trip_hour:02d}:{trip_min:02d}")
+    # Service-time-weighted average, comparable with the current single headway
+    lengths = period_ends - period_starts
+    average_headway = int(round(float(np.average(plan.headways, weights=lengths))))
     
     return {
         "start_time": start_time,
         "end_time": end_time,
-        "headway_minutes": optimal_headway,
-        "total_trips": total_trips,
+        "headway_minutes": average_headway,
+        "total_trips": len(trip_times),
         "trip_times": trip_times,
-        "optimization_reason": f"Optimized for {optimal_headway}-minute headway based on demand"
+        "periods": [
+            {
+                "start_time": f"{(start // 60) % 24:02d}:{start % 60:02d}",
+                "end_time": f"{(end // 60) % 24:02d}:{end % 60:02d}",
+                "headway_minutes": int(headway),
+                "expected_demand": round(float(demand), 1),
+                "load_factor": round(float(load), 3),
+                "buses_required": int(buses)
+            }
+            for start, end, headway, demand, load, buses in zip(
+                plan.period_starts.tolist(), plan.period_ends.tolist(), plan.headways,
+                plan.demand, plan.load_factors, plan.buses_required
+            )
+        ],
+        "peak_buses_required": int(plan.buses_required.max()) if len(plan.buses_required) else 0,
+        "optimization_reason": reason
     }
 
-def calculate_optimal_headway(avg_demand: float, constraints: Dict) -> int:
-    """Calculate optimal headway based on demand"""
-    # Simple optimization: adjust headway based on demand
-    if avg_demand > 30:
-        return 8  # High demand - frequent service
-    elif avg_demand > 20:
-        return 12  # Medium demand
-    elif avg_demand > 10:
-        return 15  # Low demand
-    else:
-        return 20  # Very low demand
+def parse_clock_minutes(time_str: str) -> int:
+    """'HH:MM' or 'HH:MM:SS' to minutes since midnight"""
+    parts = time_str.split(':')
+    return int(parts[0]) * 60 + int(parts[1])
 
 def calculate_improvements(current: Dict, optimized: Dict) -> Dict[str, Any]:
     """Calculate improvements from optimization"""
@@ -387,17 +620,24 @@ def calculate_improvements(current: Dict, optimized: Dict) -> Dict[str, Any]:
 @app.get("/model/info")
 async def get_model_info():
     """Get information about loaded models"""
+    await models.wait()
     if model_metadata:
         return {
             "model_loaded": True,
             "model_type": "Random Forest Regressor",
+            "version": model_version,
+            "versions": registry.versions("demand_model"),
             "training_date": model_metadata.get('training_date'),
             "accuracy": model_metadata['metrics']['accuracy'],
             "mae": model_metadata['metrics']['mae'],
             "rmse": model_metadata['metrics']['rmse'],
             "r2_score": model_metadata['metrics']['r2_score'],
             "feature_count": len(feature_names) if feature_names else 0,
-            "features": feature_names if feature_names else []
+            "features": feature_names if feature_names else [],
+            "tiers": {
+                "full": {"n_estimators": demand_model.n_estimators if demand_model is not None else None},
+                "fast": {"available": fast_demand_model is not None, **model_metadata.get('fast_tier', {})}
+            }
         }
     else:
         return {
@@ -405,9 +645,30 @@ async def get_model_info():
             "message": "No trained model loaded, using fallback algorithms"
         }
 
+@app.post("/model/reload")
+async def reload_models():
+    """
+    Swap in the registry's current model version without a restart (also
+    done by the registry watcher); requests already running finish on the
+    model they started with
+    """
+    try:
+        previous = model_version
+        await run_threaded(models.reload)
+        return {
+            "previous_version": previous,
+            "version": model_version,
+            "reloaded": model_version != previous,
+            "timestamp": datetime.now().isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Error reloading models: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Model reload failed: {str(e)}")
+
 @app.get("/model/features")
 async def get_feature_importance():
     """Get feature importance from trained model"""
+    await models.wait()
     if model_metadata and 'feature_importance' in model_metadata:
         return {
             "feature_importance": model_metadata['feature_importance'],
@@ -421,5 +682,5 @@ async def get_feature_importance():
         return {"message": "Feature importance not available"}
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    run_service(app, "enhanced_main:app", port=8001,
+                single_process_reason="the online feature store and its forecast cache are per-process")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - CPU Work Executor
+Runs synchronous pandas/NumPy/sklearn work off the asyncio event loop so a
+slow prediction does not stall every other request.
+
+ML_EXECUTOR selects where work runs:
+    thread   - thread pool (default); NumPy and sklearn release the GIL
+    process  - process pool for pure-Python loops; arguments are pickled
+    inline   - on the event loop, the original behaviour
+ML_EXECUTOR_WORKERS sets the pool size (default: os.cpu_count()).
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ('thread', 'process', 'inline')
+
+EXECUTOR_KIND = os.getenv("ML_EXECUTOR", "thread").lower()
+if EXECUTOR_KIND not in EXECUTOR_KINDS:
+    raise ValueError(f"ML_EXECUTOR must be one of {EXECUTOR_KINDS}, got {EXECUTOR_KIND!r}")
+
+EXECUTOR_WORKERS = int(os.getenv("ML_EXECUTOR_WORKERS", "0")) or os.cpu_count() or 1
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix="ml-cpu")
+        return _thread_pool
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    with _lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=EXECUTOR_WORKERS, mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+async def _run(pool: Optional[Executor], func: Callable, *args, **kwargs) -> Any:
+    if pool is None:
+        return func(*args, **kwargs)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+
+async def run_cpu(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run self-contained work in the configured executor.
+
+    `func` must be a module-level function and its arguments picklable, as
+    in process mode both are shipped to a worker process.
+    """
+    if EXECUTOR_KIND == 'process':
+        return await _run(_get_process_pool(), func, *args, **kwargs)
+    return await run_threaded(func, *args, **kwargs)
+
+async def run_threaded(func: Callable, *args, **kwargs) -> Any:
+    """
+    Run work that needs this process's state (loaded models, feature store)
+    on the thread pool, or inline when ML_EXECUTOR=inline.
+    """
+    if EXECUTOR_KIND == 'inline':
+        return await _run(None, func, *args, **kwargs)
+    return await _run(_get_thread_pool(), func, *args, **kwargs)
+
+def executor_info() -> Dict[str, Any]:
+    """Executor configuration, for /health"""
+    return {"kind": EXECUTOR_KIND, "workers": EXECUTOR_WORKERS}
+
+def shutdown_executors():
+    global _thread_pool, _process_pool
+    with _lock:
+        for pool in (_thread_pool, _process_pool):
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+        _thread_pool = _process_pool = None
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Online Feature Store
+Per-route ring buffers of hourly passenger counts that serve the lag and
+rolling features the demand model was trained on, updated in O(1) per hour,
+and the batch builder training computes the same features with.
+
+Every feature for hour t only looks at hours before t: lag_k is the count
+k hours earlier, and the 24h/7d windows cover t-24..t-1 and t-168..t-1.
+"""
+
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+
+from demand_store import slot_timestamps
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Calendar and weather columns, computed from the timestamp alone
+TIME_FEATURES = [
+    'hour', 'day_of_week', 'month', 'is_weekend', 'is_peak_hour',
+    'is_holiday', 'temperature', 'precipitation'
+]
+
+# Lag/rolling columns, filled from each route's history
+LAG_FEATURES = [
+    'passenger_count_lag_1', 'passenger_count_lag_24', 'passenger_count_lag_168',
+    'passenger_avg_24h', 'passenger_avg_7d', 'passenger_std_24h'
+]
+
+# Demand model input columns in order, the one list trainers and services share
+FEATURE_NAMES = TIME_FEATURES + LAG_FEATURES
+LAG_COLUMNS = slice(len(TIME_FEATURES), len(FEATURE_NAMES))
+
+HISTORY_HOURS = 168  # One week, the longest lag/window
+
+LAG_HOURS = [1, 24, 168]
+WINDOW_HOURS = [24, HISTORY_HOURS]
+
+def grouped_lag_features(route_ids: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    LAG_FEATURES for hourly series stored back to back: rows sorted by
+    route, then hour, with every route's hours consecutive. Returns an
+    (n, 6) array; a feature is NaN where its route has too little earlier
+    history for it.
+
+    Linear time: one cumulative sum (and sum of squares) over all rows, with
+    each window read as a difference of two prefix sums inside its route.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    route_ids = np.asarray(route_ids)
+    n = len(values)
+    index = np.arange(n)
+
+    # Position of each row within its route's series
+    first = np.ones(n, dtype=bool)
+    first[1:] = route_ids[1:] != route_ids[:-1]
+    position = index - np.maximum.accumulate(np.where(first, index, 0)) if n else index
+
+    prefix = np.concatenate([[0.0], np.cumsum(values)])
+    prefix_sq = np.concatenate([[0.0], np.cumsum(values * values)])
+
+    features = np.full((n, len(LAG_FEATURES)), np.nan)
+    for column, lag in enumerate(LAG_HOURS):
+        valid = position >= lag
+        features[valid, column] = values[index[valid] - lag]
+
+    for column, window in zip((3, 4), WINDOW_HOURS):
+        valid = position >= window
+        rows = index[valid]
+        features[valid, column] = (prefix[rows] - prefix[rows - window]) / window
+
+    valid = position >= 24
+    rows = index[valid]
+    window_sum = prefix[rows] - prefix[rows - 24]
+    window_sq = prefix_sq[rows] - prefix_sq[rows - 24]
+    features[valid, 5] = np.sqrt(np.maximum((window_sq - window_sum * window_sum / 24) / 23, 0.0))
+    return features
+
+def add_route_lag_features(df: "pd.DataFrame", value_column: str = 'passenger_count',
+                           route_column: str = 'route_id', time_column: str = 'timestamp') -> "pd.DataFrame":
+    """
+    Sort hourly rows by route and time and add the LAG_FEATURES columns,
+    each computed within its own route. Every route's hours must be
+    consecutive (fill silent hours with zero beforehand).
+    """
+    df = df.sort_values([route_column, time_column], kind='stable', ignore_index=True)
+    features = grouped_lag_features(df[route_column].to_numpy(), df[value_column].to_numpy())
+    for column, name in enumerate(LAG_FEATURES):
+        df[name] = features[:, column]
+    return df
+
+class RouteFeatureBuffer:
+    """
+    Ring buffer of the last 168 hourly counts for one route.
+
+    Running sums for the 24h and 7d windows (and the 24h sum of squares)
+    are adjusted as values enter and leave, so both push() and features()
+    are O(1). Features describe the hour right after last_hour, a naive
+    datetime holding the UTC hour.
+    """
+
+    def __init__(self, capacity: int = HISTORY_HOURS):
+        self.capacity = capacity
+        self.values = np.zeros(capacity)
+        self.size = 0
+        self.head = 0
+        self.last_hour: Optional[datetime] = None
+        self.sum_24 = 0.0
+        self.sumsq_24 = 0.0
+        self.sum_7d = 0.0
+
+    def _ago(self, hours: int) -> float:
+        """Value observed the given number of hours before the next slot"""
+        return self.values[(self.head - hours) % self.capacity]
+
+    def push(self, value: float):
+        """Append the count for the hour after last_hour"""
+        if self.size >= 24:
+            leaving = self._ago(24)
+            self.sum_24 -= leaving
+            self.sumsq_24 -= leaving * leaving
+        if self.size >= self.capacity:
+            self.sum_7d -= self.values[self.head]
+
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+        self.sum_24 += value
+        self.sumsq_24 += value * value
+        self.sum_7d += value
+
+        if self.last_hour is not None:
+            self.last_hour += timedelta(hours=1)
+
+    def observe(self, hour: datetime, value: float):
+        """
+        Record the count for an hour. Missing hours since the last
+        observation are filled with zero; older hours are ignored.
+        """
+        hour = hour.replace(minute=0, second=0, microsecond=0)
+        if self.last_hour is None:
+            self.push(value)
+            self.last_hour = hour
+            return
+
+        gap = int((hour - self.last_hour) / timedelta(hours=1))
+        if gap <= 0:
+            if gap == 0:
+                self._replace_last(value)
+            return
+        if gap > self.capacity:
+            self.__init__(self.capacity)
+            self.observe(hour, value)
+            return
+
+        for _ in range(gap - 1):
+            self.push(0.0)
+        self.push(value)
+
+    def _replace_last(self, value: float):
+        """Overwrite the most recent hour, e.g. when a partial hour is updated"""
+        previous = self._ago(1)
+        self.values[(self.head - 1) % self.capacity] = value
+        self.sum_24 += value - previous
+        self.sumsq_24 += value * value - previous * previous
+        self.sum_7d += value - previous
+
+    def features(self) -> List[float]:
+        """
+        Lag and rolling features for the next hour, in LAG_FEATURES order.
+
+        With a full week buffered these equal grouped_lag_features for that
+        hour. Lags older than the buffered history fall back to the 7d mean.
+        """
+        n_24 = min(self.size, 24)
+        avg_24h = self.sum_24 / n_24
+        avg_7d = self.sum_7d / self.size
+
+        if n_24 > 1:
+            variance = (self.sumsq_24 - self.sum_24 * self.sum_24 / n_24) / (n_24 - 1)
+            std_24h = float(np.sqrt(max(variance, 0.0)))
+        else:
+            std_24h = 0.0
+
+        return [
+            self._ago(1),
+            self._ago(24) if self.size >= 24 else avg_7d,
+            self._ago(168) if self.size >= 168 else avg_7d,
+            avg_24h,
+            avg_7d,
+            std_24h
+        ]
+
+    def copy(self) -> "RouteFeatureBuffer":
+        """Independent copy, used to roll predictions forward without touching the store"""
+        clone = RouteFeatureBuffer(self.capacity)
+        clone.values = self.values.copy()
+        clone.size = self.size
+        clone.head = self.head
+        clone.last_hour = self.last_hour
+        clone.sum_24 = self.sum_24
+        clone.sumsq_24 = self.sumsq_24
+        clone.sum_7d = self.sum_7d
+        return clone
+
+class OnlineFeatureStore:
+    """Thread-safe collection of per-route feature buffers"""
+
+    def __init__(self):
+        self._buffers: Dict[int, RouteFeatureBuffer] = {}
+        self._lock = threading.Lock()
+
+    def observe_rows(self, rows: List[Dict], default_route_id: Optional[int] = None) -> int:
+        """
+        Add hourly passenger counts given as {route_id, timestamp, passenger_count}
+        rows. Rows in the same route and UTC hour are summed; offset-aware
+        timestamps are converted to UTC and naive ones taken as UTC.
+        """
+        if not rows:
+            return 0
+
+        import pandas as pd
+
+        df = pd.DataFrame(rows)
+        if 'route_id' not in df:
+            df['route_id'] = default_route_id
+        df['hour'] = slot_timestamps(df['timestamp']).dt.tz_convert(None).dt.floor('h')
+        hourly = df.groupby(['route_id', 'hour'])['passenger_count'].sum().reset_index()
+        hourly = hourly.sort_values(['route_id', 'hour'])
+
+        with self._lock:
+            for route_id, hour, count in hourly[['route_id', 'hour', 'passenger_count']].itertuples(index=False):
+                buffer = self._buffers.setdefault(int(route_id), RouteFeatureBuffer())
+                buffer.observe(hour.to_pydatetime(), float(count))
+
+        logger.info(f"Observed {len(hourly)} route-hours for {hourly['route_id'].nunique()} routes")
+        return len(hourly)
+
+    def snapshot(self, route_id: int) -> Optional[RouteFeatureBuffer]:
+        """Copy of a route's buffer, or None if nothing has been observed"""
+        with self._lock:
+            buffer = self._buffers.get(int(route_id))
+            return buffer.copy() if buffer is not None else None
+
+    def routes(self) -> List[int]:
+        with self._lock:
+            return sorted(self._buffers)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Forecast Result Cache
+Size-bounded LRU cache with TTL expiry for demand forecasts, keyed by
+(route_id, horizon, hour bucket, model version).
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class ForecastCache:
+    """Thread-safe LRU + TTL cache with per-route invalidation and hit/miss counters"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(route_id: Optional[int], horizon: int, model_version: Hashable,
+            when: Optional[datetime] = None) -> Tuple:
+        """Cache key; forecasts are reused within the same clock hour"""
+        hour_bucket = (when or datetime.now()).strftime('%Y-%m-%dT%H')
+        return (route_id, horizon, hour_bucket, model_version)
+
+    def get(self, key: Tuple) -> Optional[Any]:
+        """Return the cached value, or None on a miss or expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Any):
+        """Store a value, evicting the least recently used entries when full"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_route(self, route_id: int) -> int:
+        """Drop entries for a route, and all-route (route_id None) entries that include it"""
+        with self._lock:
+            stale = [k for k in self._entries if k[0] == route_id or k[0] is None]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def invalidate_all(self) -> int:
+        """Drop every entry, e.g. after a model reload"""
+        with self._lock:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self.invalidations += dropped
+            return dropped
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for /health"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Forecast Random Number Generation
+Seedable numpy Generators for the noise added to demand forecasts.
+"""
+
+import os
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+# Service-wide default seed, e.g. for reproducible load tests
+DEFAULT_SEED = int(os.environ["FORECAST_SEED"]) if os.getenv("FORECAST_SEED") else None
+
+def forecast_rng(seed: Optional[int], route_id: Optional[int], start: datetime) -> np.random.Generator:
+    """
+    Generator for one route's forecast starting at `start`.
+
+    With a seed (per request or FORECAST_SEED), the stream depends only on
+    (seed, route_id, start hour), so repeated requests within the same hour
+    return identical numbers whatever other routes are requested alongside.
+    Without one, draws are fresh on every call.
+    """
+    if seed is None:
+        seed = DEFAULT_SEED
+    if seed is None:
+        return np.random.default_rng()
+
+    hour_bucket = int(start.timestamp() // 3600)
+    route_key = 0 if route_id is None else int(route_id) + 1
+    return np.random.default_rng([seed, route_key, hour_bucket])
+
+def effective_seed(seed: Optional[int]) -> Optional[int]:
+    """Seed actually used for a request, for cache keys and model_info"""
+    return seed if seed is not None else DEFAULT_SEED
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Packed Forest Format
+Flattens a fitted scikit-learn random forest into a handful of contiguous
+NumPy arrays that can be memory-mapped, so every serving worker shares one
+physical copy of the model weights, and evaluates it with a lean NumPy
+traversal that skips scikit-learn's per-call overhead.
+
+A pickled forest cannot be shared this way: unpickling each tree copies its
+node arrays into private memory, even with joblib's mmap_mode.
+
+Each tree's nodes are numbered breadth-first so that siblings are adjacent:
+a node's left child is right - 1. One traversal step for every (row, tree)
+pair is then
+
+    node = right[node] - (x[feature[node]] <= threshold[node])
+
+Leaves have a NaN threshold (the comparison is always false) and point to
+themselves, so finished trees stay put while deeper ones keep walking.
+Predictions are bit-for-bit those of scikit-learn: X is compared as float32
+against float64 thresholds, and per-tree outputs are summed in tree order
+before dividing by the number of trees.
+
+A StandardScaler in front of the forest can be folded into the thresholds
+(save_packed_forest(..., scaler=...)): the scaled comparison
+float32((x - mean) / scale) <= t is monotone in x, so every split has an
+exact cut c in raw float64 feature space with x <= c for the same x, and
+raw feature rows are evaluated without transforming them first.
+
+Every packed file carries a small set of check rows with the outputs
+scikit-learn produced for them; they are re-evaluated on load.
+
+Re-pack models saved before this layout with:
+
+    python forest_arrays.py models/demand_model.pkl models/breakdown_predictor.pkl
+"""
+
+import argparse
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+# Rows traversed at once; (rows x trees) node indices stay cache-sized
+CHUNK_ROWS = 512
+
+# Levels walked between checks for whether every tree has reached a leaf
+EXIT_CHECK_LEVELS = 8
+
+# Probe rows stored in the packed file and re-checked on load
+CHECK_ROWS = 256
+
+def packed_path(model_path: Union[str, Path]) -> Path:
+    """Packed-forest file stored next to a pickled model"""
+    model_path = Path(model_path)
+    return model_path.with_name(f"{model_path.stem}.forest.joblib")
+
+def _breadth_first(tree: Any) -> np.ndarray:
+    """Node ids of a fitted sklearn tree in breadth-first order, children in pairs"""
+    left, right = tree.children_left, tree.children_right
+    order = [np.array([0])]
+    frontier = order[0]
+    while len(frontier):
+        internal = frontier[left[frontier] != -1]
+        frontier = np.stack([left[internal], right[internal]], axis=1).ravel()
+        order.append(frontier)
+    return np.concatenate(order)
+
+def pack_forest(model: Any) -> Dict[str, Any]:
+    """
+    Flatten a fitted RandomForestRegressor/Classifier into arrays.
+
+    Node indices are global across the forest: tree t starts at roots[t]
+    and its nodes follow breadth-first, with right-child pointers offset
+    accordingly.
+    """
+    classes = getattr(model, 'classes_', None)
+    roots, feature, threshold, right, value = [], [], [], [], []
+    offset = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        order = _breadth_first(tree)
+        new_id = np.empty(len(order), dtype=np.int64)
+        new_id[order] = np.arange(len(order))
+        leaf = tree.children_left[order] == -1
+
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature[order]))
+        threshold.append(np.where(leaf, np.nan, tree.threshold[order]))
+        right.append(np.where(leaf, np.arange(len(order)), new_id[tree.children_right[order]]) + offset)
+        if classes is None:
+            value.append(tree.value[order, 0, 0])
+        else:
+            # Per-leaf class probabilities, as DecisionTreeClassifier.predict_proba
+            counts = tree.value[order, 0, :]
+            totals = counts.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            value.append(counts / totals)
+        offset += len(order)
+
+    return {
+        'format_version': FORMAT_VERSION,
+        'input_dtype': 'float32',
+        'scaler_folded': False,
+        'kind': 'regressor' if classes is None else 'classifier',
+        'n_features_in': int(model.n_features_in_),
+        'max_depth': int(max(estimator.tree_.max_depth for estimator in model.estimators_)),
+        'classes': classes,
+        'roots': np.array(roots, dtype=np.int64),
+        'feature': np.concatenate(feature).astype(np.int64),
+        'threshold': np.concatenate(threshold).astype(np.float64),
+        'right': np.concatenate(right).astype(np.int64),
+        # Regressors: (nodes,); classifiers: (classes, nodes), one contiguous row per class
+        'value': np.concatenate(value).astype(np.float64) if classes is None
+        else np.ascontiguousarray(np.concatenate(value).T, dtype=np.float64)
+    }
+
+def fold_scaler(data: Dict[str, Any], scaler: Any) -> Dict[str, Any]:
+    """
+    Fold a fitted StandardScaler into packed thresholds, so the forest takes
+    unscaled float64 rows.
+
+    For each split the cut is the largest float64 x whose scaled float32
+    value still goes left, found by bisection from the algebraic estimate
+    threshold * scale + mean; x <= cut then routes every row exactly as
+    scaling followed by the original comparison would.
+    """
+    n_features = data['n_features_in']
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(n_features)
+    scale = scaler.scale_ if scaler.with_std else np.ones(n_features)
+
+    threshold = data['threshold'].copy()
+    internal = ~np.isnan(threshold)
+    t = threshold[internal]
+    m = mean[data['feature'][internal]]
+    s = scale[data['feature'][internal]]
+
+    def goes_left(x: np.ndarray) -> np.ndarray:
+        # StandardScaler.transform, then the tree's float32 comparison
+        return ((x - m) / s).astype(np.float32) <= t
+
+    guess = t * s + m
+    lo, hi = guess.copy(), guess.copy()
+    step = np.maximum(np.abs(guess), s) * 1e-6
+    while not (left := goes_left(lo)).all():
+        lo[~left] -= step[~left]
+        step[~left] *= 2
+    step = np.maximum(np.abs(guess), s) * 1e-6
+    while (left := goes_left(hi)).any():
+        hi[left] += step[left]
+        step[left] *= 2
+
+    # lo always goes left, hi never does; halve until they are adjacent floats
+    while True:
+        mid = lo + (hi - lo) / 2
+        open_ = (mid > lo) & (mid < hi)
+        if not open_.any():
+            break
+        left = goes_left(mid)
+        lo = np.where(open_ & left, mid, lo)
+        hi = np.where(open_ & ~left, mid, hi)
+
+    threshold[internal] = lo
+    return {**data, 'threshold': threshold, 'input_dtype': 'float64', 'scaler_folded': True}
+
+def probe_inputs(forest: "PackedForest", n_rows: int = 2000, seed: int = 0) -> np.ndarray:
+    """
+    Rows that exercise the forest's splits: every feature takes values at,
+    just below and just above its split thresholds (in the forest's input
+    dtype), so ties at a threshold are covered too.
+    """
+    rng = np.random.default_rng(seed)
+    dtype = forest.input_dtype.type
+    X = rng.normal(size=(n_rows, forest.n_features_in_)).astype(dtype)
+    internal = ~np.isnan(forest.threshold)
+    for column in range(forest.n_features_in_):
+        thresholds = forest.threshold[internal & (forest.feature == column)]
+        if len(thresholds):
+            values = rng.choice(thresholds, n_rows).astype(dtype)
+            step = rng.integers(-1, 2, n_rows)
+            values = np.where(step < 0, np.nextafter(values, dtype(-np.inf)), values)
+            X[:, column] = np.where(step > 0, np.nextafter(values, dtype(np.inf)), values)
+    return X
+
+def reference_outputs(model: Any, X: np.ndarray, scaler: Any = None) -> np.ndarray:
+    """scikit-learn's predict (regressors) or predict_proba (classifiers), after the scaler if any"""
+    if scaler is not None:
+        X = scaler.transform(X)
+    return model.predict_proba(X) if hasattr(model, 'classes_') else model.predict(X)
+
+def verify_packed_forest(model: Any, forest: "PackedForest", X: Optional[np.ndarray] = None,
+                         scaler: Any = None):
+    """Raise ValueError unless the packed forest reproduces the model's outputs exactly"""
+    X = probe_inputs(forest) if X is None else X
+    model_X = scaler.transform(X) if scaler is not None else X
+    checks = [('predict', model.predict(model_X), forest.predict(X))]
+    if forest.kind == 'classifier':
+        checks.append(('predict_proba', model.predict_proba(model_X), forest.predict_proba(X)))
+    for name, expected, actual in checks:
+        if not np.array_equal(expected, actual):
+            raise ValueError(f"Packed forest {name} differs from scikit-learn on {len(X)} probe rows "
+                             f"(max abs diff {np.max(np.abs(expected - actual)):.3g})")
+
+def save_packed_forest(model: Any, path: Union[str, Path], extras: Optional[Dict[str, Any]] = None,
+                       scaler: Any = None) -> Path:
+    """
+    Write the packed forest uncompressed, so it can be memory-mapped.
+    `extras` (e.g. feature names) is stored alongside as a normal pickle.
+    With `scaler`, the scaler is folded into the thresholds and the packed
+    forest takes unscaled rows.
+
+    The packed arrays are checked against the model (behind the scaler)
+    before anything is written, and a sample of the probe rows is stored
+    with scikit-learn's outputs so loads can re-check them.
+
+    The file is written beside the target and renamed into place: workers
+    still mapping the previous file keep reading its (unlinked) pages.
+    """
+    path = Path(path)
+    data = pack_forest(model)
+    if scaler is not None:
+        data = fold_scaler(data, scaler)
+    forest = PackedForest(data)
+    X = probe_inputs(forest)
+    verify_packed_forest(model, forest, X, scaler=scaler)
+    check = {'X': X[:CHECK_ROWS], 'expected': reference_outputs(model, X[:CHECK_ROWS], scaler)}
+
+    import joblib
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    joblib.dump({**data, 'check': check, 'extras': extras or {}}, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Packed forest saved to {path}")
+    return path
+
+def load_packed_forest(path: Union[str, Path], mmap: bool = True) -> "PackedForest":
+    """Load a packed forest, memory-mapping its arrays read-only by default"""
+    import joblib
+
+    data = joblib.load(path, mmap_mode='r' if mmap else None)
+    if data.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported packed forest format {data.get('format_version')} in {path}; "
+                         f"re-pack it with forest_arrays.py")
+    forest = PackedForest(data)
+    if 'check' in data and not np.array_equal(forest._average(data['check']['X']), data['check']['expected']):
+        raise ValueError(f"Packed forest in {path} fails its stored equivalence check")
+    return forest
+
+class PackedForest:
+    """
+    Random forest evaluated directly from packed arrays.
+
+    Supports the subset of the scikit-learn API the services call:
+    predict for regressors, predict and predict_proba for classifiers.
+    When `scaler_folded` is set, rows are passed unscaled.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.kind = data['kind']
+        self.input_dtype = np.dtype(data.get('input_dtype', 'float32'))
+        self.scaler_folded = data.get('scaler_folded', False)
+        self.n_features_in_ = data['n_features_in']
+        self.max_depth = data['max_depth']
+        self.classes_ = data['classes']
+        self.roots = data['roots']
+        self.feature = data['feature']
+        self.threshold = data['threshold']
+        self.right = data['right']
+        self.value = data['value']
+        self.extras = data.get('extras', {})
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def is_memory_mapped(self) -> bool:
+        return isinstance(self.threshold, np.memmap)
+
+    def _check_input(self, X: np.ndarray) -> np.ndarray:
+        # Trees split on float32 features, as in scikit-learn; folded cuts are float64
+        X = np.ascontiguousarray(X, dtype=self.input_dtype)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has shape {X.shape}, expected (n, {self.n_features_in_})")
+        return X
+
+    def _leaves(self, chunk: np.ndarray) -> np.ndarray:
+        """Leaf reached in every tree for one chunk of rows, shape (rows, trees)"""
+        # float32 inputs widened once, exactly, instead of at every comparison
+        flat = chunk.ravel().astype(np.float64, copy=False)
+        row_start = (np.arange(len(chunk)) * chunk.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(chunk), self.n_estimators)).copy()
+
+        for level in range(1, self.max_depth + 1):
+            threshold = self.threshold[nodes]
+            if level % EXIT_CHECK_LEVELS == 0 and np.isnan(threshold).all():
+                break
+            nodes = self.right[nodes] - (flat[row_start + self.feature[nodes]] <= threshold)
+        return nodes
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n_samples, n_trees)"""
+        X = self._check_input(X)
+        leaves = np.empty((len(X), self.n_estimators), dtype=np.int64)
+        for start in range(0, len(X), CHUNK_ROWS):
+            leaves[start:start + CHUNK_ROWS] = self._leaves(X[start:start + CHUNK_ROWS])
+        return leaves
+
+    def _average(self, X: np.ndarray) -> np.ndarray:
+        """Mean leaf value over trees, summed in tree order like scikit-learn"""
+        X = self._check_input(X)
+        values = self.value[None, :] if self.kind == 'regressor' else self.value
+        out = np.empty((len(values), len(X)))
+        for start in range(0, len(X), CHUNK_ROWS):
+            leaves = self._leaves(X[start:start + CHUNK_ROWS])
+            for column, value in enumerate(values):
+                # cumsum adds strictly left to right; sum() would pair terms differently
+                out[column, start:start + CHUNK_ROWS] = np.cumsum(value[leaves], axis=1)[:, -1]
+        out /= self.n_estimators
+        return out[0] if self.kind == 'regressor' else out.T
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if self.kind != 'classifier':
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._average(X)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if self.kind == 'classifier':
+            return self.classes_[np.argmax(self._average(X), axis=1)]
+        return self._average(X)
+
+def load_model_file(model_path: Union[str, Path], mmap: Optional[bool] = None) -> Any:
+    """
+    Load a model saved with joblib, preferring its packed, memory-mapped
+    form when one exists beside it. MODEL_MMAP=0 forces the pickle.
+    """
+    import joblib
+
+    packed = load_packed_if_available(model_path, mmap)
+    return packed if packed is not None else joblib.load(model_path)
+
+def load_packed_if_available(model_path: Union[str, Path], mmap: Optional[bool] = None) -> Optional[PackedForest]:
+    """
+    The packed forest beside `model_path`, or None when there is none,
+    MODEL_MMAP=0, or it was written in an older format (logged).
+    """
+    if mmap is None:
+        mmap = os.getenv("MODEL_MMAP", "1") != "0"
+    packed = packed_path(model_path)
+    if not mmap or not packed.exists():
+        return None
+    try:
+        return load_packed_forest(packed)
+    except ValueError as e:
+        logger.warning(f"{e}; loading the pickled model instead")
+        return None
+
+def repack_model_file(model_path: Union[str, Path], fold: bool = True) -> Path:
+    """
+    Re-export the packed forest of a saved model: a pickled forest, or a
+    dict holding one under 'model' (the breakdown predictor format), whose
+    other entries become the packed file's extras. A 'scaler' entry is
+    folded into the thresholds unless `fold` is False.
+    """
+    import joblib
+
+    saved = joblib.load(model_path)
+    if isinstance(saved, dict):
+        extras = {key: value for key, value in saved.items() if key != 'model'}
+        scaler = saved.get('scaler') if fold else None
+        return save_packed_forest(saved['model'], packed_path(model_path), extras=extras, scaler=scaler)
+    return save_packed_forest(saved, packed_path(model_path))
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-pack saved forests into the current packed format")
+    parser.add_argument('model_paths', nargs='+')
+    parser.add_argument('--keep-scaler', action='store_true',
+                        help="Don't fold a saved StandardScaler into the thresholds")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    for model_path in args.model_paths:
+        path = repack_model_file(model_path, fold=not args.keep_scaler)
+        print(f"{model_path} -> {path} (verified against scikit-learn)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Headway Optimizer
+Chooses a headway for every period of the service day from the demand
+forecast, by dynamic programming over (period, headway).
+
+Cost of running headway h (minutes) through a period of length L minutes
+with demand D passengers/hour, in passenger-minutes:
+
+    operating_cost_per_trip * L / h      trips run
+    + D * L / 60 * h / 2                 expected wait (half a headway each)
+
+plus `headway_change_penalty` per minute of headway change between
+consecutive periods. Headways outside [min_headway, max_headway], needing
+more buses than `fleet_size` for the route's cycle time, or loading a trip
+above target_load_factor * capacity (D * h / 60 passengers) are excluded.
+When the load ceiling cannot be met in a period, its headway is clamped to
+the shortest the fleet allows.
+
+allocate_fleet solves the network version: one fleet shared by all routes,
+split per period to minimise total expected passenger wait.
+"""
+
+import heapq
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_CONSTRAINTS = {
+    'min_headway': 5,
+    'max_headway': 30,
+    'period_minutes': 60,
+    'capacity': 50,
+    'target_load_factor': 0.85,
+    'cycle_time_minutes': 60,
+    'fleet_size': None,
+    'operating_cost_per_trip': 60.0,
+    'headway_change_penalty': 5.0
+}
+
+class HeadwayPlan:
+    """Solver output: one headway per period"""
+
+    def __init__(self, period_starts: np.ndarray, period_ends: np.ndarray, demand: np.ndarray,
+                 headways: np.ndarray, load_factors: np.ndarray, buses_required: np.ndarray,
+                 total_cost: float):
+        self.period_starts = period_starts      # minutes since midnight
+        self.period_ends = period_ends
+        self.demand = demand                    # passengers/hour per period
+        self.headways = headways                # minutes
+        self.load_factors = load_factors        # expected passengers per trip / capacity
+        self.buses_required = buses_required
+        self.total_cost = total_cost
+
+    def trip_minutes(self) -> np.ndarray:
+        """Departure minutes walking the day with each period's headway"""
+        trips = []
+        t = int(self.period_starts[0]) if len(self.period_starts) else 0
+        end = int(self.period_ends[-1]) if len(self.period_ends) else 0
+        period = 0
+        while t < end:
+            while t >= self.period_ends[period]:
+                period += 1
+            trips.append(t)
+            t += int(self.headways[period])
+        return np.array(trips, dtype=np.int64)
+
+def period_demand(demand_forecast: List[Dict], period_starts: np.ndarray,
+                  period_ends: np.ndarray) -> np.ndarray:
+    """
+    Mean forecast passengers/hour over each period, from forecast points
+    carrying 'hour' (or 'timestamp') and 'predicted_passengers'. Hours the
+    forecast does not cover get the forecast's overall mean.
+    """
+    hourly_sum = np.zeros(24)
+    hourly_count = np.zeros(24)
+    for point in demand_forecast:
+        hour = point.get('hour')
+        if hour is None and point.get('timestamp'):
+            hour = int(str(point['timestamp'])[11:13])
+        if hour is None:
+            continue
+        hourly_sum[int(hour) % 24] += float(point.get('predicted_passengers', 0))
+        hourly_count[int(hour) % 24] += 1
+
+    overall = hourly_sum.sum() / hourly_count.sum() if hourly_count.sum() else 0.0
+    hourly = np.where(hourly_count > 0, hourly_sum / np.maximum(hourly_count, 1), overall)
+    return hourly_to_periods(hourly, period_starts, period_ends)
+
+def hourly_to_periods(hourly: np.ndarray, period_starts: np.ndarray, period_ends: np.ndarray) -> np.ndarray:
+    """Minute-weighted mean of (..., 24) hourly curves over each period"""
+    minute_demand = np.repeat(hourly, 60, axis=-1)
+    cumulative = np.concatenate(
+        [np.zeros(hourly.shape[:-1] + (1,)), np.cumsum(np.tile(minute_demand, 2), axis=-1)], axis=-1
+    )
+    return (cumulative[..., period_ends] - cumulative[..., period_starts]) / (period_ends - period_starts)
+
+def route_period_demand(route_ids: List[int], demand_forecast: List[Dict], period_starts: np.ndarray,
+                        period_ends: np.ndarray) -> np.ndarray:
+    """
+    (routes, periods) mean passengers/hour from forecast points carrying
+    'route_id', 'hour' and 'predicted_passengers' (the POST /predict shape).
+    A route's uncovered hours get its own mean; routes absent from the
+    forecast get zero demand.
+    """
+    index = {route_id: i for i, route_id in enumerate(route_ids)}
+    points = [p for p in demand_forecast if p.get('route_id') in index and p.get('hour') is not None]
+    rows = np.array([index[p['route_id']] for p in points], dtype=np.int64)
+    hours = np.array([int(p['hour']) % 24 for p in points], dtype=np.int64)
+    values = np.array([float(p.get('predicted_passengers', 0)) for p in points])
+
+    slots = rows * 24 + hours
+    size = len(route_ids) * 24
+    sums = np.bincount(slots, weights=values, minlength=size).reshape(-1, 24)
+    counts = np.bincount(slots, minlength=size).reshape(-1, 24)
+
+    route_mean = sums.sum(axis=1, keepdims=True) / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    hourly = np.where(counts > 0, sums / np.maximum(counts, 1), route_mean)
+    return hourly_to_periods(hourly, period_starts, period_ends)
+
+def optimize_headways(demand: np.ndarray, period_starts: np.ndarray, period_ends: np.ndarray,
+                      constraints: Optional[Dict] = None) -> HeadwayPlan:
+    """Minimum-cost headway per period, subject to the constraints above"""
+    c = {**DEFAULT_CONSTRAINTS, **{k: v for k, v in (constraints or {}).items() if v is not None}}
+    min_headway = max(1, int(c['min_headway']))
+    max_headway = max(min_headway, int(c['max_headway']))
+
+    candidates = np.arange(min_headway, max_headway + 1, dtype=np.float64)  # (H,)
+    lengths = (period_ends - period_starts).astype(np.float64)[:, None]     # (P, 1)
+    demand = np.asarray(demand, dtype=np.float64)[:, None]
+
+    passengers_per_trip = demand * candidates / 60
+    cost = (
+        c['operating_cost_per_trip'] * lengths / candidates
+        + demand * lengths / 60 * candidates / 2
+    )
+
+    buses = np.ceil(c['cycle_time_minutes'] / candidates)
+    fleet_ok = np.ones(len(candidates), dtype=bool)
+    if c['fleet_size'] is not None:
+        fleet_ok = buses <= c['fleet_size']
+        if not fleet_ok.any():
+            fleet_ok[-1] = True  # fleet too small for any allowed headway: run the sparsest
+
+    # Load-factor ceiling as a hard constraint, clamped to the shortest runnable headway
+    feasible = fleet_ok & (passengers_per_trip <= c['target_load_factor'] * c['capacity'])
+    overloaded = ~feasible.any(axis=1)
+    feasible[overloaded, np.argmax(fleet_ok)] = True
+    cost = np.where(feasible, cost, np.inf)
+
+    # Viterbi over periods with an |h - h'| smoothness penalty
+    transition = c['headway_change_penalty'] * np.abs(candidates[:, None] - candidates[None, :])
+    best = cost[0].copy()
+    back = np.zeros(cost.shape, dtype=np.int64)
+    for p in range(1, len(cost)):
+        total = best[:, None] + transition
+        back[p] = np.argmin(total, axis=0)
+        best = total[back[p], np.arange(len(candidates))] + cost[p]
+
+    choice = np.empty(len(cost), dtype=np.int64)
+    choice[-1] = int(np.argmin(best))
+    for p in range(len(cost) - 1, 0, -1):
+        choice[p - 1] = back[p, choice[p]]
+
+    headways = candidates[choice]
+    rows = np.arange(len(cost))
+    return HeadwayPlan(
+        period_starts=period_starts,
+        period_ends=period_ends,
+        demand=demand[:, 0],
+        headways=headways.astype(np.int64),
+        load_factors=passengers_per_trip[rows, choice] / c['capacity'],
+        buses_required=buses[choice].astype(np.int64),
+        total_cost=float(best.min())
+    )
+
+def service_periods(start_minutes: int, end_minutes: int, period_minutes: int) -> tuple:
+    """Split [start, end) into periods aligned to multiples of period_minutes"""
+    if end_minutes <= start_minutes:
+        end_minutes += 24 * 60
+    period_minutes = max(1, int(period_minutes))
+    edges = np.arange((start_minutes // period_minutes + 1) * period_minutes, end_minutes, period_minutes)
+    bounds = np.concatenate([[start_minutes], edges, [end_minutes]]).astype(np.int64)
+    return bounds[:-1], bounds[1:]
+
+def expected_wait(demand: np.ndarray, lengths: np.ndarray, headways: np.ndarray) -> np.ndarray:
+    """Passenger-minutes of waiting: arrivals in the period times half a headway"""
+    return demand * lengths / 60 * headways / 2
+
+def allocate_fleet(demand: np.ndarray, cycle_minutes: np.ndarray, lengths: np.ndarray, fleet_size: int,
+                   min_headway: float, max_headway: float) -> np.ndarray:
+    """
+    Buses per (route, period) minimising total expected wait with at most
+    `fleet_size` buses in service in any period.
+
+    With b buses on a route of cycle time C the headway is C / b, so the
+    period's wait D * L / 60 * C / (2b) is convex and decreasing in b, and
+    greedily giving each next bus to the largest marginal saving (a max-heap
+    over routes) is optimal. Every route with demand first gets the buses
+    needed to keep its headway within max_headway; if the fleet cannot cover
+    that, those minimums go to routes in order of demand. No route gets more
+    buses than min_headway allows.
+    """
+    demand = np.asarray(demand, dtype=np.float64)
+    cycle_minutes = np.asarray(cycle_minutes, dtype=np.float64)
+    n_routes, n_periods = demand.shape
+
+    min_buses = np.where(demand > 0, np.ceil(cycle_minutes / max_headway)[:, None], 0).astype(np.int64)
+    max_buses = np.maximum(np.floor(cycle_minutes / min_headway), 1).astype(np.int64)
+    # Wait with b buses is weight / b
+    weight = demand * lengths[None, :] / 60 * cycle_minutes[:, None] / 2
+
+    buses = np.zeros((n_routes, n_periods), dtype=np.int64)
+    for p in range(n_periods):
+        need = min_buses[:, p]
+        if need.sum() <= fleet_size:
+            allocated = need.copy()
+        else:
+            # Not enough buses for minimum service everywhere: busiest routes first
+            allocated = np.zeros(n_routes, dtype=np.int64)
+            remaining = fleet_size
+            for r in np.argsort(-demand[:, p], kind='stable'):
+                take = min(int(need[r]), remaining)
+                allocated[r] = take
+                remaining -= take
+                if remaining == 0:
+                    break
+
+        spare = fleet_size - int(allocated.sum())
+        heap = [
+            (-weight[r, p] * (1 / max(b, 1) - 1 / (b + 1)) if b else -np.inf, r)
+            for r, b in enumerate(allocated.tolist())
+            if demand[r, p] > 0 and b < max_buses[r]
+        ]
+        heapq.heapify(heap)
+        while spare > 0 and heap:
+            _, r = heapq.heappop(heap)
+            allocated[r] += 1
+            spare -= 1
+            b = allocated[r]
+            if b < max_buses[r]:
+                heapq.heappush(heap, (-weight[r, p] * (1 / b - 1 / (b + 1)), r))
+
+        buses[:, p] = allocated
+    return buses
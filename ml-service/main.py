@@ -1,12 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, File, Form, HTTPException, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import pandas as pd
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import TYPE_CHECKING, List, Literal, Optional, Dict, Any, Tuple
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+import itertools
 import json
 import logging
+import os
+
+from columnar import ColumnarUnavailable, read_table
+from demand_store import DEFAULT_DB_PATH, DemandStatsStore, slot_timestamps
+from executor import executor_info, run_cpu, run_threaded, shutdown_executors
+from forecast_cache import ForecastCache
+from forecast_rng import forecast_rng, effective_seed
+from headway_optimizer import allocate_fleet, expected_wait, route_period_demand, service_periods
+from schedule_array import OptimizedSchedule, ScheduleArray, respace_routes
+from serving import process_memory, run_service
+
+# pandas is imported where frames are built, keeping it off the startup path
+if TYPE_CHECKING:
+    import pandas as pd
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -27,15 +42,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Longest forecast horizon a request may ask for (one week)
+MAX_PREDICTION_HOURS = 168
+
 # Pydantic models
 class PredictionRequest(BaseModel):
-    data: Dict[str, Any]
-    prediction_hours: int = 24
+    data: Dict[str, Any] = {}
+    prediction_hours: int = Field(default=24, ge=1, le=MAX_PREDICTION_HOURS)
+    seed: Optional[int] = Field(default=None, ge=0)
+    stream: bool = False
+
+class IngestRequest(BaseModel):
+    ticket_sales: List[Dict[str, Any]] = []
+    passenger_counts: List[Dict[str, Any]] = []
 
 class OptimizationRequest(BaseModel):
     routes: List[Dict[str, Any]]
     current_schedules: List[Dict[str, Any]]
     constraints: Optional[Dict[str, Any]] = None
+    mode: Literal["route", "network"] = "route"
+    demand_forecast: Optional[List[Dict[str, Any]]] = None
+    fleet_size: Optional[int] = Field(default=None, ge=1)
 
 class PredictionResponse(BaseModel):
     route_id: Optional[int]
@@ -52,7 +79,17 @@ class OptimizationResponse(BaseModel):
 
 # Global variables for model storage
 demand_models = {}
-optimization_cache = {}
+forecast_cache = ForecastCache(
+    max_entries=int(os.getenv("FORECAST_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("FORECAST_CACHE_TTL_SECONDS", "300"))
+)
+demand_store: Optional[DemandStatsStore] = None  # Opened by the startup hook
+
+@app.on_event("startup")
+async def open_demand_store():
+    """Open the persistent demand statistics, creating the file on first run"""
+    global demand_store
+    demand_store = DemandStatsStore(os.getenv("DEMAND_STORE_PATH") or DEFAULT_DB_PATH)
 
 @app.get("/")
 async def root():
@@ -64,9 +101,18 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now(),
         "models_loaded": len(demand_models),
-        "cache_size": len(optimization_cache)
+        "cache_size": len(forecast_cache),
+        "forecast_cache": forecast_cache.stats(),
+        "executor": executor_info(),
+        "process": process_memory()
     }
 
+@app.on_event("shutdown")
+async def shutdown_workers():
+    if demand_store is not None:
+        demand_store.close()
+    shutdown_executors()
+
 @app.post("/predict", response_model=PredictionResponse)
 async def predict_demand(request: PredictionRequest):
     """
@@ -80,56 +126,180 @@ async def predict_demand(request: PredictionRequest):
         passenger_counts = request.data.get('passenger_counts', [])
         routes = request.data.get('routes', [])
         
-        if not ticket_sales and not passenger_counts:
-            raise HTTPException(status_code=400, detail="No historical data provided")
+        if request.stream:
+            return await stream_demand_forecast(request, ticket_sales, passenger_counts)
         
-        # Convert to DataFrames
-        sales_df = pd.DataFrame(ticket_sales) if ticket_sales else pd.DataFrame()
-        counts_df = pd.DataFrame(passenger_counts) if passenger_counts else pd.DataFrame()
+        if ticket_sales or passenger_counts:
+            # Aggregate history once into a (route, weekday, hour) cube and forecast
+            predictions, confidence_scores = await run_cpu(
+                forecast_from_records, ticket_sales, passenger_counts,
+                request.prediction_hours, request.seed
+            )
+            training_data_points = len(ticket_sales) + len(passenger_counts)
+            cache_key = None
+        else:
+            # No history in the body: answer from the ingested running statistics,
+            # cached until the hour rolls over or any worker's /ingest adds rows
+            generation = await run_threaded(demand_store.generation)
+            cache_key = forecast_cache.key(
+                None, request.prediction_hours, (app.version, effective_seed(request.seed), generation)
+            )
+            cached = forecast_cache.get(cache_key)
+            if cached is not None:
+                # Cached forecast, but generated_at is when this response was made
+                return cached.model_copy(update={'generated_at': datetime.now()})
+            
+            cube = DemandCube(*await run_threaded(demand_store.slot_means))
+            training_data_points = await run_threaded(demand_store.total_rows)
+            if len(cube.route_ids) == 0:
+                raise HTTPException(status_code=400, detail="No historical data provided or ingested")
+            
+            predictions, confidence_scores = await run_cpu(
+                forecast_routes, cube, request.prediction_hours, request.seed
+            )
         
-        # Process data and generate predictions
-        predictions = []
-        confidence_scores = []
+        response = PredictionResponse(
+            route_id=None,  # Multiple routes
+            predictions=predictions,
+            confidence_scores=confidence_scores,
+            model_info=forecast_model_info(training_data_points),
+            generated_at=datetime.now()
+        )
         
-        # Group by route for predictions
-        route_ids = set()
-        if not sales_df.empty:
-            route_ids.update(sales_df['route_id'].unique())
-        if not counts_df.empty:
-            route_ids.update(counts_df['route_id'].unique())
+        if cache_key is not None:
+            forecast_cache.put(cache_key, response)
+        return response
         
-        for route_id in route_ids:
-            route_predictions = await predict_route_demand(
-                route_id, sales_df, counts_df, request.prediction_hours
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in prediction: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
+
+async def stream_demand_forecast(request: PredictionRequest, ticket_sales: List[Dict],
+                                 passenger_counts: List[Dict]) -> StreamingResponse:
+    """
+    NDJSON variant of POST /predict: one line per route as it is forecast,
+    then a summary line, so memory stays flat however many routes there are.
+    Streamed forecasts are not cached.
+    """
+    if ticket_sales or passenger_counts:
+        cube = await run_cpu(cube_from_records, ticket_sales, passenger_counts)
+        training_data_points = len(ticket_sales) + len(passenger_counts)
+    else:
+        cube = DemandCube(*await run_threaded(demand_store.slot_means))
+        training_data_points = await run_threaded(demand_store.total_rows)
+    if len(cube.route_ids) == 0:
+        raise HTTPException(status_code=400, detail="No historical data provided or ingested")
+    
+    def lines():
+        # Starlette iterates sync generators in its threadpool, off the event loop
+        for route_id in cube.route_ids:
+            route_predictions = predict_route_demand(
+                int(route_id), cube, request.prediction_hours, request.seed
             )
-            predictions.extend(route_predictions)
-            confidence_scores.extend([0.8] * len(route_predictions))  # Simplified confidence
+            yield json.dumps({
+                "type": "route",
+                "route_id": int(route_id),
+                "predictions": route_predictions,
+                "confidence_scores": [0.8] * len(route_predictions)
+            }) + "\n"
+        
+        yield json.dumps({
+            "type": "summary",
+            "routes": len(cube.route_ids),
+            "model_info": forecast_model_info(training_data_points),
+            "generated_at": datetime.now().isoformat()
+        }) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+def forecast_model_info(training_data_points: int) -> Dict[str, Any]:
+    return {
+        "model_type": "time_series_arima",
+        "features_used": ["hour", "day_of_week", "historical_demand"],
+        "training_data_points": training_data_points
+    }
+
+@app.post("/predict/columnar", response_model=PredictionResponse)
+async def predict_demand_columnar(
+    ticket_sales: Optional[UploadFile] = File(None),
+    passenger_counts: Optional[UploadFile] = File(None),
+    prediction_hours: int = Form(24, ge=1, le=MAX_PREDICTION_HOURS),
+    seed: Optional[int] = Form(None, ge=0)
+):
+    """
+    POST /predict with history sent as multipart parts holding an Arrow IPC
+    stream/file or Parquet table each, instead of JSON row dicts
+    """
+    try:
+        sales_payload = await ticket_sales.read() if ticket_sales is not None else b""
+        counts_payload = await passenger_counts.read() if passenger_counts is not None else b""
+        if not sales_payload and not counts_payload:
+            raise HTTPException(status_code=400, detail="No ticket_sales or passenger_counts table provided")
+        logger.info(f"Received columnar prediction request for {prediction_hours} hours "
+                    f"({len(sales_payload) + len(counts_payload)} bytes)")
+        
+        predictions, confidence_scores, training_data_points = await run_cpu(
+            forecast_from_columnar, sales_payload, counts_payload, prediction_hours, seed
+        )
         
         return PredictionResponse(
-            route_id=None,  # Multiple routes
+            route_id=None,
             predictions=predictions,
             confidence_scores=confidence_scores,
-            model_info={
-                "model_type": "time_series_arima",
-                "features_used": ["hour", "day_of_week", "historical_demand"],
-                "training_data_points": len(ticket_sales) + len(passenger_counts)
-            },
+            model_info=forecast_model_info(training_data_points),
             generated_at=datetime.now()
         )
         
+    except HTTPException:
+        raise
+    except ColumnarUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except (ValueError, KeyError) as e:
+        # Undecodable payloads (pyarrow.ArrowInvalid is a ValueError) or missing columns
+        raise HTTPException(status_code=400, detail=f"Invalid columnar history: {str(e)}")
     except Exception as e:
-        logger.error(f"Error in prediction: {str(e)}")
+        logger.error(f"Error in columnar prediction: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/ingest")
+async def ingest_history(request: IngestRequest):
+    """
+    Fold new ticket sales and passenger counts into the persistent demand
+    statistics. Only rows newer than their route's last watermark are counted.
+    """
+    try:
+        result = await run_threaded(demand_store.ingest, request.ticket_sales, request.passenger_counts)
+        # Other workers miss these forecasts through the store generation in their keys
+        for route_id in result['routes']:
+            forecast_cache.invalidate_route(route_id)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error ingesting history: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Ingest failed: {str(e)}")
+
+@app.get("/ingest/watermark")
+async def get_ingest_watermark():
+    """
+    Latest ingested timestamp per source and route; send only rows after these
+    """
+    return await run_threaded(demand_store.watermarks)
+
 @app.get("/predict")
-async def get_demand_forecast(route_id: Optional[int] = None):
+async def get_demand_forecast(route_id: Optional[int] = None, seed: Optional[int] = Query(default=None, ge=0)):
     """
     Get demand forecast for specific route or all routes
     """
     try:
-        # Generate sample forecast data
-        forecast = generate_sample_forecast(route_id)
-        return forecast
+        cache_key = forecast_cache.key(route_id, 24, (app.version, effective_seed(seed)))
+        forecast = forecast_cache.get(cache_key)
+        if forecast is None:
+            # Generate sample forecast data
+            forecast = await run_cpu(generate_sample_forecast, route_id, seed)
+            forecast_cache.put(cache_key, forecast)
+        return {**forecast, "generated_at": datetime.now().isoformat()}
         
     except Exception as e:
         logger.error(f"Error generating forecast: {str(e)}")
@@ -148,19 +318,17 @@ async def optimize_schedules(request: OptimizationRequest):
         constraints = request.constraints or {}
         
         # Perform optimization
-        optimized_schedules = await optimize_bus_schedules(
-            routes, current_schedules, constraints
-        )
-        
-        # Calculate improvement metrics
-        improvement_metrics = calculate_improvement_metrics(
-            current_schedules, optimized_schedules
-        )
-        
-        # Generate optimization reasons
-        optimization_reasons = generate_optimization_reasons(
-            current_schedules, optimized_schedules
-        )
+        if request.mode == "network":
+            if not request.demand_forecast:
+                raise HTTPException(status_code=400, detail="demand_forecast is required in network mode")
+            optimized_schedules, improvement_metrics, optimization_reasons = await run_cpu(
+                run_network_optimization, routes, current_schedules, request.demand_forecast,
+                request.fleet_size, constraints
+            )
+        else:
+            optimized_schedules, improvement_metrics, optimization_reasons = await run_cpu(
+                run_schedule_optimization, routes, current_schedules, constraints
+            )
         
         return OptimizationResponse(
             optimized_schedules=optimized_schedules,
@@ -169,113 +337,194 @@ async def optimize_schedules(request: OptimizationRequest):
             generated_at=datetime.now()
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in optimization: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Optimization failed: {str(e)}")
 
-async def predict_route_demand(route_id: int, sales_df: pd.DataFrame, 
-                              counts_df: pd.DataFrame, prediction_hours: int) -> List[Dict]:
+class DemandCube:
     """
-    Predict demand for a specific route using time series analysis
+    Historical demand averaged per (route, day of week, hour) slot, with
+    slots in UTC as in the ingested statistics.
+
+    Built in a single pass over the sales and counts frames so that every
+    forecast hour is answered by indexing instead of re-filtering history.
+    Slots without history hold NaN.
     """
-    predictions = []
+
+    def __init__(self, route_ids: np.ndarray, sales_mean: np.ndarray, counts_mean: np.ndarray):
+        self.route_ids = route_ids
+        self.sales_mean = sales_mean
+        self.counts_mean = counts_mean
+        self._route_index = {int(route_id): i for i, route_id in enumerate(route_ids)}
+
+    @classmethod
+    def from_frames(cls, sales_df: "pd.DataFrame", counts_df: "pd.DataFrame") -> "DemandCube":
+        """Build the cube from raw ticket sales and passenger count frames"""
+        route_ids = np.array([], dtype=np.int64)
+        for df in (sales_df, counts_df):
+            if not df.empty:
+                route_ids = np.union1d(route_ids, df['route_id'].to_numpy())
+        
+        sales_mean = _slot_means(sales_df, 'passenger_count', route_ids)
+        counts_mean = _slot_means(counts_df, 'occupancy', route_ids)
+        return cls(route_ids, sales_mean, counts_mean)
+
+    def lookup(self, route_id: int, days_of_week: np.ndarray, hours: np.ndarray):
+        """Return (sales, counts) slot averages for the given weekdays and hours"""
+        index = self._route_index.get(int(route_id))
+        if index is None:
+            missing = np.full(len(hours), np.nan)
+            return missing, missing
+        return (
+            self.sales_mean[index, days_of_week, hours],
+            self.counts_mean[index, days_of_week, hours]
+        )
+
+def _slot_means(df: "pd.DataFrame", value_column: str, route_ids: np.ndarray) -> np.ndarray:
+    """Average a value column into a (route, day_of_week, hour) array with np.bincount (UTC slots)"""
+    n_slots = len(route_ids) * 7 * 24
+    if df.empty or n_slots == 0:
+        return np.full((len(route_ids), 7, 24), np.nan)
+    
+    timestamps = slot_timestamps(df['timestamp'])
+    values = df[value_column].to_numpy(dtype=float)
+    valid = ~np.isnan(values)
+    
+    route_index = np.searchsorted(route_ids, df['route_id'].to_numpy())
+    slot = (route_index * 7 + timestamps.dt.dayofweek.to_numpy()) * 24 + timestamps.dt.hour.to_numpy()
+    
+    sums = np.bincount(slot[valid], weights=values[valid], minlength=n_slots)
+    counts = np.bincount(slot[valid], minlength=n_slots)
+    
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    means[counts == 0] = np.nan
+    return means.reshape(len(route_ids), 7, 24)
+
+def forecast_from_records(ticket_sales: List[Dict], passenger_counts: List[Dict],
+                          prediction_hours: int, seed: Optional[int] = None) -> Tuple[List[Dict], List[float]]:
+    """Build a demand cube from request history and forecast every route in it"""
+    return forecast_routes(cube_from_records(ticket_sales, passenger_counts), prediction_hours, seed)
+
+def forecast_from_columnar(sales_payload: bytes, counts_payload: bytes, prediction_hours: int,
+                           seed: Optional[int] = None) -> Tuple[List[Dict], List[float], int]:
+    """Decode Arrow/Parquet history tables and forecast every route in them"""
+    sales_df = read_table(sales_payload)
+    counts_df = read_table(counts_payload)
+    predictions, confidence_scores = forecast_routes(
+        DemandCube.from_frames(sales_df, counts_df), prediction_hours, seed
+    )
+    return predictions, confidence_scores, len(sales_df) + len(counts_df)
+
+def cube_from_records(ticket_sales: List[Dict], passenger_counts: List[Dict]) -> DemandCube:
+    """Aggregate request history rows into a demand cube"""
+    import pandas as pd
     
-    # Get historical data for this route
-    route_sales = sales_df[sales_df['route_id'] == route_id] if not sales_df.empty else pd.DataFrame()
-    route_counts = counts_df[counts_df['route_id'] == route_id] if not counts_df.empty else pd.DataFrame()
+    # Convert to DataFrames
+    sales_df = pd.DataFrame(ticket_sales) if ticket_sales else pd.DataFrame()
+    counts_df = pd.DataFrame(passenger_counts) if passenger_counts else pd.DataFrame()
     
-    # Combine and process data
-    if not route_sales.empty:
-        route_sales['timestamp'] = pd.to_datetime(route_sales['timestamp'])
-        route_sales['hour'] = route_sales['timestamp'].dt.hour
-        route_sales['day_of_week'] = route_sales['timestamp'].dt.dayofweek
+    return DemandCube.from_frames(sales_df, counts_df)
+
+def forecast_routes(cube: DemandCube, prediction_hours: int,
+                    seed: Optional[int] = None) -> Tuple[List[Dict], List[float]]:
+    """Forecast every route in the cube; returns predictions and confidence scores"""
+    predictions = []
+    confidence_scores = []
     
-    if not route_counts.empty:
-        route_counts['timestamp'] = pd.to_datetime(route_counts['timestamp'])
-        route_counts['hour'] = route_counts['timestamp'].dt.hour
-        route_counts['day_of_week'] = route_counts['timestamp'].dt.dayofweek
+    for route_id in cube.route_ids:
+        route_predictions = predict_route_demand(int(route_id), cube, prediction_hours, seed)
+        predictions.extend(route_predictions)
+        confidence_scores.extend([0.8] * len(route_predictions))  # Simplified confidence
     
+    return predictions, confidence_scores
+
+def predict_route_demand(route_id: int, cube: DemandCube, prediction_hours: int,
+                         seed: Optional[int] = None) -> List[Dict]:
+    """
+    Predict demand for a specific route from the pre-aggregated demand cube
+    """
     # Generate predictions for next 24 hours
     current_time = datetime.now()
-    
-    for i in range(prediction_hours):
-        prediction_time = current_time + timedelta(hours=i)
-        hour = prediction_time.hour
-        day_of_week = prediction_time.weekday()
-        
-        # Simple prediction based on historical averages
-        predicted_demand = predict_hourly_demand(
-            route_sales, route_counts, hour, day_of_week
-        )
-        
-        predictions.append({
+    prediction_times = [current_time + timedelta(hours=i) for i in range(prediction_hours)]
+    hours = np.array([t.hour for t in prediction_times], dtype=np.int64)
+    days_of_week = np.array([t.weekday() for t in prediction_times], dtype=np.int64)
+    
+    # Simple prediction based on historical averages, slotted in UTC like the cube
+    utc_times = [t.astimezone(timezone.utc) for t in prediction_times]
+    sales_avg, counts_avg = cube.lookup(
+        route_id,
+        np.array([t.weekday() for t in utc_times], dtype=np.int64),
+        np.array([t.hour for t in utc_times], dtype=np.int64)
+    )
+    rng = forecast_rng(seed, route_id, current_time)
+    predicted = predict_hourly_demand(sales_avg, counts_avg, hours, rng)
+    
+    return [
+        {
             "route_id": route_id,
-            "hour": hour,
-            "day_of_week": day_of_week,
-            "predicted_passengers": predicted_demand,
+            "hour": int(hours[i]),
+            "day_of_week": int(days_of_week[i]),
+            "predicted_passengers": int(predicted[i]),
             "timestamp": prediction_time.isoformat(),
             "confidence": 0.8
-        })
-    
-    return predictions
+        }
+        for i, prediction_time in enumerate(prediction_times)
+    ]
 
-def predict_hourly_demand(sales_df: pd.DataFrame, counts_df: pd.DataFrame, 
-                         hour: int, day_of_week: int) -> int:
+def predict_hourly_demand(sales_avg: np.ndarray, counts_avg: np.ndarray,
+                         hours: np.ndarray, rng: np.random.Generator) -> np.ndarray:
     """
-    Simple demand prediction based on historical averages
+    Simple demand prediction based on historical averages.
+    
+    Takes per-hour slot averages (NaN where there is no history) and prefers
+    ticket sales, then passenger counts, then a peak/off-peak default.
+    Noise for the whole horizon comes from one draw on `rng`.
     """
-    # Get historical data for same hour and day of week
-    if not sales_df.empty:
-        same_hour_sales = sales_df[
-            (sales_df['hour'] == hour) & (sales_df['day_of_week'] == day_of_week)
-        ]
-        if not same_hour_sales.empty:
-            avg_passengers = same_hour_sales['passenger_count'].mean()
-            return max(0, int(avg_passengers * (1 + np.random.normal(0, 0.2))))
-    
-    if not counts_df.empty:
-        same_hour_counts = counts_df[
-            (counts_df['hour'] == hour) & (counts_df['day_of_week'] == day_of_week)
-        ]
-        if not same_hour_counts.empty:
-            avg_occupancy = same_hour_counts['occupancy'].mean()
-            return max(0, int(avg_occupancy * (1 + np.random.normal(0, 0.2))))
+    noise = rng.standard_normal(len(hours))
+    
+    # Historical averages get +/-20% noise, clipped at zero
+    history = np.where(np.isnan(sales_avg), counts_avg, sales_avg)
+    from_history = np.maximum(0, np.trunc(history * (1 + 0.2 * noise)))
     
     # Default prediction if no historical data
-    base_demand = 20 if 6 <= hour <= 9 or 17 <= hour <= 19 else 10  # Peak hours
-    return int(base_demand * (1 + np.random.normal(0, 0.3)))
+    is_peak = ((hours >= 6) & (hours <= 9)) | ((hours >= 17) & (hours <= 19))
+    base_demand = np.where(is_peak, 20, 10)  # Peak hours
+    default = np.trunc(base_demand * (1 + 0.3 * noise))
+    
+    return np.where(np.isnan(history), default, from_history).astype(np.int64)
 
-def generate_sample_forecast(route_id: Optional[int] = None) -> Dict:
+def generate_sample_forecast(route_id: Optional[int] = None, seed: Optional[int] = None) -> Dict:
     """
     Generate sample forecast data for demonstration
     """
     current_time = datetime.now()
-    forecast = []
-    
-    for i in range(24):
-        prediction_time = current_time + timedelta(hours=i)
-        hour = prediction_time.hour
-        
-        # Generate realistic demand pattern
-        if 6 <= hour <= 9:  # Morning peak
-            base_demand = 45
-        elif 17 <= hour <= 19:  # Evening peak
-            base_demand = 50
-        elif 10 <= hour <= 16:  # Daytime
-            base_demand = 25
-        else:  # Night/early morning
-            base_demand = 10
-        
-        # Add some randomness
-        predicted_passengers = int(base_demand * (1 + np.random.normal(0, 0.2)))
-        
-        forecast.append({
-            "hour": hour,
+    prediction_times = [current_time + timedelta(hours=i) for i in range(24)]
+    hours = np.array([t.hour for t in prediction_times])
+    
+    # Generate realistic demand pattern
+    base_demand = np.select(
+        [(hours >= 6) & (hours <= 9), (hours >= 17) & (hours <= 19), (hours >= 10) & (hours <= 16)],
+        [45, 50, 25],  # Morning peak, evening peak, daytime
+        default=10     # Night/early morning
+    )
+    
+    # Add some randomness, one draw for the whole day
+    rng = forecast_rng(seed, route_id, current_time)
+    predicted_passengers = np.trunc(base_demand * (1 + rng.normal(0, 0.2, len(hours)))).astype(int)
+    
+    forecast = [
+        {
+            "hour": prediction_time.hour,
             "day_of_week": prediction_time.weekday(),
-            "predicted_passengers": max(0, predicted_passengers),
+            "predicted_passengers": max(0, int(predicted_passengers[i])),
             "confidence": 0.8,
             "timestamp": prediction_time.isoformat()
-        })
+        }
+        for i, prediction_time in enumerate(prediction_times)
+    ]
     
     return {
         "route_id": route_id,
@@ -284,100 +533,168 @@ def generate_sample_forecast(route_id: Optional[int] = None) -> Dict:
         "method": "sample_forecast"
     }
 
-async def optimize_bus_schedules(routes: List[Dict], current_schedules: List[Dict], 
-                                constraints: Dict) -> List[Dict]:
-    """
-    Optimize bus schedules to reduce bunching and improve efficiency
-    """
-    optimized_schedules = []
+def run_schedule_optimization(routes: List[Dict], current_schedules: List[Dict],
+                              constraints: Dict) -> Tuple[List[Dict], Dict, List[str]]:
+    """Optimize schedules and derive improvement metrics and reasons"""
+    # Parse trip times once; everything below works on the arrays
+    current = ScheduleArray.from_dicts(current_schedules)
+    optimized = optimize_bus_schedules(routes, current, constraints)
     
-    # Group schedules by route
-    schedules_by_route = {}
-    for schedule in current_schedules:
-        route_id = schedule.get('route_id')
-        if route_id not in schedules_by_route:
-            schedules_by_route[route_id] = []
-        schedules_by_route[route_id].append(schedule)
+    # Calculate improvement metrics
+    improvement_metrics = calculate_improvement_metrics(current, optimized)
     
-    # Optimize each route
-    for route_id, route_schedules in schedules_by_route.items():
-        route_optimized = optimize_route_schedules(route_id, route_schedules, constraints)
-        optimized_schedules.extend(route_optimized)
+    # Generate optimization reasons
+    optimization_reasons = generate_optimization_reasons(current, optimized)
     
-    return optimized_schedules
+    return optimized.to_dicts(), improvement_metrics, optimization_reasons
 
-def optimize_route_schedules(route_id: int, schedules: List[Dict], 
-                           constraints: Dict) -> List[Dict]:
+def optimize_bus_schedules(routes: List[Dict], current: ScheduleArray, 
+                           constraints: Dict) -> OptimizedSchedule:
     """
-    Optimize schedules for a specific route
+    Optimize bus schedules to reduce bunching and improve efficiency:
+    each route's trips are re-spaced at the target headway from its
+    earliest trip, assuming a 90 minute trip duration
     """
-    if not schedules:
-        return []
-    
-    # Sort schedules by start time
-    schedules.sort(key=lambda x: x.get('start_time', '00:00:00'))
-    
-    optimized = []
     target_headway = constraints.get('target_headway_minutes', 15)
+    return respace_routes(current, target_headway, trip_minutes=90)
+
+def run_network_optimization(routes: List[Dict], current_schedules: List[Dict], demand_forecast: List[Dict],
+                             fleet_size: Optional[int], constraints: Dict) -> Tuple[List[Dict], Dict, List[str]]:
+    """
+    Allocate one shared fleet across all routes and service periods to
+    minimise total expected passenger wait, then lay out each route's trips
+    at the resulting per-period headway.
+    
+    A route's cycle time (minutes before a bus can depart again) comes from
+    its 'cycle_time_minutes', else constraints['trip_duration_minutes']
+    (default 90, the trip length assumed elsewhere in this service).
+    
+    Each trip names the vehicle running it: within a period, the buses
+    allocated to a route take its departures round-robin. Vehicles are the
+    distinct bus_ids of current_schedules in first-seen order, then the
+    smallest unused integers for any buses beyond them.
+    """
+    route_cycles = {}
+    for route in routes:
+        route_id = route.get('route_id', route.get('id'))
+        if route_id is not None:
+            route_cycles[int(route_id)] = route.get('cycle_time_minutes')
+    for item in list(current_schedules) + list(demand_forecast):
+        if item.get('route_id') is not None:
+            route_cycles.setdefault(int(item['route_id']), None)
+    route_ids = sorted(route_cycles)
+    
+    default_cycle = constraints.get('trip_duration_minutes', 90)
+    cycles = np.array([route_cycles[r] or default_cycle for r in route_ids], dtype=np.float64)
     min_headway = constraints.get('min_headway_minutes', 5)
     max_headway = constraints.get('max_headway_minutes', 30)
     
-    for i, schedule in enumerate(schedules):
-        # Calculate optimal start time
-        if i == 0:
-            # First bus starts at original time
-            new_start_time = schedule.get('start_time', '06:00:00')
-        else:
-            # Subsequent buses with optimal headway
-            prev_time = time_to_minutes(optimized[i-1]['start_time'])
-            new_time_minutes = prev_time + target_headway
-            new_start_time = minutes_to_time(new_time_minutes)
-        
-        # Calculate end time (assume 1.5 hour trip duration)
-        start_minutes = time_to_minutes(new_start_time)
-        end_minutes = start_minutes + 90  # 90 minutes trip
-        new_end_time = minutes_to_time(end_minutes)
-        
-        # Determine adjustment reason
-        original_start = schedule.get('start_time', '00:00:00')
-        time_diff = time_to_minutes(new_start_time) - time_to_minutes(original_start)
-        
-        if abs(time_diff) > 5:  # Significant change
-            if time_diff > 0:
-                reason = f"Delayed by {time_diff} minutes to improve headway"
-            else:
-                reason = f"Advanced by {abs(time_diff)} minutes to reduce bunching"
-        else:
-            reason = "Minor adjustment for optimal spacing"
-        
-        optimized_schedule = {
-            "bus_id": schedule.get('bus_id'),
-            "route_id": route_id,
-            "start_time": new_start_time,
-            "end_time": new_end_time,
-            "adjustment_reason": reason,
-            "original_start_time": original_start,
-            "time_adjustment_minutes": time_diff
+    known_buses = list(dict.fromkeys(s['bus_id'] for s in current_schedules if s.get('bus_id') is not None))
+    if fleet_size is None:
+        fleet_size = constraints.get('fleet_size') or len(known_buses)
+    if not fleet_size:
+        raise ValueError("fleet_size is required when current_schedules carry no bus_id")
+    
+    starts, ends = service_periods(
+        time_to_minutes(constraints.get('service_start', '06:00:00')),
+        time_to_minutes(constraints.get('service_end', '22:00:00')),
+        constraints.get('period_minutes', 60)
+    )
+    lengths = (ends - starts).astype(np.float64)
+    demand = route_period_demand(route_ids, demand_forecast, starts, ends)
+    buses = allocate_fleet(demand, cycles, lengths, int(fleet_size), min_headway, max_headway)
+    
+    served = buses > 0
+    headways = np.divide(cycles[:, None], buses, out=np.full(buses.shape, np.inf), where=served)
+    
+    # Departures every headway through each served (route, period)
+    trip_counts = np.where(served, np.ceil(lengths / np.where(served, headways, 1)), 0).astype(np.int64)
+    group_route, group_period = np.nonzero(trip_counts)
+    counts = trip_counts[group_route, group_period]
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    trip_route = np.repeat(group_route, counts)
+    trip_period = np.repeat(group_period, counts)
+    departures = np.round(starts[trip_period] + position * headways[trip_route, trip_period]).astype(np.int64)
+    arrivals = departures + np.round(cycles[trip_route]).astype(np.int64)
+    
+    # Fleet slot per trip: each (route, period) owns a block of the period's buses
+    slot_offsets = np.cumsum(buses, axis=0) - buses
+    trip_slots = slot_offsets[trip_route, trip_period] + position % buses[trip_route, trip_period]
+    vehicles = list(known_buses)
+    spare_ids = (i for i in itertools.count(1) if i not in set(known_buses))
+    while len(vehicles) < int(buses.sum(axis=0).max(initial=0)):
+        vehicles.append(next(spare_ids))
+    
+    optimized = [
+        {
+            "bus_id": vehicles[slot],
+            "route_id": route_ids[r],
+            "start_time": minutes_to_time(int(start)),
+            "end_time": minutes_to_time(int(end)),
+            "headway_minutes": round(float(headways[r, p]), 1),
+            "buses_allocated": int(buses[r, p]),
+            "adjustment_reason": f"Network allocation: {int(buses[r, p])} buses in this period"
         }
-        
-        optimized.append(optimized_schedule)
+        for r, p, slot, start, end in zip(trip_route.tolist(), trip_period.tolist(), trip_slots.tolist(),
+                                          departures.tolist(), arrivals.tolist())
+    ]
+    
+    # Expected wait under the current timetable, routes without one at max headway
+    current_starts = {}
+    for schedule in current_schedules:
+        if schedule.get('route_id') is not None:
+            current_starts.setdefault(int(schedule['route_id']), []).append(
+                time_to_minutes(schedule.get('start_time', '00:00:00'))
+            )
+    current_headways = np.array([
+        np.mean(np.diff(sorted(current_starts[r]))) if len(current_starts.get(r, [])) > 1 else max_headway
+        for r in route_ids
+    ], dtype=np.float64)
+    wait_before = float(expected_wait(demand, lengths[None, :], current_headways[:, None]).sum())
+    wait_after = float(expected_wait(demand, lengths[None, :], np.where(served, headways, 0)).sum())
+    unserved = float((demand * lengths[None, :] / 60)[~served & (demand > 0)].sum())
+    
+    metrics = {
+        "network": {
+            "routes": len(route_ids),
+            "fleet_size": int(fleet_size),
+            "periods": len(starts),
+            "total_trips": len(optimized),
+            "peak_buses_in_service": int(buses.sum(axis=0).max()) if buses.size else 0,
+            "buses_by_period": buses.sum(axis=0).tolist(),
+            "expected_wait_passenger_minutes": {
+                "current": round(wait_before, 1),
+                "optimized": round(wait_after, 1),
+                "reduction_percentage": round((1 - wait_after / wait_before) * 100, 1) if wait_before else 0.0
+            },
+            "unserved_passengers": round(unserved, 1)
+        }
+    }
+    
+    reasons = [
+        f"Allocated {int(fleet_size)} shared buses across {len(route_ids)} routes per period by marginal wait reduction"
+    ]
+    if wait_before > wait_after:
+        reasons.append(f"Reduced expected passenger wait by {metrics['network']['expected_wait_passenger_minutes']['reduction_percentage']}%")
+    if unserved > 0:
+        reasons.append(f"Fleet too small for minimum service: {unserved:.0f} forecast passengers unserved")
     
-    return optimized
+    return optimized, metrics, reasons
 
-def calculate_improvement_metrics(current: List[Dict], optimized: List[Dict]) -> Dict:
+def calculate_improvement_metrics(current: ScheduleArray, optimized: OptimizedSchedule) -> Dict:
     """
     Calculate improvement metrics between current and optimized schedules
     """
-    if not current or not optimized:
+    if not len(current) or not len(optimized):
         return {}
     
     # Calculate headway statistics
-    current_headways = calculate_headways(current)
-    optimized_headways = calculate_headways(optimized)
+    current_headways = current.headway_stats()
+    optimized_headways = optimized.headway_stats()
     
     # Calculate efficiency scores
-    current_efficiency = calculate_efficiency_score(current)
-    optimized_efficiency = calculate_efficiency_score(optimized)
+    current_efficiency = current.efficiency_score()
+    optimized_efficiency = optimized.efficiency_score()
     
     return {
         "headway_improvement": {
@@ -392,58 +709,20 @@ def calculate_improvement_metrics(current: List[Dict], optimized: List[Dict]) ->
         },
         "schedule_changes": {
             "total_schedules": len(optimized),
-            "schedules_adjusted": sum(1 for s in optimized if s.get('time_adjustment_minutes', 0) != 0),
-            "average_adjustment_minutes": np.mean([abs(s.get('time_adjustment_minutes', 0)) for s in optimized])
+            "schedules_adjusted": optimized.adjusted_count(),
+            "average_adjustment_minutes": np.mean(np.abs(optimized.adjustments))
         }
     }
 
-def calculate_headways(schedules: List[Dict]) -> Dict:
-    """
-    Calculate headway statistics for schedules
-    """
-    if len(schedules) < 2:
-        return {"average": 0, "min": 0, "max": 0, "variance": 0}
-    
-    headways = []
-    for i in range(1, len(schedules)):
-        prev_time = time_to_minutes(schedules[i-1].get('start_time', '00:00:00'))
-        curr_time = time_to_minutes(schedules[i].get('start_time', '00:00:00'))
-        headways.append(curr_time - prev_time)
-    
-    return {
-        "average": np.mean(headways),
-        "min": np.min(headways),
-        "max": np.max(headways),
-        "variance": np.var(headways)
-    }
-
-def calculate_efficiency_score(schedules: List[Dict]) -> float:
-    """
-    Calculate efficiency score for schedules (0-100)
-    """
-    if not schedules:
-        return 0
-    
-    headways = calculate_headways(schedules)
-    target_headway = 15  # minutes
-    
-    # Score based on how close to target headway
-    headway_score = max(0, 100 - abs(headways['average'] - target_headway) * 2)
-    
-    # Penalty for high variance
-    variance_penalty = min(50, headways['variance'] * 0.5)
-    
-    return max(0, headway_score - variance_penalty)
-
-def generate_optimization_reasons(current: List[Dict], optimized: List[Dict]) -> List[str]:
+def generate_optimization_reasons(current: ScheduleArray, optimized: OptimizedSchedule) -> List[str]:
     """
     Generate human-readable optimization reasons
     """
     reasons = []
     
     # Check for bunching reduction
-    current_headways = calculate_headways(current)
-    optimized_headways = calculate_headways(optimized)
+    current_headways = current.headway_stats()
+    optimized_headways = optimized.headway_stats()
     
     if optimized_headways['variance'] < current_headways['variance']:
         reasons.append("Reduced schedule variance to prevent bus bunching")
@@ -455,14 +734,14 @@ def generate_optimization_reasons(current: List[Dict], optimized: List[Dict]) ->
         reasons.append("Reduced headway to increase service frequency")
     
     # Check for efficiency improvements
-    current_efficiency = calculate_efficiency_score(current)
-    optimized_efficiency = calculate_efficiency_score(optimized)
+    current_efficiency = current.efficiency_score()
+    optimized_efficiency = optimized.efficiency_score()
     
     if optimized_efficiency > current_efficiency:
         reasons.append(f"Improved overall efficiency by {optimized_efficiency - current_efficiency:.1f} points")
     
     # Count adjustments
-    adjustments = sum(1 for s in optimized if s.get('time_adjustment_minutes', 0) != 0)
+    adjustments = optimized.adjusted_count()
     if adjustments > 0:
         reasons.append(f"Adjusted {adjustments} out of {len(optimized)} schedules for optimal spacing")
     
@@ -483,6 +762,5 @@ def minutes_to_time(minutes: int) -> str:
     return f"{hours:02d}:{mins:02d}:00"
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    run_service(app, "main:app", port=8001)
 
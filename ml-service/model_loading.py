@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Background Model Loading
+Keeps model loading off a service's startup path so /health answers as
+soon as the process is up. MODEL_LOADING picks when models load:
+
+    background  on a thread started by the startup hook (default)
+    lazy        on the first request that needs them
+    eager       in the startup hook, before the service accepts requests
+
+/ready reports the loader's state, so an orchestrator routes traffic to a
+replica only once its models are in memory, and not to one whose load
+failed (until a reload succeeds). Requests that need a model
+wait for a load in progress rather than seeing a half-initialised service.
+reload() loads again (a new registry version) without a restart.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from executor import run_threaded
+
+logger = logging.getLogger(__name__)
+
+LOADING_MODES = ('background', 'lazy', 'eager')
+
+class ModelLoader:
+    """
+    Runs a service's load function once, per MODEL_LOADING, and tracks its
+    state: pending -> loading -> loaded | failed. `load` handles missing
+    model files itself (services fall back to simple algorithms); an
+    exception it raises marks the load failed and is reported.
+    """
+
+    def __init__(self, load: Callable[[], Any], mode: Optional[str] = None):
+        self.load = load
+        self.mode = (mode or os.getenv("MODEL_LOADING", "background")).lower()
+        if self.mode not in LOADING_MODES:
+            raise ValueError(f"MODEL_LOADING must be one of {', '.join(LOADING_MODES)}, got {self.mode!r}")
+
+        self.state = 'pending'
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        """Begin loading as the mode says; call from the startup hook"""
+        if self.mode == 'eager':
+            self.ensure_loaded()
+        elif self.mode == 'background':
+            threading.Thread(target=self.ensure_loaded, name="model-loader", daemon=True).start()
+
+    def ensure_loaded(self, timeout: Optional[float] = None) -> bool:
+        """
+        Load now if nothing has started the load yet, otherwise wait for it.
+        Returns True once loading has finished (loaded or failed).
+        """
+        with self._lock:
+            run = self.state == 'pending'
+            if run:
+                self.state = 'loading'
+
+        if run:
+            started = time.perf_counter()
+            try:
+                self.load()
+                self.state = 'loaded'
+            except Exception as e:
+                logger.error(f"Model loading failed: {str(e)}")
+                self.error = str(e)
+                self.state = 'failed'
+            finally:
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                logger.info(f"Model loading finished in {self.load_seconds:.2f}s ({self.state})")
+                self._done.set()
+
+        return self._done.wait(timeout)
+
+    def reload(self):
+        """
+        Run `load` again, e.g. once a new model version is published. Waits
+        for the initial load and runs one reload at a time. `load` swaps the
+        new models in only when they are fully loaded, so requests already
+        running finish on the models they started with; if it raises, the
+        current models stay in place and the error is re-raised.
+        """
+        self.ensure_loaded()
+        with self._reload_lock:
+            started = time.perf_counter()
+            try:
+                self.load()
+            except Exception as e:
+                logger.error(f"Model reload failed: {str(e)}")
+                self.error = str(e)
+                raise
+            self.state = 'loaded'
+            self.error = None
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            logger.info(f"Model reload finished in {self.load_seconds:.2f}s")
+
+    async def wait(self):
+        """ensure_loaded for request handlers, off the event loop unless already done"""
+        if not self._done.is_set():
+            await run_threaded(self.ensure_loaded)
+
+    @property
+    def ready(self) -> bool:
+        """
+        Whether requests can be served without waiting on a load already
+        under way. False after a failed load: the replica would only serve
+        the fallback algorithms, so it should not get traffic.
+        """
+        if self._done.is_set():
+            return self.state != 'failed'
+        return self.mode == 'lazy' and self.state == 'pending'
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'ready': self.ready,
+            'mode': self.mode,
+            'state': self.state,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Model Registry
+Versioned model artifacts on local disk, one directory per model name:
+
+    models/demand_model/
+        CURRENT          id of the active version
+        .jobs/           training job records (see training_jobs.py)
+        3f9a1c2be4d0/    a version: every file of one trained model
+            demand_model.pkl
+            demand_model.forest.joblib
+            ...
+
+A trainer writes a new version's files into a staging directory and
+publishes it. The directory is renamed to the hash of its contents and
+CURRENT is replaced with os.replace, so a reader sees the old version or
+the new one, never a half-written file, and identical files always get
+the same version. Services poll CURRENT (RegistryWatcher) or are told to
+reload, and swap the new model in.
+
+Until a model is first published, services read the flat layout
+(models/demand_model.pkl, ...) as before, with no version.
+
+    python model_registry.py list demand_model
+    python model_registry.py activate demand_model 3f9a1c2be4d0
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+POINTER = "CURRENT"
+VERSION_LENGTH = 12
+
+# Staging directories older than this are left over from failed saves
+STALE_STAGING_SECONDS = 3600
+
+def content_hash(directory: Union[str, Path]) -> str:
+    """Hash of every file's relative path and bytes under `directory`"""
+    directory = Path(directory)
+    digest = hashlib.sha256()
+    for path in sorted(p for p in directory.rglob('*') if p.is_file()):
+        digest.update(f"{path.relative_to(directory).as_posix()}\0{path.stat().st_size}\0".encode())
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:VERSION_LENGTH]
+
+class ModelRegistry:
+    """
+    Versions of each named model under `root`. The newest `keep` versions
+    (MODEL_REGISTRY_KEEP, default 5) are kept for rollback; the current one
+    is never deleted.
+    """
+
+    def __init__(self, root: Union[str, Path] = "models", keep: Optional[int] = None):
+        self.root = Path(root)
+        self.keep = keep if keep is not None else int(os.getenv("MODEL_REGISTRY_KEEP", "5"))
+
+    def stage(self, name: str) -> Path:
+        """Empty directory to write a new version's files into before publish()"""
+        staging = self.root / name / f".staging-{uuid.uuid4().hex}"
+        staging.mkdir(parents=True)
+        return staging
+
+    def publish(self, name: str, staging: Union[str, Path]) -> str:
+        """Turn a staging directory into a version and make it current; returns the version"""
+        staging = Path(staging)
+        version = content_hash(staging)
+        version_dir = self.root / name / version
+        if version_dir.exists():
+            # Same files as an earlier version: reuse it
+            shutil.rmtree(staging)
+            os.utime(version_dir)
+        else:
+            os.rename(staging, version_dir)
+
+        self.activate(name, version)
+        self.prune(name)
+        logger.info(f"Published {name} version {version}")
+        return version
+
+    def activate(self, name: str, version: str):
+        """Point CURRENT at a published version (after publish, or to roll back)"""
+        if not (self.root / name / version).is_dir():
+            raise ValueError(f"Unknown {name} version {version}")
+        pointer = self.root / name / POINTER
+        tmp_path = pointer.with_name(f".{POINTER}.{uuid.uuid4().hex}")
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pointer)
+
+    def current_version(self, name: str) -> Optional[str]:
+        try:
+            return (self.root / name / POINTER).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def resolve(self, name: str) -> Tuple[Path, Optional[str]]:
+        """Directory holding the current version's files and its version (root and None before any publish)"""
+        version = self.current_version(name)
+        if version is None:
+            return self.root, None
+        return self.root / name / version, version
+
+    def jobs_dir(self, name: str) -> Path:
+        """Directory for a model's training job records, shared by every service worker"""
+        return self.root / name / ".jobs"
+
+    def versions(self, name: str) -> List[Dict]:
+        """Published versions, newest first"""
+        base = self.root / name
+        if not base.is_dir():
+            return []
+        current = self.current_version(name)
+        dirs = sorted(
+            (p for p in base.iterdir() if p.is_dir() and not p.name.startswith('.')),
+            key=lambda p: p.stat().st_mtime, reverse=True
+        )
+        return [{
+            'version': p.name,
+            'published_at': datetime.fromtimestamp(p.stat().st_mtime).isoformat(),
+            'current': p.name == current
+        } for p in dirs]
+
+    def prune(self, name: str):
+        """
+        Delete versions beyond the newest `keep` (never the current one) and
+        stale staging directories. Processes still mapping a deleted
+        version's files keep reading them until they let go.
+        """
+        base = self.root / name
+        for staging in base.glob('.staging-*'):
+            if time.time() - staging.stat().st_mtime > STALE_STAGING_SECONDS:
+                shutil.rmtree(staging, ignore_errors=True)
+        if self.keep <= 0:
+            return
+        for entry in self.versions(name)[self.keep:]:
+            if not entry['current']:
+                shutil.rmtree(base / entry['version'], ignore_errors=True)
+
+class RegistryWatcher:
+    """
+    Polls the CURRENT pointers of `names` every MODEL_RELOAD_SECONDS
+    (default 10, 0 disables) and calls `on_change` when one moves.
+    """
+
+    def __init__(self, registry: ModelRegistry, names: List[str], on_change: Callable[[], None],
+                 interval: Optional[float] = None):
+        self.registry = registry
+        self.names = names
+        self.on_change = on_change
+        self.interval = interval if interval is not None else float(os.getenv("MODEL_RELOAD_SECONDS", "10"))
+        self._stop = threading.Event()
+
+    def _pointers(self) -> Dict[str, Optional[str]]:
+        return {name: self.registry.current_version(name) for name in self.names}
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        threading.Thread(target=self._run, args=(self._pointers(),), name="registry-watcher", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, seen: Dict[str, Optional[str]]):
+        while not self._stop.wait(self.interval):
+            pointers = self._pointers()
+            if pointers == seen:
+                continue
+            seen = pointers
+            logger.info(f"Model registry changed: {pointers}; reloading")
+            try:
+                self.on_change()
+            except Exception as e:
+                logger.error(f"Model reload failed: {str(e)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the model registry or roll back a model")
+    parser.add_argument('--root', default="models")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list').add_argument('name')
+    activate = subparsers.add_parser('activate')
+    activate.add_argument('name')
+    activate.add_argument('version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'list':
+        for entry in registry.versions(args.name):
+            print(f"{'*' if entry['current'] else ' '} {entry['version']}  {entry['published_at']}")
+    else:
+        registry.activate(args.name, args.version)
+        print(f"{args.name} -> {args.version} (running services pick it up on their next reload)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Model Latency Tiers
+Each forest is trained in two tiers: "full", the model as configured or
+tuned, and "fast", a smaller forest fitted on the same training rows with
+fewer and shallower trees for callers that score every bus or route many
+times a minute. The fast tier is saved beside the full model and is chosen
+per request (?tier=fast); its held-out metrics are reported as a delta
+from the full model's so callers know what the speed costs.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Literal, Union
+
+import numpy as np
+
+from tuning import fit_parallel
+
+TIERS = ('full', 'fast')
+ModelTier = Literal['full', 'fast']
+
+# Upper bounds; a full model that is already smaller keeps its own values
+FAST_FOREST_PARAMS = {'n_estimators': 20, 'max_depth': 6}
+
+def tier_path(model_path: Union[str, Path], tier: str) -> Path:
+    """Pickle of a model tier: models/x.pkl for full, models/x_fast.pkl for fast"""
+    model_path = Path(model_path)
+    if tier == 'full':
+        return model_path
+    return model_path.with_name(f"{model_path.stem}_{tier}{model_path.suffix}")
+
+def fit_fast_variant(model: Any, X: np.ndarray, y: np.ndarray, n_jobs: int = -1) -> Any:
+    """
+    Fit the fast tier of a fitted forest: same settings and training rows,
+    with n_estimators and max_depth capped at FAST_FOREST_PARAMS.
+    """
+    from sklearn.base import clone
+
+    params = model.get_params()
+    fast = clone(model).set_params(
+        n_estimators=min(params['n_estimators'], FAST_FOREST_PARAMS['n_estimators']),
+        max_depth=min(params['max_depth'] or FAST_FOREST_PARAMS['max_depth'], FAST_FOREST_PARAMS['max_depth'])
+    )
+    return fit_parallel(fast, X, y, n_jobs=n_jobs)
+
+def tier_summary(fast: Any, full_metrics: Dict[str, float], fast_metrics: Dict[str, float]) -> Dict[str, Any]:
+    """Fast-tier size, held-out metrics and their difference from the full model (fast - full)"""
+    return {
+        'n_estimators': int(fast.n_estimators),
+        'max_depth': int(fast.max_depth),
+        'metrics': {key: float(value) for key, value in fast_metrics.items()},
+        'delta': {
+            key: float(fast_metrics[key] - full_metrics[key])
+            for key in fast_metrics if key in full_metrics
+        }
+    }
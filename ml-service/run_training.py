@@ -92,10 +92,11 @@ def test_trained_models():
     
     try:
         import joblib
-        from pathlib import Path
+        from model_registry import ModelRegistry
         
-        model_path = Path("models/demand_model.pkl")
-        metadata_path = Path("models/demand_model_metadata.json")
+        model_dir, version = ModelRegistry().resolve("demand_model")
+        model_path = model_dir / "demand_model.pkl"
+        metadata_path = model_dir / "demand_model_metadata.json"
         
         if model_path.exists() and metadata_path.exists():
             # Load model
@@ -106,7 +107,7 @@ def test_trained_models():
             with open(metadata_path, 'r') as f:
                 metadata = json.load(f)
             
-            logger.info("✅ Model loaded successfully")
+            logger.info(f"✅ Model loaded successfully (version {version or 'unversioned'})")
             logger.info(f"✅ Model accuracy: {metadata['metrics']['accuracy']:.2%}")
             logger.info(f"✅ MAE: {metadata['metrics']['mae']:.2f}")
             logger.info(f"✅ RMSE: {metadata['metrics']['rmse']:.2f}")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Array-backed Schedules
+Holds a list of trips as NumPy arrays (start/end minutes, route and bus ids)
+so the optimizer parses 'HH:MM:SS' strings once and computes headways and
+adjustments with vectorised ops. Dicts are produced only at the API boundary.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+def parse_minutes(time_str: Any) -> int:
+    """Minutes since midnight of 'HH:MM[:SS]'; 0 if it cannot be parsed"""
+    try:
+        parts = time_str.split(':')
+        return int(parts[0]) * 60 + int(parts[1])
+    except Exception:
+        return 0
+
+def parse_labels(labels: List[Any]) -> np.ndarray:
+    """parse_minutes over many labels, parsing each distinct label once"""
+    cache = {}
+    return np.fromiter(
+        (cache[label] if label in cache else cache.setdefault(label, parse_minutes(label)) for label in labels),
+        dtype=np.int64, count=len(labels)
+    )
+
+def format_minutes(minutes: np.ndarray) -> List[str]:
+    """Minutes since midnight to 'HH:MM:00' strings, formatting each distinct value once"""
+    unique, inverse = np.unique(np.asarray(minutes, dtype=np.int64), return_inverse=True)
+    table = np.array([f"{m // 60:02d}:{m % 60:02d}:00" for m in unique.tolist()], dtype=object)
+    return table[inverse].tolist()
+
+class ScheduleArray:
+    """
+    Trips in list order. `start_labels` keeps the start time string to
+    report for each trip; `has_start` marks trips that carried one.
+    """
+
+    def __init__(self, start_minutes: np.ndarray, route_ids: List[Any], bus_ids: List[Any],
+                 start_labels: List[str], end_minutes: Optional[np.ndarray] = None,
+                 has_start: Optional[np.ndarray] = None):
+        self.start_minutes = np.asarray(start_minutes, dtype=np.int64)
+        self.route_ids = route_ids
+        self.bus_ids = bus_ids
+        self.start_labels = start_labels
+        self.end_minutes = end_minutes
+        self.has_start = np.ones(len(self.start_minutes), dtype=bool) if has_start is None else has_start
+        self._headway_stats = None
+
+    @classmethod
+    def from_dicts(cls, schedules: List[Dict]) -> "ScheduleArray":
+        """Parse each trip's start_time once"""
+        labels = [s.get('start_time', '00:00:00') for s in schedules]
+        return cls(
+            start_minutes=parse_labels(labels),
+            route_ids=[s.get('route_id') for s in schedules],
+            bus_ids=[s.get('bus_id') for s in schedules],
+            start_labels=labels,
+            has_start=np.fromiter(('start_time' in s for s in schedules), dtype=bool, count=len(schedules))
+        )
+
+    def __len__(self) -> int:
+        return len(self.start_minutes)
+
+    def route_codes(self) -> np.ndarray:
+        """Dense route index per trip, numbered in order of first appearance"""
+        index = {}
+        return np.fromiter((index.setdefault(r, len(index)) for r in self.route_ids),
+                           dtype=np.int64, count=len(self.route_ids))
+
+    def headways(self) -> np.ndarray:
+        """Gaps between consecutive trips in list order"""
+        return np.diff(self.start_minutes)
+
+    def headway_stats(self) -> Dict[str, float]:
+        """Average/min/max/variance of headways, computed once"""
+        if self._headway_stats is None:
+            if len(self) < 2:
+                self._headway_stats = {"average": 0, "min": 0, "max": 0, "variance": 0}
+            else:
+                headways = self.headways()
+                self._headway_stats = {
+                    "average": np.mean(headways),
+                    "min": np.min(headways),
+                    "max": np.max(headways),
+                    "variance": np.var(headways)
+                }
+        return self._headway_stats
+
+    def efficiency_score(self, target_headway: float = 15) -> float:
+        """Efficiency score (0-100): closeness to target headway minus a variance penalty"""
+        if len(self) == 0:
+            return 0
+
+        headways = self.headway_stats()
+
+        # Score based on how close to target headway
+        headway_score = max(0, 100 - abs(headways['average'] - target_headway) * 2)
+
+        # Penalty for high variance
+        variance_penalty = min(50, headways['variance'] * 0.5)
+
+        return max(0, headway_score - variance_penalty)
+
+class OptimizedSchedule(ScheduleArray):
+    """Optimizer output: new trip times plus how far each trip moved"""
+
+    def __init__(self, start_minutes: np.ndarray, route_ids: List[Any], bus_ids: List[Any],
+                 start_labels: List[str], end_minutes: np.ndarray, original_labels: List[str],
+                 adjustments: np.ndarray, reasons: List[str]):
+        super().__init__(start_minutes, route_ids, bus_ids, start_labels, end_minutes)
+        self.original_labels = original_labels
+        self.adjustments = np.asarray(adjustments, dtype=np.int64)
+        self.reasons = reasons
+
+    def adjusted_count(self) -> int:
+        return int(np.count_nonzero(self.adjustments))
+
+    def to_dicts(self) -> List[Dict]:
+        """The JSON shape of POST /optimize optimized_schedules"""
+        end_labels = format_minutes(self.end_minutes)
+        return [
+            {
+                "bus_id": bus_id,
+                "route_id": route_id,
+                "start_time": start,
+                "end_time": end,
+                "adjustment_reason": reason,
+                "original_start_time": original,
+                "time_adjustment_minutes": adjustment
+            }
+            for bus_id, route_id, start, end, reason, original, adjustment in zip(
+                self.bus_ids, self.route_ids, self.start_labels, end_labels, self.reasons,
+                self.original_labels, self.adjustments.tolist()
+            )
+        ]
+
+def respace_routes(schedules: ScheduleArray, target_headway: int, trip_minutes: int = 90,
+                   default_first_start: str = '06:00:00') -> OptimizedSchedule:
+    """
+    Re-space every route's trips at `target_headway`, keeping each route's
+    earliest trip in place. Routes come out in order of first appearance,
+    each sorted by start time string.
+    """
+    codes = schedules.route_codes()
+    labels = np.array(schedules.start_labels, dtype=str) if len(schedules) else np.array([], dtype=str)
+    order = np.lexsort((labels, codes))
+    n = len(order)
+
+    sorted_codes = codes[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = sorted_codes[1:] != sorted_codes[:-1]
+    group_start = np.maximum.accumulate(np.where(first, np.arange(n), 0)) if n else np.zeros(0, dtype=np.int64)
+    position = np.arange(n) - group_start
+
+    original_labels = [schedules.start_labels[i] for i in order.tolist()]
+    original_minutes = schedules.start_minutes[order]
+
+    # Each route's first trip keeps its start time; a missing one defaults
+    first_labels = {
+        i: original_labels[i] if schedules.has_start[order[i]] else default_first_start
+        for i in np.flatnonzero(first).tolist()
+    }
+    first_minutes = np.zeros(n, dtype=np.int64)
+    first_minutes[first] = [parse_minutes(first_labels[i]) for i in sorted(first_labels)]
+    new_minutes = first_minutes[group_start] + position * target_headway
+
+    formatted = format_minutes(new_minutes)
+    start_labels = [first_labels.get(i, label) for i, label in enumerate(formatted)]
+
+    adjustments = new_minutes - original_minutes
+    reasons = [
+        (f"Delayed by {d} minutes to improve headway" if d > 0 else f"Advanced by {-d} minutes to reduce bunching")
+        if abs(d) > 5 else "Minor adjustment for optimal spacing"
+        for d in adjustments.tolist()
+    ]
+
+    route_ids = [schedules.route_ids[i] for i in order.tolist()]
+    bus_ids = [schedules.bus_ids[i] for i in order.tolist()]
+    return OptimizedSchedule(
+        start_minutes=new_minutes, route_ids=route_ids, bus_ids=bus_ids, start_labels=start_labels,
+        end_minutes=new_minutes + trip_minutes, original_labels=original_labels,
+        adjustments=adjustments, reasons=reasons
+    )
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Service Runner
+Starts a service under uvicorn with ML_WORKERS worker processes and reports
+per-process memory so shared model pages can be told apart from private ones.
+"""
+
+import os
+from typing import Any, Dict, Optional
+
+def run_service(app: Any, app_import: str, port: int, single_process_reason: Optional[str] = None):
+    """
+    Serve `app` on `port`. With ML_WORKERS > 1 uvicorn spawns that many
+    workers, each importing `app_import` ("module:app") itself.
+
+    Apps holding state that other workers would not see pass
+    `single_process_reason`, and ML_WORKERS > 1 is refused with it.
+    """
+    import uvicorn
+
+    workers = int(os.getenv("ML_WORKERS", "1"))
+    if workers > 1 and single_process_reason:
+        raise ValueError(f"ML_WORKERS={workers} is not supported for {app_import}: {single_process_reason}")
+    if workers > 1:
+        uvicorn.run(app_import, host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
+
+def read_memory_kb(pid: Any = "self") -> Dict[str, int]:
+    """
+    Rss/Pss/shared/private kB for a process from /proc/<pid>/smaps_rollup.
+
+    Pss charges each shared page 1/N to each of the N processes mapping it,
+    so summing Pss across workers gives their real combined footprint.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1])
+    except OSError:
+        return {}
+
+    return {
+        'rss_kb': fields.get('Rss', 0),
+        'pss_kb': fields.get('Pss', 0),
+        'shared_kb': fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0),
+        'private_kb': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+def process_memory() -> Dict[str, Any]:
+    """Memory of this worker, for /health"""
+    memory = read_memory_kb()
+    return {
+        'pid': os.getpid(),
+        **{key.replace('_kb', '_mb'): round(value / 1024, 1) for key, value in memory.items()}
+    }
@@ -0,0 +1,37 @@
+"""
+Online feature store: timestamps with UTC offsets are bucketed by their UTC hour.
+Run from ml-service/: python -m pytest tests
+"""
+
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("pandas")
+
+from feature_store import OnlineFeatureStore
+
+def test_offset_and_z_timestamps_land_in_their_utc_hour():
+    store = OnlineFeatureStore()
+    store.observe_rows([
+        {'route_id': 1, 'timestamp': '2024-03-01T10:15:00Z', 'passenger_count': 4},
+        # 15:45 at +05:30 is 10:15 UTC, the same hour as the row above
+        {'route_id': 1, 'timestamp': '2024-03-01T15:45:00+05:30', 'passenger_count': 6},
+        {'route_id': 1, 'timestamp': '2024-03-01T11:05:00+00:00', 'passenger_count': 3}
+    ])
+
+    buffer = store.snapshot(1)
+    assert buffer.last_hour == datetime(2024, 3, 1, 11)
+    assert buffer.size == 2
+    assert buffer.features()[0] == 3  # lag_1 is the 11:00 UTC hour
+    assert buffer.sum_7d == 13
+
+def test_naive_timestamps_are_taken_as_utc():
+    store = OnlineFeatureStore()
+    store.observe_rows([{'timestamp': '2024-03-01T10:30:00', 'passenger_count': 5}], default_route_id=2)
+
+    assert store.snapshot(2).last_hour == datetime(2024, 3, 1, 10)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Out-of-Core Demand Model Training
+Trains the demand model on arbitrarily long ticket_sales / passenger_counts
+history exported from the database (CSV, Parquet or SQLite), reading it in
+time-ordered chunks so peak memory does not grow with the history length.
+
+Raw rows are rolled up to (route, hour) totals as they arrive; each route's
+last week of hourly values is carried from one chunk to the next so lag and
+rolling features are exact across chunk boundaries. Feature rows then either
+feed an SGDRegressor through partial_fit, or a fixed-size uniform reservoir
+sample that a random forest is fitted on at the end. A second reservoir
+holds out rows for the reported metrics.
+
+    python training/chunked_training.py exports/ticket_sales.parquet --estimator forest
+"""
+
+import argparse
+import logging
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from demand_store import slot_timestamps
+from feature_store import FEATURE_NAMES, HISTORY_HOURS, LAG_COLUMNS, LAG_FEATURES, grouped_lag_features
+from training.train_demand_model import DemandModelTrainer
+
+logger = logging.getLogger(__name__)
+
+# Value column and hourly roll-up for each exportable table (database/schema.sql)
+SOURCE_TABLES = {
+    'ticket_sales': ('passenger_count', 'sum'),
+    'passenger_counts': ('occupancy', 'mean')
+}
+
+# Optional per-row weather columns; climate normals are used when absent
+WEATHER_COLUMNS = ['temperature', 'precipitation']
+
+MONTHLY_TEMPERATURE = np.array([25, 20, 22, 28, 32, 35, 33, 30, 29, 30, 28, 24, 21])
+HOLIDAYS = [(1, 1), (8, 15), (10, 2), (12, 25)]
+
+def iter_history_chunks(source: Union[str, Path], table: str = 'ticket_sales',
+                        chunk_rows: int = 500_000) -> Iterator[pd.DataFrame]:
+    """
+    Yield raw history rows (route_id, value column, timestamp and any
+    weather columns) in chunks of at most `chunk_rows`.
+
+    CSV and Parquet exports must already be ordered by timestamp (e.g.
+    exported with ORDER BY timestamp); SQLite is queried in that order.
+    """
+    if table not in SOURCE_TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {sorted(SOURCE_TABLES)}")
+    value_column, _ = SOURCE_TABLES[table]
+    wanted = ['route_id', value_column, 'timestamp'] + WEATHER_COLUMNS
+
+    path = Path(source)
+    suffix = path.suffix.lower()
+    if suffix in ('.csv', '.gz'):
+        yield from pd.read_csv(path, usecols=lambda column: column in wanted, chunksize=chunk_rows)
+    elif suffix in ('.parquet', '.pq'):
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(path)
+        columns = [c for c in wanted if c in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif suffix in ('.db', '.sqlite', '.sqlite3'):
+        with sqlite3.connect(path) as conn:
+            query = f"SELECT route_id, {value_column}, timestamp FROM {table} ORDER BY timestamp"
+            yield from pd.read_sql_query(query, conn, chunksize=chunk_rows)
+    else:
+        raise ValueError(f"Unsupported history source {path.name}; use .csv, .parquet or .db/.sqlite")
+
+class HourlyAggregator:
+    """
+    Rolls raw rows up to (route_id, hour) values. The latest hour of each
+    chunk may continue in the next one, so its rows are held back until a
+    later hour appears (or flush() is called).
+    """
+
+    def __init__(self, value_column: str, how: str = 'sum'):
+        self.value_column = value_column
+        self.how = how
+        self.pending: Optional[pd.DataFrame] = None
+        self.last_hour: Optional[pd.Timestamp] = None
+        self.rows_seen = 0
+
+    def push(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        """Add a raw chunk; returns the hours it completed"""
+        self.rows_seen += len(chunk)
+        # UTC hours, as the serving feature store buckets them
+        timestamps = slot_timestamps(chunk['timestamp']).dt.tz_convert(None)
+        rows = pd.DataFrame({
+            'route_id': chunk['route_id'].to_numpy(dtype=np.int64),
+            'value': chunk[self.value_column].to_numpy(dtype=float),
+            'hour': timestamps.dt.floor('h').to_numpy()
+        })
+        for column in WEATHER_COLUMNS:
+            if column in chunk:
+                rows[column] = chunk[column].to_numpy(dtype=float)
+
+        if self.pending is not None:
+            rows = pd.concat([self.pending, rows], ignore_index=True)
+        if rows.empty:
+            return self._aggregate(rows)
+        if self.last_hour is not None and rows['hour'].min() <= self.last_hour:
+            raise ValueError(
+                f"History is not ordered by timestamp: rows for {rows['hour'].min()} "
+                f"arrived after {self.last_hour} was complete"
+            )
+
+        latest = rows['hour'].max()
+        open_hour = rows['hour'] == latest
+        self.pending = rows[open_hour]
+        return self._aggregate(rows[~open_hour])
+
+    def flush(self) -> pd.DataFrame:
+        """Emit the held-back final hour"""
+        rows, self.pending = self.pending, None
+        return self._aggregate(rows if rows is not None else pd.DataFrame())
+
+    def _aggregate(self, rows: pd.DataFrame) -> pd.DataFrame:
+        if rows.empty:
+            return pd.DataFrame(columns=['route_id', 'hour', 'value'])
+        aggregations = {'value': self.how, **{c: 'mean' for c in WEATHER_COLUMNS if c in rows}}
+        hourly = rows.groupby(['route_id', 'hour'], sort=False).agg(aggregations).reset_index()
+        self.last_hour = hourly['hour'].max()
+        return hourly
+
+class RouteLagCarry:
+    """
+    Turns blocks of consecutive complete hours into lag/rolling feature rows,
+    computed per route. Hours a route had no rows are filled with zero from
+    the route's first appearance onward, and the last HISTORY_HOURS values of
+    every route are carried into the next block (the longest window the
+    shared grouped_lag_features reads). Rows without a full week of history
+    are dropped, as dropna() does in DemandModelTrainer.
+    """
+
+    def __init__(self):
+        self.tail = pd.DataFrame(columns=['route_id', 'hour', 'value'])
+        self.first_hour: Dict[int, pd.Timestamp] = {}
+        self.frontier: Optional[pd.Timestamp] = None
+
+    def transform(self, hourly: pd.DataFrame) -> pd.DataFrame:
+        if hourly.empty:
+            return pd.DataFrame()
+
+        for route_id, first in hourly.groupby('route_id')['hour'].min().items():
+            self.first_hour.setdefault(int(route_id), first)
+        start = self.frontier + pd.Timedelta(hours=1) if self.frontier is not None else hourly['hour'].min()
+        end = hourly['hour'].max()
+        self.frontier = end
+
+        # Dense (route, hour) grid for the block, zero where nothing was recorded
+        hours = pd.date_range(start, end, freq='h')
+        routes = np.array(sorted(self.first_hour), dtype=np.int64)
+        grid = pd.DataFrame({
+            'route_id': np.repeat(routes, len(hours)),
+            'hour': np.tile(hours.to_numpy(), len(routes))
+        })
+        grid = grid[grid['hour'].to_numpy() >= grid['route_id'].map(self.first_hour).to_numpy()]
+        block = grid.merge(hourly, on=['route_id', 'hour'], how='left')
+        block['value'] = block['value'].fillna(0.0)
+        block['carried'] = False
+
+        combined = pd.concat([self.tail.assign(carried=True), block], ignore_index=True) if len(self.tail) else block
+        combined = combined.sort_values(['route_id', 'hour'], kind='stable', ignore_index=True)
+
+        features = grouped_lag_features(combined['route_id'].to_numpy(), combined['value'].to_numpy())
+        for column, name in enumerate(LAG_FEATURES):
+            combined[name] = features[:, column]
+
+        self.tail = combined.groupby('route_id', sort=False).tail(HISTORY_HOURS)[['route_id', 'hour', 'value']]
+        rows = combined[~combined['carried'].to_numpy()]
+        return rows.dropna(subset=LAG_FEATURES)
+
+def feature_matrix(rows: pd.DataFrame) -> np.ndarray:
+    """FEATURE_NAMES for lagged (route, hour) rows, filling weather from climate normals"""
+    timestamps = pd.DatetimeIndex(rows['hour'])
+    hour = timestamps.hour.to_numpy()
+    day_of_week = timestamps.dayofweek.to_numpy()
+    month = timestamps.month.to_numpy()
+
+    temperature = MONTHLY_TEMPERATURE[month] + 8 * np.sin((hour - 6) * np.pi / 12)
+    precipitation = np.where(np.isin(month, [6, 7, 8, 9]), 2.0, 0.5)
+    if 'temperature' in rows:
+        temperature = np.where(rows['temperature'].isna(), temperature, rows['temperature'])
+    if 'precipitation' in rows:
+        precipitation = np.where(rows['precipitation'].isna(), precipitation, rows['precipitation'])
+
+    X = np.empty((len(rows), len(FEATURE_NAMES)))
+    X[:, 0] = hour
+    X[:, 1] = day_of_week
+    X[:, 2] = month
+    X[:, 3] = day_of_week >= 5
+    X[:, 4] = np.isin(hour, [7, 8, 17, 18])
+    X[:, 5] = np.isin(month * 100 + timestamps.day.to_numpy(), [m * 100 + d for m, d in HOLIDAYS])
+    X[:, 6] = temperature
+    X[:, 7] = precipitation
+    X[:, LAG_COLUMNS] = rows[LAG_FEATURES].to_numpy(dtype=float)
+    return X
+
+class ReservoirSample:
+    """Uniform sample of at most `capacity` rows from a stream (Algorithm R)"""
+
+    def __init__(self, capacity: int, n_features: int, rng: np.random.Generator):
+        self.capacity = capacity
+        self.X = np.empty((capacity, n_features))
+        self.y = np.empty(capacity)
+        self.seen = 0
+        self.rng = rng
+
+    def add(self, X: np.ndarray, y: np.ndarray):
+        fill = min(max(self.capacity - self.seen, 0), len(X))
+        self.X[self.seen:self.seen + fill] = X[:fill]
+        self.y[self.seen:self.seen + fill] = y[:fill]
+
+        # Row i of the stream replaces a random slot with probability capacity / (i + 1)
+        rest = np.arange(self.seen + fill, self.seen + len(X))
+        slots = self.rng.integers(0, rest + 1) if len(rest) else rest
+        keep = slots < self.capacity
+        self.X[slots[keep]] = X[fill:][keep]
+        self.y[slots[keep]] = y[fill:][keep]
+        self.seen += len(X)
+
+    def arrays(self):
+        size = min(self.seen, self.capacity)
+        return self.X[:size], self.y[:size]
+
+def train_from_history(source: Union[str, Path], table: str = 'ticket_sales', estimator: str = 'forest',
+                       chunk_rows: int = 500_000, max_train_rows: int = 1_000_000,
+                       holdout_rows: int = 100_000, test_size: float = 0.2,
+                       random_state: int = 42) -> Dict:
+    """
+    Stream a history export and train the demand model on it.
+
+    `estimator` is 'forest' (RandomForestRegressor fitted on a reservoir of
+    at most max_train_rows feature rows) or 'sgd' (SGDRegressor updated with
+    partial_fit on every chunk behind an incrementally fitted StandardScaler).
+    A `test_size` share of rows is routed to a holdout reservoir instead of
+    training. Returns model data in the shape DemandModelTrainer.save_model takes.
+    """
+    if estimator not in ('forest', 'sgd'):
+        raise ValueError(f"Unknown estimator {estimator!r}; expected 'forest' or 'sgd'")
+    if table not in SOURCE_TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {sorted(SOURCE_TABLES)}")
+
+    rng = np.random.default_rng(random_state)
+    aggregator = HourlyAggregator(*SOURCE_TABLES[table])
+    carry = RouteLagCarry()
+    holdout = ReservoirSample(holdout_rows, len(FEATURE_NAMES), rng)
+    train = ReservoirSample(max_train_rows, len(FEATURE_NAMES), rng) if estimator == 'forest' else None
+
+    if estimator == 'sgd':
+        from sklearn.linear_model import SGDRegressor
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler()
+        model = SGDRegressor(random_state=random_state)
+
+    feature_rows = 0
+
+    def consume(hourly: pd.DataFrame):
+        nonlocal feature_rows
+        rows = carry.transform(hourly)
+        if rows.empty:
+            return
+        X = feature_matrix(rows)
+        y = rows['value'].to_numpy(dtype=float)
+        held = rng.random(len(X)) < test_size
+        holdout.add(X[held], y[held])
+        feature_rows += len(X)
+
+        X_train, y_train = X[~held], y[~held]
+        if estimator == 'forest':
+            train.add(X_train, y_train)
+        elif len(X_train):
+            scaler.partial_fit(X_train)
+            model.partial_fit(scaler.transform(X_train), y_train)
+
+    for chunk in iter_history_chunks(source, table, chunk_rows):
+        consume(aggregator.push(chunk))
+        logger.info(f"Read {aggregator.rows_seen:,} rows; {feature_rows:,} feature rows up to {carry.frontier}")
+    consume(aggregator.flush())
+
+    X_test, y_test = holdout.arrays()
+    if feature_rows == 0 or len(X_test) == 0:
+        raise ValueError("Not enough history: every route needs over a week of hourly data")
+
+    if estimator == 'forest':
+        from sklearn.ensemble import RandomForestRegressor
+
+        X_train, y_train = train.arrays()
+        logger.info(f"Fitting random forest on a {len(X_train):,}-row sample of "
+                    f"{train.seen:,} training rows...")
+        model = RandomForestRegressor(
+            n_estimators=100,
+            max_depth=10,
+            min_samples_split=5,
+            min_samples_leaf=2,
+            random_state=random_state
+        )
+        model.fit(X_train, y_train)
+    else:
+        from sklearn.pipeline import Pipeline
+        model = Pipeline([('scaler', scaler), ('model', model)])
+
+    from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+    y_pred = model.predict(X_test)
+    mae = mean_absolute_error(y_test, y_pred)
+    mse = mean_squared_error(y_test, y_pred)
+    metrics = {
+        'mae': mae,
+        'mse': mse,
+        'rmse': np.sqrt(mse),
+        'r2_score': r2_score(y_test, y_pred),
+        'accuracy': 1 - (mae / np.mean(y_test)),
+        'history_rows': aggregator.rows_seen,
+        'feature_rows': feature_rows,
+        'holdout_rows': len(X_test)
+    }
+    logger.info(f"Model metrics: MAE={mae:.2f}, RMSE={metrics['rmse']:.2f}, R²={metrics['r2_score']:.2f}")
+
+    model_data = {'model': model, 'metrics': metrics, 'feature_names': FEATURE_NAMES}
+    if estimator == 'forest':
+        model_data['feature_importance'] = dict(zip(FEATURE_NAMES, model.feature_importances_))
+    return model_data
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help="History export: .csv, .parquet or SQLite .db")
+    parser.add_argument('--table', choices=sorted(SOURCE_TABLES), default='ticket_sales')
+    parser.add_argument('--estimator', choices=['forest', 'sgd'], default='forest')
+    parser.add_argument('--chunk-rows', type=int, default=500_000)
+    parser.add_argument('--max-train-rows', type=int, default=1_000_000)
+    parser.add_argument('--holdout-rows', type=int, default=100_000)
+    parser.add_argument('--model-name', default='demand_model')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = datetime.now()
+    model_data = train_from_history(
+        args.source, table=args.table, estimator=args.estimator, chunk_rows=args.chunk_rows,
+        max_train_rows=args.max_train_rows, holdout_rows=args.holdout_rows
+    )
+    DemandModelTrainer().save_model(model_data, args.model_name)
+
+    metrics = model_data['metrics']
+    print(f"Trained on {metrics['feature_rows']:,} route-hours from {metrics['history_rows']:,} rows "
+          f"in {(datetime.now() - started).total_seconds():.0f}s")
+    print(f"MAE: {metrics['mae']:.2f}  RMSE: {metrics['rmse']:.2f}  R²: {metrics['r2_score']:.2f}")
+
+if __name__ == "__main__":
+    main()
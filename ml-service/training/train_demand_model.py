@@ -8,10 +8,21 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import joblib
+import argparse
 import json
 import logging
+import sys
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+
+# Shared model-format helpers live in the service directory
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from feature_store import FEATURE_NAMES, add_route_lag_features
+from forest_arrays import packed_path, save_packed_forest
+from model_registry import ModelRegistry
+from model_tiers import fit_fast_variant, tier_path, tier_summary
+from tuning import fit_parallel, tune_forest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -33,85 +44,92 @@ class DemandModelTrainer:
             'random_state': 42
         }
     
-    def generate_training_data(self, days: int = 90) -> pd.DataFrame:
+    def generate_training_data(self, days: int = 90, routes: int = 6,
+                               seed: Optional[int] = None) -> pd.DataFrame:
         """Generate synthetic training data for demonstration"""
-        logger.info(f"Generating {days} days of training data...")
+        logger.info(f"Generating {days} days of training data for {routes} routes...")
+        
+        chunks = self.iter_training_data(days, routes, chunk_days=days, seed=seed)
+        df = pd.concat(chunks, ignore_index=True)
+        
+        # Lag and rolling features, per route (shared with online inference)
+        df = add_route_lag_features(df)
+        
+        logger.info(f"Generated {len(df)} training samples")
+        return df
+    
+    def iter_training_data(self, days: int = 90, routes: int = 6, chunk_days: int = 30,
+                           seed: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        """
+        Yield synthetic hourly data in time chunks of `chunk_days`, one series
+        per route (route-major within each chunk), without lag/rolling
+        features. Lets multi-year, many-route datasets be streamed to disk.
+        """
+        rng = np.random.default_rng(seed)
+        route_ids = np.arange(1, routes + 1)
         
         # Generate timestamps
         start_date = datetime.now() - timedelta(days=days)
         timestamps = pd.date_range(start=start_date, periods=days*24, freq='H')
         
-        data = []
-        
-        for i, timestamp in enumerate(timestamps):
-            hour = timestamp.hour
-            day_of_week = timestamp.weekday()
-            month = timestamp.month
-            
-            # Generate realistic passenger demand patterns
-            base_demand = self._calculate_base_demand(hour, day_of_week, month)
-            
-            # Add some randomness
-            noise = np.random.normal(0, base_demand * 0.1)
-            passenger_count = max(0, int(base_demand + noise))
-            
-            # Generate features
-            features = {
-                'timestamp': timestamp,
-                'hour': hour,
-                'day_of_week': day_of_week,
-                'month': month,
-                'is_weekend': day_of_week >= 5,
-                'is_peak_hour': hour in [7, 8, 17, 18],
-                'is_holiday': self._is_holiday(timestamp),
-                'temperature': self._generate_temperature(hour, month),
-                'precipitation': self._generate_precipitation(month),
-                'passenger_count': passenger_count,
-                'route_id': np.random.choice([1, 2, 3, 4, 5, 6])  # 6 routes
-            }
-            
-            data.append(features)
-        
-        df = pd.DataFrame(data)
+        chunk_hours = max(1, chunk_days) * 24
+        for offset in range(0, len(timestamps), chunk_hours):
+            yield self._generate_chunk(timestamps[offset:offset + chunk_hours], route_ids, rng)
+    
+    def _generate_chunk(self, timestamps: pd.DatetimeIndex, route_ids: np.ndarray,
+                        rng: np.random.Generator) -> pd.DataFrame:
+        """Build one (route x hour) block of synthetic demand from NumPy arrays"""
+        n_routes, n_hours = len(route_ids), len(timestamps)
         
-        # Add lag features
-        df = self._add_lag_features(df)
+        hour = np.tile(timestamps.hour.to_numpy(), n_routes)
+        day_of_week = np.tile(timestamps.dayofweek.to_numpy(), n_routes)
+        month = np.tile(timestamps.month.to_numpy(), n_routes)
         
-        # Add rolling averages
-        df = self._add_rolling_features(df)
+        # Generate realistic passenger demand patterns
+        base_demand = self._calculate_base_demand(hour, day_of_week, month)
         
-        logger.info(f"Generated {len(df)} training samples")
-        return df
+        # Add some randomness
+        noise = rng.normal(0, base_demand * 0.1)
+        passenger_count = np.maximum(0, np.trunc(base_demand + noise)).astype(int)
+        
+        return pd.DataFrame({
+            'timestamp': np.tile(timestamps.to_numpy(), n_routes),
+            'hour': hour,
+            'day_of_week': day_of_week,
+            'month': month,
+            'is_weekend': day_of_week >= 5,
+            'is_peak_hour': np.isin(hour, [7, 8, 17, 18]),
+            'is_holiday': np.tile(self._is_holiday(timestamps), n_routes),
+            'temperature': self._generate_temperature(hour, month, rng),
+            'precipitation': self._generate_precipitation(month, rng),
+            'passenger_count': passenger_count,
+            'route_id': np.repeat(route_ids, n_hours)
+        })
     
-    def _calculate_base_demand(self, hour: int, day_of_week: int, month: int) -> int:
+    def _calculate_base_demand(self, hour: np.ndarray, day_of_week: np.ndarray,
+                               month: np.ndarray) -> np.ndarray:
         """Calculate base demand based on time patterns"""
-        # Peak hours (7-9 AM, 5-7 PM)
-        if hour in [7, 8, 17, 18]:
-            base = 35
-        # Moderate hours (6-7 AM, 9-10 AM, 4-5 PM, 7-8 PM)
-        elif hour in [6, 9, 16, 19]:
-            base = 25
-        # Off-peak hours
-        elif 6 <= hour <= 22:
-            base = 15
-        # Night hours
-        else:
-            base = 5
+        base = np.select(
+            [
+                np.isin(hour, [7, 8, 17, 18]),   # Peak hours (7-9 AM, 5-7 PM)
+                np.isin(hour, [6, 9, 16, 19]),   # Moderate hours
+                (hour >= 6) & (hour <= 22)       # Off-peak hours
+            ],
+            [35, 25, 15],
+            default=5                            # Night hours
+        )
         
         # Weekend adjustment
-        if day_of_week >= 5:  # Weekend
-            base = int(base * 0.7)
+        base = np.where(day_of_week >= 5, (base * 0.7).astype(int), base)
         
-        # Seasonal adjustment
-        if month in [12, 1, 2]:  # Winter
-            base = int(base * 1.1)
-        elif month in [6, 7, 8]:  # Summer
-            base = int(base * 0.9)
+        # Seasonal adjustment: winter up, summer down
+        base = np.where(np.isin(month, [12, 1, 2]), (base * 1.1).astype(int), base)
+        base = np.where(np.isin(month, [6, 7, 8]), (base * 0.9).astype(int), base)
         
         return base
     
-    def _is_holiday(self, timestamp: datetime) -> bool:
-        """Check if date is a holiday (simplified)"""
+    def _is_holiday(self, timestamps: pd.DatetimeIndex) -> np.ndarray:
+        """Check which dates are holidays (simplified)"""
         # Simple holiday logic - you can expand this
         holidays = [
             (1, 1),   # New Year
@@ -119,94 +137,57 @@ class DemandModelTrainer:
             (10, 2),  # Gandhi Jayanti
             (12, 25), # Christmas
         ]
-        return (timestamp.month, timestamp.day) in holidays
+        month_day = timestamps.month.to_numpy() * 100 + timestamps.day.to_numpy()
+        return np.isin(month_day, [m * 100 + d for m, d in holidays])
     
-    def _generate_temperature(self, hour: int, month: int) -> float:
+    def _generate_temperature(self, hour: np.ndarray, month: np.ndarray,
+                              rng: np.random.Generator) -> np.ndarray:
         """Generate realistic temperature based on hour and month"""
-        # Base temperature by month (Ahmedabad climate)
-        monthly_temp = {
-            1: 20, 2: 22, 3: 28, 4: 32, 5: 35, 6: 33,
-            7: 30, 8: 29, 9: 30, 10: 28, 11: 24, 12: 21
-        }
+        # Base temperature by month (Ahmedabad climate), index 0 unused
+        monthly_temp = np.array([25, 20, 22, 28, 32, 35, 33, 30, 29, 30, 28, 24, 21])
         
-        base_temp = monthly_temp.get(month, 25)
+        base_temp = monthly_temp[month]
         
         # Daily variation (cooler at night, warmer during day)
         daily_variation = 8 * np.sin((hour - 6) * np.pi / 12)
         
         # Add some randomness
-        noise = np.random.normal(0, 2)
+        noise = rng.normal(0, 2, size=len(hour))
         
         return base_temp + daily_variation + noise
     
-    def _generate_precipitation(self, month: int) -> float:
+    def _generate_precipitation(self, month: np.ndarray, rng: np.random.Generator) -> np.ndarray:
         """Generate precipitation based on month (monsoon season)"""
-        # Monsoon months (June-September)
-        if month in [6, 7, 8, 9]:
-            return np.random.exponential(2.0)  # Higher chance of rain
-        else:
-            return np.random.exponential(0.5)  # Lower chance of rain
-    
-    def _add_lag_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add lag features for time series prediction"""
-        # Lag 1 hour
-        df['passenger_count_lag_1'] = df['passenger_count'].shift(1)
-        
-        # Lag 24 hours (same time yesterday)
-        df['passenger_count_lag_24'] = df['passenger_count'].shift(24)
-        
-        # Lag 168 hours (same time last week)
-        df['passenger_count_lag_168'] = df['passenger_count'].shift(168)
-        
-        return df
-    
-    def _add_rolling_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Add rolling average features"""
-        # 24-hour rolling average
-        df['passenger_avg_24h'] = df['passenger_count'].rolling(24).mean()
-        
-        # 7-day rolling average
-        df['passenger_avg_7d'] = df['passenger_count'].rolling(168).mean()
-        
-        # 24-hour rolling standard deviation
-        df['passenger_std_24h'] = df['passenger_count'].rolling(24).std()
-        
-        return df
+        # Monsoon months (June-September) have a higher chance of rain
+        monsoon = np.isin(month, [6, 7, 8, 9])
+        return rng.exponential(np.where(monsoon, 2.0, 0.5))
     
     def prepare_training_data(self, df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare data for model training"""
+        """Prepare data for model training, rows in time order"""
         logger.info("Preparing training data...")
         
-        # Select features
-        feature_columns = [
-            'hour', 'day_of_week', 'month', 'is_weekend', 'is_peak_hour',
-            'is_holiday', 'temperature', 'precipitation',
-            'passenger_count_lag_1', 'passenger_count_lag_24', 'passenger_count_lag_168',
-            'passenger_avg_24h', 'passenger_avg_7d', 'passenger_std_24h'
-        ]
-        
         # Remove rows with NaN values (from lag features)
         df_clean = df.dropna()
         
-        X = df_clean[feature_columns].values
+        # Time order (routes interleaved), so later rows are later hours for time-series CV
+        if 'timestamp' in df_clean:
+            df_clean = df_clean.sort_values('timestamp', kind='stable')
+        
+        X = df_clean[FEATURE_NAMES].values
         y = df_clean['passenger_count'].values
         
-        logger.info(f"Prepared {len(X)} samples with {len(feature_columns)} features")
+        logger.info(f"Prepared {len(X)} samples with {len(FEATURE_NAMES)} features")
         return X, y
     
     def train_simple_model(self, X: np.ndarray, y: np.ndarray) -> Dict:
         """Train a simple linear regression model"""
         from sklearn.linear_model import LinearRegression
-        from sklearn.model_selection import train_test_split
         from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
         
         logger.info("Training simple linear regression model...")
         
-        # Split data
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=self.config['test_size'], 
-            random_state=self.config['random_state']
-        )
+        # Hold out the latest hours
+        X_train, X_test, y_train, y_test = self._time_split(X, y)
         
         # Train model
         model = LinearRegression()
@@ -234,28 +215,21 @@ class DemandModelTrainer:
         return {
             'model': model,
             'metrics': metrics,
-            'feature_names': [
-                'hour', 'day_of_week', 'month', 'is_weekend', 'is_peak_hour',
-                'is_holiday', 'temperature', 'precipitation',
-                'passenger_count_lag_1', 'passenger_count_lag_24', 'passenger_count_lag_168',
-                'passenger_avg_24h', 'passenger_avg_7d', 'passenger_std_24h'
-            ]
+            'feature_names': FEATURE_NAMES
         }
     
     def train_advanced_model(self, X: np.ndarray, y: np.ndarray) -> Dict:
-        """Train an advanced Random Forest model"""
+        """Train an advanced Random Forest model; rows must be in time order (prepare_training_data)"""
         try:
             from sklearn.ensemble import RandomForestRegressor
-            from sklearn.model_selection import train_test_split, cross_val_score
+            from sklearn.model_selection import TimeSeriesSplit, cross_val_score
             from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
             
             logger.info("Training Random Forest model...")
             
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=self.config['test_size'], 
-                random_state=self.config['random_state']
-            )
+            # Hold out the latest hours, as tune_model does, so lag/rolling
+            # features never let the model see hours after the ones it is scored on
+            X_train, X_test, y_train, y_test = self._time_split(X, y)
             
             # Train model
             model = RandomForestRegressor(
@@ -265,7 +239,7 @@ class DemandModelTrainer:
                 min_samples_leaf=2,
                 random_state=self.config['random_state']
             )
-            model.fit(X_train, y_train)
+            fit_parallel(model, X_train, y_train)
             
             # Make predictions
             y_pred = model.predict(X_test)
@@ -276,8 +250,9 @@ class DemandModelTrainer:
             rmse = np.sqrt(mse)
             r2 = r2_score(y_test, y_pred)
             
-            # Cross-validation
-            cv_scores = cross_val_score(model, X, y, cv=5, scoring='neg_mean_absolute_error')
+            # Time-series cross-validation over the earlier rows, folds in parallel
+            cv_scores = cross_val_score(model, X_train, y_train, cv=TimeSeriesSplit(n_splits=5),
+                                        scoring='neg_mean_absolute_error', n_jobs=-1)
             cv_mae = -cv_scores.mean()
             
             metrics = {
@@ -291,36 +266,134 @@ class DemandModelTrainer:
             
             logger.info(f"Model metrics: MAE={mae:.2f}, RMSE={rmse:.2f}, R²={r2:.2f}, CV MAE={cv_mae:.2f}")
             
+            fast_model, fast_tier = self._fit_fast_tier(model, metrics, X_train, y_train, X_test, y_test)
+            
             # Feature importance
             feature_importance = model.feature_importances_
-            feature_names = [
-                'hour', 'day_of_week', 'month', 'is_weekend', 'is_peak_hour',
-                'is_holiday', 'temperature', 'precipitation',
-                'passenger_count_lag_1', 'passenger_count_lag_24', 'passenger_count_lag_168',
-                'passenger_avg_24h', 'passenger_avg_7d', 'passenger_std_24h'
-            ]
-            
-            importance_dict = dict(zip(feature_names, feature_importance))
+            importance_dict = dict(zip(FEATURE_NAMES, feature_importance))
             
             return {
                 'model': model,
                 'metrics': metrics,
                 'feature_importance': importance_dict,
-                'feature_names': feature_names
+                'feature_names': FEATURE_NAMES,
+                'fast_model': fast_model,
+                'fast_tier': fast_tier
             }
             
         except ImportError:
             logger.warning("scikit-learn not available, falling back to simple model")
             return self.train_simple_model(X, y)
     
-    def save_model(self, model_data: Dict, model_name: str = "demand_model"):
-        """Save trained model and metadata"""
+    def tune_model(self, X: np.ndarray, y: np.ndarray, n_candidates: int = 100,
+                   factor: int = 3, n_jobs: int = -1) -> Dict:
+        """
+        Tune the Random Forest with a parallel successive-halving search.
+        
+        Rows must be in time order (prepare_training_data). The latest
+        test_size share is held out; the search scores candidates with
+        TimeSeriesSplit folds over the earlier rows, so no fold trains on
+        hours after the ones it is tested on. The winner is refitted on all
+        earlier rows and its parameters are returned for the metadata.
+        """
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.model_selection import TimeSeriesSplit
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        
+        X_train, X_test, y_train, y_test = self._time_split(X, y)
+        
+        logger.info(f"Tuning Random Forest over {n_candidates} candidates on {len(X_train)} rows...")
+        tuning = tune_forest(
+            RandomForestRegressor(random_state=self.config['random_state']),
+            X_train, y_train,
+            cv=TimeSeriesSplit(n_splits=5),
+            scoring='neg_mean_absolute_error',
+            n_candidates=n_candidates,
+            factor=factor,
+            n_jobs=n_jobs,
+            random_state=self.config['random_state']
+        )
+        
+        model = RandomForestRegressor(random_state=self.config['random_state'], **tuning['best_params'])
+        fit_parallel(model, X_train, y_train)
+        
+        y_pred = model.predict(X_test)
+        mae = mean_absolute_error(y_test, y_pred)
+        mse = mean_squared_error(y_test, y_pred)
+        rmse = np.sqrt(mse)
+        r2 = r2_score(y_test, y_pred)
+        
+        metrics = {
+            'mae': mae,
+            'mse': mse,
+            'rmse': rmse,
+            'r2_score': r2,
+            'cv_mae': -tuning['best_score'],
+            'accuracy': 1 - (mae / np.mean(y_test))
+        }
+        
+        logger.info(f"Tuned model metrics: MAE={mae:.2f}, RMSE={rmse:.2f}, R²={r2:.2f}, CV MAE={-tuning['best_score']:.2f}")
+        
+        fast_model, fast_tier = self._fit_fast_tier(model, metrics, X_train, y_train, X_test, y_test)
+        
+        return {
+            'model': model,
+            'metrics': metrics,
+            'feature_importance': dict(zip(FEATURE_NAMES, model.feature_importances_)),
+            'feature_names': FEATURE_NAMES,
+            'best_params': tuning['best_params'],
+            'tuning': tuning,
+            'fast_model': fast_model,
+            'fast_tier': fast_tier
+        }
+    
+    def _time_split(self, X: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, ...]:
+        """Chronological train/test split of time-ordered rows: the latest test_size share is the test set"""
+        split = int(len(X) * (1 - self.config['test_size']))
+        return X[:split], X[split:], y[:split], y[split:]
+    
+    def _fit_fast_tier(self, model, metrics: Dict, X_train: np.ndarray, y_train: np.ndarray,
+                       X_test: np.ndarray, y_test: np.ndarray) -> Tuple[object, Dict]:
+        """Fit the fast tier of a trained forest and compare it with the full model on the same holdout"""
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        
+        fast_model = fit_fast_variant(model, X_train, y_train)
+        y_pred = fast_model.predict(X_test)
+        mae = mean_absolute_error(y_test, y_pred)
+        
+        fast_tier = tier_summary(fast_model, metrics, {
+            'mae': mae,
+            'rmse': np.sqrt(mean_squared_error(y_test, y_pred)),
+            'r2_score': r2_score(y_test, y_pred),
+            'accuracy': 1 - (mae / np.mean(y_test))
+        })
+        
+        logger.info(f"Fast tier: {fast_model.n_estimators} trees of depth {fast_model.max_depth}, "
+                    f"MAE {fast_tier['delta']['mae']:+.2f}, accuracy {fast_tier['delta']['accuracy']:+.2%} vs full model")
+        return fast_model, fast_tier
+    
+    def save_model(self, model_data: Dict, model_name: str = "demand_model") -> str:
+        """
+        Save trained model, its fast tier when there is one, and metadata as
+        a new registry version, which becomes current. Returns the version.
+        """
         logger.info(f"Saving model as {model_name}...")
+        registry = ModelRegistry(self.models_dir)
+        version_dir = registry.stage(model_name)
         
         # Save model
-        model_path = self.models_dir / f"{model_name}.pkl"
+        model_path = version_dir / f"{model_name}.pkl"
         joblib.dump(model_data['model'], model_path)
         
+        # Forests also get a packed copy that serving workers memory-map
+        if hasattr(model_data['model'], 'estimators_'):
+            save_packed_forest(model_data['model'], packed_path(model_path))
+        
+        if model_data.get('fast_model') is not None:
+            fast_path = tier_path(model_path, 'fast')
+            joblib.dump(model_data['fast_model'], fast_path)
+            save_packed_forest(model_data['fast_model'], packed_path(fast_path))
+        
         # Save metadata
         metadata = {
             'model_name': model_name,
@@ -333,14 +406,24 @@ class DemandModelTrainer:
         if 'feature_importance' in model_data:
             metadata['feature_importance'] = model_data['feature_importance']
         
-        metadata_path = self.models_dir / f"{model_name}_metadata.json"
+        # Winning configuration of a tuning run
+        if 'best_params' in model_data:
+            metadata['best_params'] = model_data['best_params']
+            metadata['tuning'] = model_data['tuning']
+        
+        if 'fast_tier' in model_data:
+            metadata['fast_tier'] = model_data['fast_tier']
+        
+        metadata_path = version_dir / f"{model_name}_metadata.json"
         with open(metadata_path, 'w') as f:
             json.dump(metadata, f, indent=2)
         
-        logger.info(f"Model saved to {model_path}")
-        logger.info(f"Metadata saved to {metadata_path}")
+        version = registry.publish(model_name, version_dir)
+        logger.info(f"Model saved to {registry.root / model_name / version}")
+        return version
     
-    def run_training(self, days: int = 90, use_advanced: bool = True):
+    def run_training(self, days: int = 90, use_advanced: bool = True, tune: bool = False,
+                     n_candidates: int = 100):
         """Run complete training pipeline"""
         logger.info("Starting demand prediction model training...")
         
@@ -351,7 +434,9 @@ class DemandModelTrainer:
         X, y = self.prepare_training_data(df)
         
         # Train model
-        if use_advanced:
+        if tune:
+            model_data = self.tune_model(X, y, n_candidates=n_candidates)
+        elif use_advanced:
             model_data = self.train_advanced_model(X, y)
         else:
             model_data = self.train_simple_model(X, y)
@@ -364,10 +449,17 @@ class DemandModelTrainer:
 
 def main():
     """Main training function"""
+    parser = argparse.ArgumentParser(description="Train the demand prediction model")
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--tune', action='store_true', help="Search forest hyperparameters first")
+    parser.add_argument('--candidates', type=int, default=100)
+    args = parser.parse_args()
+    
     trainer = DemandModelTrainer()
     
     # Train with 90 days of data
-    model_data = trainer.run_training(days=90, use_advanced=True)
+    model_data = trainer.run_training(days=args.days, use_advanced=True, tune=args.tune,
+                                      n_candidates=args.candidates)
     
     print("\n" + "="*50)
     print("TRAINING COMPLETED SUCCESSFULLY!")
@@ -377,6 +469,15 @@ def main():
     print(f"RMSE: {model_data['metrics']['rmse']:.2f}")
     print(f"R² Score: {model_data['metrics']['r2_score']:.2f}")
     
+    if 'best_params' in model_data:
+        print(f"Best parameters: {model_data['best_params']} "
+              f"({model_data['tuning']['search_seconds']:.0f}s search)")
+    
+    if 'fast_tier' in model_data:
+        fast_tier = model_data['fast_tier']
+        print(f"Fast tier: {fast_tier['n_estimators']} trees of depth {fast_tier['max_depth']}, "
+              f"accuracy {fast_tier['delta']['accuracy']:+.2%}, MAE {fast_tier['delta']['mae']:+.2f} vs full model")
+    
     if 'feature_importance' in model_data:
         print("\nTop 5 Most Important Features:")
         sorted_features = sorted(
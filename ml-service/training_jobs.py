@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Background Training Jobs
+Runs breakdown model training in a separate process so the API event loop
+keeps serving predictions, and reports job status and progress.
+
+Job records and progress are JSON files in a directory shared by every
+uvicorn worker (the model's jobs directory in the registry), so any
+worker can report on a job queued by another.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from breakdown_predictor import BreakdownPredictor
+
+logger = logging.getLogger(__name__)
+
+def _write_json(path: Path, data: Dict):
+    """Replace a JSON file atomically so readers never see half of it"""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def _read_json(path: Path) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+class JobProgress:
+    """Stage and percent complete of one job, written by the training process"""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+
+    def update(self, **fields):
+        _write_json(self.path, {**(self.read() or {}), **fields})
+
+    def read(self) -> Optional[Dict]:
+        return _read_json(self.path)
+
+def training_n_jobs(requested: Optional[int] = None) -> int:
+    """
+    Cores a training job may use: ML_TRAINING_N_JOBS, or half the cores by
+    default, always leaving at least one core to the serving process
+    """
+    cores = os.cpu_count() or 1
+    requested = requested or int(os.getenv("ML_TRAINING_N_JOBS", "0")) or cores // 2
+    return max(1, min(requested, cores - 1))
+
+def run_breakdown_training(num_buses: int, days: int, model_path: Optional[str], progress: Any,
+                           tune: bool = False, tune_candidates: int = 100, n_jobs: int = 1) -> Dict:
+    """
+    Generate data, fit (or tune and fit) on `n_jobs` cores and save a
+    breakdown model, as a new registry version unless model_path is given
+    (runs in a worker process)
+    """
+    progress.update(stage='generating_data', percent=10)
+    predictor = BreakdownPredictor()
+    df = predictor.generate_training_data(num_buses=num_buses, days=days)
+
+    progress.update(stage='tuning' if tune else 'training', percent=40, samples=len(df))
+    if tune:
+        metrics = predictor.tune_model(df, n_candidates=tune_candidates, n_jobs=n_jobs)
+    else:
+        metrics = predictor.train_model(df, n_jobs=n_jobs)
+    if not metrics:
+        raise RuntimeError("Model training failed")
+
+    progress.update(stage='saving', percent=90)
+    version = predictor.save_model(model_path)
+
+    progress.update(stage='finished', percent=100)
+    # The parent loads the saved files itself; shipping the forest back would pickle it for nothing
+    return {
+        'metrics': metrics,
+        'version': version,
+        'model_path': model_path
+    }
+
+class TrainingJobManager:
+    """
+    Queue of training jobs executed in a process pool.
+
+    Each job is `<job_id>.job.json` in `jobs_dir`, and the training process
+    reports into `<job_id>.progress.json` next to it. When a job succeeds,
+    `on_complete` is called with its result in the worker that queued it;
+    other workers pick the published version up through the registry
+    watcher. Each job fits and tunes on `n_jobs` cores (training_n_jobs),
+    so training does not starve the service's request handling.
+    """
+
+    def __init__(self, on_complete: Callable[[Dict], None], jobs_dir: Union[str, Path],
+                 max_workers: int = 1, max_jobs: int = 100, n_jobs: Optional[int] = None):
+        self.on_complete = on_complete
+        self.jobs_dir = Path(jobs_dir)
+        self.max_workers = max_workers
+        self.n_jobs = training_n_jobs(n_jobs)
+        self.max_jobs = max_jobs
+
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _ensure_pool(self):
+        """Start the worker pool on first use"""
+        if self._executor is None:
+            context = multiprocessing.get_context('spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.job.json"
+
+    def _progress(self, job_id: str) -> JobProgress:
+        return JobProgress(self.jobs_dir / f"{job_id}.progress.json")
+
+    def submit(self, num_buses: int = 50, days: int = 180,
+               model_path: Optional[str] = None, tune: bool = False,
+               tune_candidates: int = 100) -> Dict:
+        """Queue a training job and return its initial status"""
+        job_id = uuid.uuid4().hex
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        progress = self._progress(job_id)
+        progress.update(stage='queued', percent=0)
+        with self._lock:
+            self._ensure_pool()
+            _write_json(self._job_path(job_id), {
+                'job_id': job_id,
+                'status': 'queued',
+                'params': {'num_buses': num_buses, 'days': days, 'tune': tune,
+                           'tune_candidates': tune_candidates, 'n_jobs': self.n_jobs},
+                'submitted_at': datetime.now().isoformat(),
+                'finished_at': None,
+                'metrics': None,
+                'model_version': None,
+                'error': None
+            })
+            self._prune()
+
+            future = self._executor.submit(run_breakdown_training, num_buses, days, model_path, progress,
+                                           tune, tune_candidates, self.n_jobs)
+
+        future.add_done_callback(lambda f: self._finish(job_id, f))
+        logger.info(f"Queued breakdown training job {job_id}")
+        return self.get(job_id)
+
+    def _finish(self, job_id: str, future: Future):
+        """Record the outcome and hot-swap the model on success"""
+        try:
+            result = future.result()
+            self.on_complete(result)
+            status, metrics, version, error = 'completed', result['metrics'], result.get('version'), None
+            logger.info(f"Training job {job_id} completed, model version {version} swapped in")
+        except Exception as e:
+            status, metrics, version, error = 'failed', None, None, str(e)
+            logger.error(f"Training job {job_id} failed: {error}")
+
+        with self._lock:
+            job = _read_json(self._job_path(job_id))
+            if job is not None:
+                job.update(status=status, metrics=metrics, model_version=version, error=error,
+                           finished_at=datetime.now().isoformat())
+                _write_json(self._job_path(job_id), job)
+
+    def _records(self) -> List[Dict]:
+        """Every job record, oldest first"""
+        records = [_read_json(path) for path in self.jobs_dir.glob('*.job.json')]
+        return sorted((r for r in records if r is not None), key=lambda r: r['submitted_at'])
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_jobs"""
+        records = self._records()
+        finished = [r['job_id'] for r in records if r['status'] in ('completed', 'failed')]
+        for job_id in finished[:max(0, len(records) - self.max_jobs)]:
+            self._job_path(job_id).unlink(missing_ok=True)
+            self._progress(job_id).path.unlink(missing_ok=True)
+
+    def progress(self, job_id: str) -> Optional[Dict]:
+        """Current stage and percent complete of a job"""
+        job = _read_json(self._job_path(job_id))
+        if job is None:
+            return None
+        progress = self._progress(job_id).read()
+        if progress is None:
+            return {'stage': job['status'], 'percent': 100 if job['status'] == 'completed' else 0}
+        return progress
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Status of a job, or None if unknown"""
+        job = _read_json(self._job_path(job_id))
+        if job is None:
+            return None
+        progress = self.progress(job_id)
+        status = job['status']
+        if status == 'queued' and progress and progress.get('stage') != 'queued':
+            status = 'running'
+        return {**job, 'status': status, 'progress': progress}
+
+    def list(self) -> List[Dict]:
+        return [job for job in (self.get(r['job_id']) for r in self._records()) if job is not None]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Smart Bus System - Hyperparameter Tuning
+Successive-halving random search over random forest settings, shared by the
+demand and breakdown trainers.
+
+Every candidate is first scored with a small forest; only the best 1/factor
+advance to the next round with factor times more trees, until the
+survivors grow max_estimators. The halving resource is the tree count, not
+the rows, so every round fits on whole, contiguous training folds and
+time-ordered lag features keep their structure. Candidates x folds run in
+parallel (all cores unless n_jobs says otherwise), so a 100-candidate
+search costs roughly what a few full fits would.
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Sampled independently per candidate; the tree count is the halving resource
+FOREST_PARAM_SPACE = {
+    'max_depth': [6, 8, 10, 12, 16, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4, 8],
+    'max_features': [1.0, 'sqrt', 0.5]
+}
+
+def tune_forest(estimator: Any, X: np.ndarray, y: np.ndarray, cv: Any, scoring: str,
+                param_space: Optional[Dict] = None, n_candidates: int = 100, factor: int = 3,
+                max_estimators: int = 300, n_jobs: int = -1, random_state: int = 42) -> Dict[str, Any]:
+    """
+    Search `param_space` for `estimator` with HalvingRandomSearchCV.
+
+    `cv` is a splitter (e.g. TimeSeriesSplit for time-ordered rows). The
+    estimator itself is kept single-threaded so the search can spread
+    candidates and folds across cores. Returns best_params (with
+    n_estimators set to the final round's tree count), the best CV score
+    and a summary of the halving rounds; nothing is refitted.
+    """
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV
+
+    search = HalvingRandomSearchCV(
+        estimator.set_params(n_jobs=1),
+        param_distributions=param_space or FOREST_PARAM_SPACE,
+        n_candidates=n_candidates,
+        factor=factor,
+        resource='n_estimators',
+        max_resources=max_estimators,
+        min_resources='exhaust',
+        cv=cv,
+        scoring=scoring,
+        refit=False,
+        n_jobs=n_jobs,
+        random_state=random_state
+    )
+
+    started = time.perf_counter()
+    search.fit(X, y)
+    elapsed = time.perf_counter() - started
+
+    best_params = {key: _plain(value) for key, value in search.best_params_.items()}
+    best_params['n_estimators'] = int(search.n_resources_[-1])
+    logger.info(f"Tuning finished in {elapsed:.1f}s: best {scoring}={search.best_score_:.4f} with {best_params}")
+    return {
+        'best_params': best_params,
+        'best_score': float(search.best_score_),
+        'scoring': scoring,
+        'n_candidates': int(search.n_candidates_[0]),
+        'rounds': [
+            {'candidates': int(c), 'n_estimators': int(r)}
+            for c, r in zip(search.n_candidates_, search.n_resources_)
+        ],
+        'search_seconds': round(elapsed, 1)
+    }
+
+def fit_parallel(model: Any, X: np.ndarray, y: np.ndarray, n_jobs: int = -1) -> Any:
+    """
+    Fit a forest on `n_jobs` cores (all by default), then reset n_jobs so
+    serving predicts in-thread (request concurrency already comes from the
+    service's workers)
+    """
+    model.set_params(n_jobs=n_jobs)
+    model.fit(X, y)
+    model.set_params(n_jobs=None)
+    return model
+
+def _plain(value: Any) -> Any:
+    """NumPy scalars to Python, so parameters serialize to JSON"""
+    return value.item() if isinstance(value, np.generic) else value